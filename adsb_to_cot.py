@@ -1,8 +1,29 @@
 import requests
-import xml.etree.ElementTree as ET
 import datetime
-import socket
 import asyncio
+import sqlite3
+import time
+
+import sbs
+from aircraft_registry import AircraftRegistry
+from cot_encoder import CoTClock, CoTTemplate
+from cot_transport import CoalescingBuffer, CoTTransport, SendBuffer
+from geofence import GeofenceIndex
+from metrics import Metrics, MetricsServer, transport_samples
+from tak_proto import ENCODINGS, TakProtoTemplate
+from track_snapshot import SnapshotWriter, gc_paused, load_snapshot
+
+# Optional JSON file with areas of interest (see areas.example.json): only aircraft inside
+# them are sent, and OpenSky polls only ask for the box around them
+AREAS_FILE = None
+
+# Optional local port to serve Prometheus metrics on (http://127.0.0.1:PORT/metrics)
+METRICS_PORT = None
+
+# Optional file to keep a snapshot of aircraft state in (written every SNAPSHOT_INTERVAL
+# seconds and on shutdown), so a restart re-sends tracks that are still current
+SNAPSHOT_FILE = None
+SNAPSHOT_INTERVAL = 60
 
 # Aircraft types mapping
 AIRCRAFT_TYPES = {
@@ -23,19 +44,49 @@ ICAO_PREFIXES = {
 
 
 class ADSBToCoTConverter:
-    def __init__(self, cot_host, cot_port, protocol='tcp', include_types=None, exclude_types=None):
+    def __init__(self, cot_host, cot_port, protocol='tcp', include_types=None, exclude_types=None,
+                 queue_size=100000, overflow='drop-oldest', coalesce=True, refresh_interval=120,
+                 encoding='xml', geofence=None, metrics=None, snapshot_path=None,
+                 snapshot_interval=60, poll_interval=10):
         self.cot_host = cot_host
         self.cot_port = cot_port
         self.protocol = protocol.lower()
         self.include_types = include_types
         self.exclude_types = exclude_types
-        self.socket = None
-
-        if self.protocol == 'tcp':
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.cot_host, self.cot_port))
+        self.clock = CoTClock(datetime.timedelta(minutes=5))
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}")
+        self.encoding = encoding
+        if encoding == 'protobuf':
+            # TAK Protocol v1, framed for a TCP stream or as a UDP mesh datagram
+            self.template = TakProtoTemplate(how='h-e', ce='100', le='100',
+                                             framing='stream' if self.protocol == 'tcp' else 'mesh')
         else:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.template = CoTTemplate(how='h-e', ce='100', le='100')  # Electronic tracking
+        buffer = CoalescingBuffer(queue_size, overflow) if coalesce else SendBuffer(queue_size, overflow)
+        # Optional counters and stage timings (metrics.Metrics); events are timed from
+        # OpenSky's time_position, or from reception of the SBS-1 line
+        self.metrics = metrics
+        self.transport = CoTTransport(cot_host, cot_port, self.protocol, buffer,
+                                      delimiter=b'\n' if encoding == 'xml' else b'', metrics=metrics)
+        if metrics is not None:
+            metrics.collect(lambda: transport_samples(self.transport.name, self.transport))
+        # Only changed aircraft are re-sent, plus a full refresh well inside the 5 minute stale time
+        self.aircraft = AircraftRegistry(refresh_interval=refresh_interval)
+        self.session = requests.Session()  # Kept-alive connection to OpenSky
+        self.poll_interval = poll_interval  # Seconds between the end of one poll and the next
+        self.last_fetch_bytes = 0
+        self.malformed = 0  # Unparseable SBS-1 lines skipped
+        # Optional areas of interest (geofence.GeofenceIndex): aircraft outside them are
+        # dropped, and OpenSky is only asked for the box around them
+        self.geofence = geofence
+        self.outside = 0
+        # Optional warm-start snapshot of the aircraft registry, loaded on start and written
+        # every snapshot_interval seconds and on shutdown
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_writer = SnapshotWriter(snapshot_path, self.aircraft) if snapshot_path else None
+        self._snapshots = None
 
     def get_aircraft_type(self, callsign, icao24):
         """Determine aircraft type based on callsign and ICAO24 prefix."""
@@ -63,98 +114,279 @@ class ADSBToCoTConverter:
             return cot_type not in self.exclude_types
         return True
 
-    def create_cot_from_adsb(self, aircraft_data):
-        """Convert ADS-B data to CoT XML format."""
+    def create_cot_from_adsb(self, aircraft_data, times=None):
+        """Convert ADS-B data to CoT XML format; times overrides the (time, stale) strings."""
         icao24 = aircraft_data.get('icao24', 'UNKNOWN')
-        callsign = aircraft_data.get('callsign', 'UNKNOWN').strip()
+        callsign = (aircraft_data.get('callsign') or 'UNKNOWN').strip()
         lat = aircraft_data.get('latitude')
         lon = aircraft_data.get('longitude')
         alt = aircraft_data.get('geoaltitude', 0)
         speed = aircraft_data.get('velocity', 0)
         heading = aircraft_data.get('heading', 0)
 
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
         cot_type = self.get_aircraft_type(callsign, icao24)
+        if metrics is not None:
+            classified = time.perf_counter()
+            metrics.observe('cot_stage_seconds', ('classify',), classified - started)
 
         # Filter based on type
         if not self.should_process_aircraft(cot_type):
+            if metrics is not None:
+                metrics.inc('cot_filtered_total', ('type',))
             return None
 
-        # Create CoT XML
-        event = ET.Element('event')
-        event.set('version', '2.0')
-        event.set('type', cot_type)
-        event.set('uid', f"ADSB.{icao24}")
-        event.set('time', datetime.datetime.utcnow().isoformat() + 'Z')
-        event.set('start', datetime.datetime.utcnow().isoformat() + 'Z')
-        event.set('stale', (datetime.datetime.utcnow() + datetime.timedelta(minutes=5)).isoformat() + 'Z')
-        event.set('how', 'h-e')  # Electronic tracking
-
-        # Point data
-        point = ET.SubElement(event, 'point')
-        point.set('lat', str(lat if lat else 0))
-        point.set('lon', str(lon if lon else 0))
-        point.set('hae', str(alt if alt else 0))
-        point.set('ce', '100')  # Circular error
-        point.set('le', '100')  # Linear error
-
-        # Detail data
-        detail = ET.SubElement(event, 'detail')
-        track = ET.SubElement(detail, 'track')
-        track.set('course', str(heading))
-        track.set('speed', str(speed))
-
-        contact = ET.SubElement(detail, 'contact')
-        contact.set('callsign', callsign)
-
-        remarks = ET.SubElement(detail, 'remarks')
-        remarks.text = f"ICAO24: {icao24}, Callsign: {callsign}"
-
-        return ET.tostring(event, encoding='unicode')
+        # Render CoT XML from the precompiled template
+        time_str, stale_str = times if times is not None else self.clock.now()
+        data = self.template.encode(
+            cot_type,
+            f"ADSB.{icao24}",
+            time_str,
+            stale_str,
+            str(lat if lat else 0),
+            str(lon if lon else 0),
+            str(alt if alt else 0),
+            str(heading if heading else 0),
+            str(speed if speed else 0),
+            callsign,
+            f"ICAO24: {icao24}, Callsign: {callsign}",
+        )
+        if metrics is not None:
+            metrics.observe('cot_stage_seconds', ('serialize',), time.perf_counter() - classified)
+            metrics.inc('cot_events_total', (cot_type,))
+        return data
+
+    def restore_snapshot(self, now=None):
+        """Load the aircraft snapshot; returns [(uid, CoT bytes)] for the tracks that are not stale yet.
+
+        Each event keeps the time it was last sent with, so it goes stale when
+        the original would have rather than 5 minutes after the restart.
+        """
+        if now is None:
+            now = time.time()
+        started = time.perf_counter()
+        with gc_paused():
+            loaded = load_snapshot(self.snapshot_path, self.aircraft, now)
+            stale_after = self.clock.stale_after.total_seconds()
+            results = []
+            for record in self.aircraft.records():
+                if record.sent_time is None or record.sent_time + stale_after <= now or record.sent_lat is None:
+                    continue
+                if self.geofence is not None and not self.geofence.contains(record.sent_lat, record.sent_lon):
+                    continue
+                cot_message = self.create_cot_from_adsb({
+                    'icao24': record.icao24,
+                    'callsign': record.callsign,
+                    'latitude': record.sent_lat,
+                    'longitude': record.sent_lon,
+                    'geoaltitude': record.sent_alt,
+                    'velocity': record.speed,
+                    'heading': record.sent_heading,
+                }, self.clock.at(record.sent_time))
+                if cot_message:
+                    results.append((f"ADSB.{record.icao24}", cot_message))
+        if loaded:
+            print(f"Restored {loaded:,} aircraft from {self.snapshot_path} in {time.perf_counter() - started:.2f}s, "
+                  f"re-sending {len(results):,} tracks that are not stale yet")
+        return results
+
+    def save_snapshot(self):
+        """Write the aircraft snapshot now, blocking, after any periodic write in progress."""
+        started = time.perf_counter()
+        count = self.snapshot_writer.save()
+        print(f"Saved {count:,} aircraft to {self.snapshot_path} in {time.perf_counter() - started:.2f}s")
+
+    async def snapshot_periodically(self):
+        """Write the aircraft snapshot every snapshot_interval seconds, off the event loop."""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot_writer.write()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Snapshot to {self.snapshot_path} failed: {e}")
+
+    def start(self):
+        """Start the sender, re-send tracks from the snapshot and schedule snapshots."""
+        self.transport.start()
+        if self.snapshot_path and self._snapshots is None:
+            for uid, cot_message in self.restore_snapshot():
+                self.transport.send_nowait(cot_message, uid)
+            self._snapshots = asyncio.ensure_future(self.snapshot_periodically())
+
+    def _fetch_states(self, url, params=None):
+        """Blocking OpenSky download and decode; runs in an executor thread."""
+        response = self.session.get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            print(f"Failed to fetch ADS-B data: {response.status_code}")
+            return [], len(response.content)
+        return response.json().get('states') or [], len(response.content)
 
     async def fetch_adsb_data(self):
-        """Fetch ADS-B data from OpenSky API."""
+        """Fetch ADS-B data from OpenSky API without blocking the event loop."""
         url = "https://opensky-network.org/api/states/all"
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            return response.json().get('states', [])
-        else:
-            print(f"Failed to fetch ADS-B data: {response.status_code}")
-            return []
+        params = None
+        if self.geofence is not None:
+            lamin, lomin, lamax, lomax = self.geofence.bounds()
+            params = {'lamin': lamin, 'lomin': lomin, 'lamax': lamax, 'lomax': lomax}
+        loop = asyncio.get_event_loop()
+        states, self.last_fetch_bytes = await loop.run_in_executor(None, self._fetch_states, url, params)
+        return states
+
+    def convert_states(self, states, now=None):
+        """Convert an OpenSky response; returns ([(uid, CoT bytes)], changed count)."""
+        if now is None:
+            now = time.time()
+        results = []
+        changed = 0
+        geofence = self.geofence
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.inc('cot_messages_total', ('opensky_state',), len(states))
+        for aircraft in states:
+            if geofence is not None and not geofence.contains(aircraft[6], aircraft[5]):
+                self.outside += 1
+                if metrics is not None:
+                    metrics.inc('cot_filtered_total', ('geofence',))
+                continue
+            # Map OpenSky data to a dictionary
+            aircraft_dict = {
+                'icao24': aircraft[0],
+                'callsign': aircraft[1],
+                'latitude': aircraft[6],
+                'longitude': aircraft[5],
+                'geoaltitude': aircraft[7],
+                'velocity': aircraft[9],
+                'heading': aircraft[10],
+            }
+
+            # Skip aircraft that have not moved since they were last sent
+            record = self.aircraft.touch(aircraft_dict['icao24'], now)
+            record.callsign = aircraft_dict['callsign']
+            record.lat, record.lon = aircraft_dict['latitude'], aircraft_dict['longitude']
+            record.alt, record.speed, record.heading = (aircraft_dict['geoaltitude'], aircraft_dict['velocity'],
+                                                        aircraft_dict['heading'])
+            if not self.aircraft.should_send(record, aircraft_dict['latitude'], aircraft_dict['longitude'],
+                                             aircraft_dict['geoaltitude'], aircraft_dict['heading'], now):
+                if metrics is not None:
+                    metrics.inc('cot_filtered_total', ('unchanged',))
+                continue
+            changed += 1
+
+            cot_message = self.create_cot_from_adsb(aircraft_dict)
+            if cot_message:
+                results.append((f"ADSB.{aircraft_dict['icao24']}", cot_message))
+        return results, changed
 
     async def connect_and_process(self):
-        """Fetch ADS-B data and forward as CoT messages."""
+        """Fetch ADS-B data and forward changed aircraft as CoT messages."""
+        self.start()
+
         while True:
             try:
+                started = time.monotonic()
                 adsb_data = await self.fetch_adsb_data()
-                for aircraft in adsb_data:
-                    # Map OpenSky data to a dictionary
-                    aircraft_dict = {
-                        'icao24': aircraft[0],
-                        'callsign': aircraft[1],
-                        'latitude': aircraft[6],
-                        'longitude': aircraft[5],
-                        'geoaltitude': aircraft[7],
-                        'velocity': aircraft[9],
-                        'heading': aircraft[10],
-                    }
-
-                    cot_message = self.create_cot_from_adsb(aircraft_dict)
-                    if cot_message:
-                        if self.protocol == 'tcp':
-                            self.socket.send(cot_message.encode() + b'\n')
-                        else:
-                            self.socket.sendto(cot_message.encode(), 
-                                               (self.cot_host, self.cot_port))
-
-                await asyncio.sleep(10)  # Fetch data every 10 seconds
+                results, changed = self.convert_states(adsb_data)
+                if self.metrics is None:
+                    for uid, cot_message in results:
+                        await self.transport.send(cot_message, uid)
+                else:
+                    self.metrics.observe('cot_stage_seconds', ('fetch',), time.monotonic() - started)
+                    # Lag is measured from each aircraft's time_position
+                    origins = {f"ADSB.{aircraft[0]}": aircraft[3] for aircraft in adsb_data}
+                    for uid, cot_message in results:
+                        await self.transport.send(cot_message, uid, origins.get(uid))
+
+                print(f"Poll: {self.last_fetch_bytes / 1e6:.1f} MB fetched in {time.monotonic() - started:.1f}s, "
+                      f"{len(adsb_data)} aircraft, {changed} changed, {len(results)} events sent "
+                      f"({self.transport.queue_depth} queued)")
+                await asyncio.sleep(self.poll_interval)
             except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.inc('cot_errors_total', ('fetch',))
                 print(f"Error: {e}")
                 await asyncio.sleep(5)
 
-    def run(self):
-        """Run the converter."""
-        asyncio.get_event_loop().run_until_complete(self.connect_and_process())
+    def process_sbs_line(self, line, now=None):
+        """Merge one SBS-1 line into aircraft state; returns (uid, CoT bytes) when it moved an aircraft."""
+        if now is None:
+            now = time.time()
+        metrics = self.metrics
+        if metrics is None:
+            record = sbs.apply_sbs_line(self.aircraft, line, now)
+        else:
+            started = time.perf_counter()
+            record = sbs.apply_sbs_line(self.aircraft, line, now)
+            metrics.observe('cot_stage_seconds', ('decode',), time.perf_counter() - started)
+            metrics.inc('cot_messages_total', ('sbs',))
+        if record is not None and self.geofence is not None and not self.geofence.contains(record.lat, record.lon):
+            self.outside += 1
+            if metrics is not None:
+                metrics.inc('cot_filtered_total', ('geofence',))
+            return None
+        if record is None or not self.aircraft.should_send(record, record.lat, record.lon, record.alt,
+                                                            record.heading, now):
+            if record is not None and metrics is not None:
+                metrics.inc('cot_filtered_total', ('unchanged',))
+            return None
+        cot_message = self.create_cot_from_adsb({
+            'icao24': record.icao24,
+            'callsign': record.callsign,
+            'latitude': record.lat,
+            'longitude': record.lon,
+            'geoaltitude': record.alt,
+            'velocity': record.speed,
+            'heading': record.heading,
+        })
+        if cot_message is None:
+            return None
+        return f"ADSB.{record.icao24}", cot_message
+
+    async def stream_sbs(self, host, port=30003):
+        """Read a dump1090 SBS-1 feed and forward each position update as it arrives."""
+        self.start()
+        delay = 1.0
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                print(f"Connected to SBS-1 feed at {host}:{port}")
+                delay = 1.0
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError("feed closed")
+                    received = time.time()  # Lag is measured from reception of the line
+                    try:
+                        result = self.process_sbs_line(line.decode('ascii', 'replace'), received)
+                    except ValueError:
+                        self.malformed += 1
+                        if self.metrics is not None:
+                            self.metrics.inc('cot_errors_total', ('decode',))
+                        continue
+                    if result is not None:
+                        await self.transport.send(result[1], result[0], received)
+            except (OSError, ValueError) as e:  # ValueError: line longer than the stream limit
+                if self.metrics is not None:
+                    self.metrics.inc('cot_errors_total', ('connection',))
+                print(f"SBS-1 feed {host}:{port} failed ({e}). Reconnecting in {delay:.1f}s...")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def run(self, sbs_host=None, sbs_port=30003, metrics_port=None):
+        """Run the converter, polling OpenSky or streaming from an SBS-1 feed; serves /metrics on metrics_port."""
+        if metrics_port is not None:
+            port = asyncio.get_event_loop().run_until_complete(
+                MetricsServer(self.metrics, '127.0.0.1', metrics_port).start())
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+        if sbs_host:
+            asyncio.get_event_loop().run_until_complete(self.stream_sbs(sbs_host, sbs_port))
+        else:
+            asyncio.get_event_loop().run_until_complete(self.connect_and_process())
 
 
 def main():
@@ -163,14 +395,22 @@ def main():
     ip = input("Enter destination IP address: ").strip()
     port = int(input("Enter destination port: ").strip())
     protocol = input("Enter protocol (tcp/udp) [default: tcp]: ").strip().lower() or 'tcp'
+    encoding = input("Enter encoding (xml/protobuf) [default: xml]: ").strip().lower() or 'xml'
+    feed = input("Enter dump1090 SBS-1 feed host[:port] (blank to poll OpenSky): ").strip()
+    sbs_host, _, sbs_port = feed.partition(':')
 
     print("\nPress Ctrl+C to stop the converter.\n")
 
-    converter = ADSBToCoTConverter(ip, port, protocol)
+    geofence = GeofenceIndex.from_file(AREAS_FILE) if AREAS_FILE else None
+    converter = ADSBToCoTConverter(ip, port, protocol, encoding=encoding, geofence=geofence,
+                                   metrics=Metrics() if METRICS_PORT else None, snapshot_path=SNAPSHOT_FILE,
+                                   snapshot_interval=SNAPSHOT_INTERVAL)
     try:
-        converter.run()
+        converter.run(sbs_host or None, int(sbs_port or 30003), METRICS_PORT)
     except KeyboardInterrupt:
         print("\nShutting down...")
+        if SNAPSHOT_FILE:
+            converter.save_snapshot()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class AircraftRecord:
+    """Latest known and last-sent state for one ICAO24 address"""
+    __slots__ = ('icao24', 'callsign', 'lat', 'lon', 'alt', 'speed', 'heading', 'last_seen',
+                 'sent_time', 'sent_lat', 'sent_lon', 'sent_alt', 'sent_heading')
+
+    def __init__(self, icao24: str, last_seen: float):
+        self.icao24 = icao24
+        self.callsign = None
+        self.lat = None
+        self.lon = None
+        self.alt = None
+        self.speed = None
+        self.heading = None
+        self.last_seen = last_seen
+        # Last state forwarded downstream
+        self.sent_time = None
+        self.sent_lat = None
+        self.sent_lon = None
+        self.sent_alt = None
+        self.sent_heading = None
+
+
+class AircraftRegistry:
+    """In-memory aircraft state keyed by ICAO24 with LRU and age eviction
+
+    Also decides which aircraft need re-sending: only those whose position,
+    altitude or heading changed since the last send, plus a refresh of every
+    aircraft at least every `refresh_interval` seconds so tracks never go
+    stale on the TAK side while they are still being received.
+    """
+
+    def __init__(self, max_aircraft: int = 100000, max_age: float = 600, refresh_interval: float = 120):
+        self.max_aircraft = max_aircraft
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.evicted = 0
+        self._records: Dict[str, AircraftRecord] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, icao24) -> bool:
+        return icao24 in self._records
+
+    def get(self, icao24) -> Optional[AircraftRecord]:
+        """Return the record for an ICAO24 address without touching it"""
+        return self._records.get(icao24)
+
+    def records(self) -> Iterator[AircraftRecord]:
+        """Every record, least recently seen first"""
+        return iter(self._records.values())
+
+    def copy_records(self) -> List[AircraftRecord]:
+        """A list of every record in no particular order
+
+        Much faster than listing records(), which follows the LRU order through
+        the whole registry; for snapshots, which are put back in order on restore.
+        """
+        return list(dict.values(self._records))
+
+    def restore(self, records: Iterable[AircraftRecord], now: float = None) -> int:
+        """Add records loaded from a snapshot; returns how many were kept
+
+        Records older than max_age are skipped, and only the newest max_aircraft are kept.
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - self.max_age
+        kept = [record for record in records if record.last_seen >= cutoff]
+        kept.sort(key=lambda record: record.last_seen)
+        stored = self._records
+        for record in kept[-self.max_aircraft:]:
+            stored[record.icao24] = record
+            stored.move_to_end(record.icao24)
+        while len(stored) > self.max_aircraft:
+            stored.popitem(last=False)
+            self.evicted += 1
+        return min(len(kept), self.max_aircraft)
+
+    def touch(self, icao24, now: float = None) -> AircraftRecord:
+        """Return the record for an ICAO24 address, creating it if needed, and mark it as seen"""
+        if now is None:
+            now = time.time()
+        records = self._records
+        record = records.get(icao24)
+        if record is None:
+            self._evict(now)
+            record = records[icao24] = AircraftRecord(icao24, now)
+        else:
+            record.last_seen = now
+            records.move_to_end(icao24)
+        return record
+
+    def should_send(self, record: AircraftRecord, lat, lon, alt, heading, now: float) -> bool:
+        """Whether this state is new to the receiver; if so it is recorded as sent"""
+        if (record.sent_time is not None and now - record.sent_time < self.refresh_interval
+                and lat == record.sent_lat and lon == record.sent_lon
+                and alt == record.sent_alt and heading == record.sent_heading):
+            return False
+        record.sent_time = now
+        record.sent_lat = lat
+        record.sent_lon = lon
+        record.sent_alt = alt
+        record.sent_heading = heading
+        return True
+
+    def _evict(self, now: float):
+        """Drop the oldest records until there is room for one more and none are too old"""
+        records = self._records
+        cutoff = now - self.max_age
+        while records:
+            oldest = next(iter(records.values()))
+            if len(records) < self.max_aircraft and oldest.last_seen >= cutoff:
+                break
+            records.popitem(last=False)
+            self.evicted += 1
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import gzip
+import struct
+import time
+from typing import AsyncIterator, Iterator, Tuple
+
+# File layout: MAGIC, then per frame a RECORD header (arrival time, frame length)
+# followed by the raw UTF-8 frame. Paths ending in .gz are gzip compressed.
+MAGIC = b'AISCAP1\n'
+RECORD = struct.Struct('<dI')
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode)
+
+
+class CaptureWriter:
+    """Appends raw websocket frames with their arrival time to a capture file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self._file = _open(path, 'wb')
+        self._file.write(MAGIC)
+
+    def write(self, frame, arrival: float = None):
+        if isinstance(frame, str):
+            frame = frame.encode()
+        self._file.write(RECORD.pack(time.time() if arrival is None else arrival, len(frame)))
+        self._file.write(frame)
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, str]]:
+    """Yield (arrival time, frame) pairs from a capture file"""
+    with _open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an AIS capture file")
+        header_size = RECORD.size
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return
+            arrival, length = RECORD.unpack(header)
+            yield arrival, f.read(length).decode()
+
+
+class ReplaySource:
+    """Feeds a capture back as a frame source for AISToCoTConverter.connect_and_process
+
+    speed is a multiple of the recorded rate (1.0 = real time); 0 replays as
+    fast as the pipeline accepts frames.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self.frames = 0
+        self.first_yield = None
+        self.last_yield = None
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._frames()
+
+    async def _frames(self):
+        start = None
+        first_arrival = None
+        for arrival, frame in read_capture(self.path):
+            if self.speed:
+                if start is None:
+                    start = time.monotonic()
+                    first_arrival = arrival
+                delay = (arrival - first_arrival) / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif self.frames % 200 == 0:
+                await asyncio.sleep(0)  # Let the transport run at max speed too
+            self.last_yield = time.perf_counter()
+            if self.first_yield is None:
+                self.first_yield = self.last_yield
+            self.frames += 1
+            yield frame
+
+
+def write_synthetic_capture(path: str, frames: int, fleet_size: int = 5000, rate: float = 300.0, seed: int = 1) -> int:
+    """Write a capture of synthetic AISstream frames arriving at `rate` frames per second"""
+    from synthetic_ais import generate_frames
+
+    arrival = time.time()
+    with CaptureWriter(path) as writer:
+        for frame in generate_frames(frames, fleet_size=fleet_size, seed=seed):
+            arrival += 1.0 / rate
+            writer.write(frame, arrival)
+        return writer.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and replay AISstream frame captures")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synth', help="write a synthetic capture")
+    synth.add_argument('path')
+    synth.add_argument('--frames', type=int, default=100000)
+    synth.add_argument('--fleet', type=int, default=5000)
+    synth.add_argument('--rate', type=float, default=300.0, help="recorded frames per second")
+
+    replay = commands.add_parser('replay', help="replay a capture through the converter")
+    replay.add_argument('path')
+    replay.add_argument('host')
+    replay.add_argument('port', type=int)
+    replay.add_argument('--protocol', default='tcp', choices=['tcp', 'udp'])
+    replay.add_argument('--speed', type=float, default=1.0, help="rate multiple, 0 for max speed")
+
+    args = parser.parse_args()
+    if args.command == 'synth':
+        count = write_synthetic_capture(args.path, args.frames, args.fleet, args.rate)
+        print(f"Wrote {count:,} frames to {args.path}")
+    else:
+        from ais_to_cot import AISToCoTConverter
+
+        converter = AISToCoTConverter(args.host, args.port, args.protocol)
+        source = ReplaySource(args.path, args.speed)
+        start = time.perf_counter()
+        asyncio.run(converter.connect_and_process(source))
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {source.frames:,} frames in {elapsed:.1f}s ({source.frames / elapsed:,.0f} frames/s), "
+              f"{converter.transport.sent:,} events sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import calendar
+import json
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+# Optional faster JSON backends, in order of preference
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+BACKENDS: Dict[str, Callable[[Union[str, bytes]], Any]] = {}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+if ujson is not None:
+    BACKENDS['ujson'] = ujson.loads
+BACKENDS['json'] = json.loads
+
+DEFAULT_MESSAGE_TYPES = ('PositionReport', 'StaticData')
+
+
+@lru_cache(maxsize=64)
+def _epoch_second(stamp: str) -> int:
+    return calendar.timegm(time.strptime(stamp, '%Y-%m-%d %H:%M:%S'))
+
+
+def time_utc_seconds(time_utc: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch of an AISstream time_utc such as '2024-01-01 12:00:00.123456789 +0000 UTC'
+
+    Frames arrive roughly in time order, so the whole-second part is parsed
+    once per second and cached. Returns None if the value is missing or not
+    in that format.
+    """
+    if not time_utc:
+        return None
+    try:
+        seconds = _epoch_second(time_utc[:19])
+    except ValueError:
+        return None
+    if time_utc[19:20] != '.':
+        return float(seconds)
+    fraction = time_utc[20:].split(' ', 1)[0]
+    return seconds + (int(fraction) / 10 ** len(fraction) if fraction.isdigit() else 0.0)
+
+
+class AISRecord:
+    """The fields of an AISstream frame that the converter uses"""
+    __slots__ = ('message_type', 'mmsi', 'ship_name', 'time_utc',
+                 'lat', 'lon', 'sog', 'cog', 'heading',
+                 'is_static', 'ship_type', 'name', 'length', 'beam')
+
+    def __init__(self, message_type: str = None, mmsi: int = None, ship_name: str = '', time_utc: str = None):
+        self.message_type = message_type
+        self.mmsi = mmsi
+        self.ship_name = ship_name
+        self.time_utc = time_utc
+        self.lat = None
+        self.lon = None
+        self.sog = None
+        self.cog = None
+        self.heading = None
+        self.is_static = False
+        self.ship_type = None
+        self.name = None
+        self.length = None
+        self.beam = None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, AISRecord):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"AISRecord({fields})"
+
+
+def record_from_dict(ais_data: Dict[str, Any]) -> AISRecord:
+    """Build an AISRecord from a decoded AISstream message"""
+    metadata = ais_data.get('MetaData') or {}
+    message = ais_data.get('Message') or {}
+    record = AISRecord(ais_data.get('MessageType'), metadata.get('MMSI'),
+                       (metadata.get('ShipName') or '').strip(), metadata.get('time_utc'))
+
+    position_report = message.get('PositionReport')
+    if position_report:
+        record.lat = position_report.get('Latitude')
+        record.lon = position_report.get('Longitude')
+        record.sog = position_report.get('Sog')  # Speed over ground
+        record.cog = position_report.get('Cog')
+        record.heading = position_report.get('TrueHeading')
+
+    static_data = message.get('StaticData')
+    if static_data is not None:
+        record.is_static = True
+        record.ship_type = static_data.get('Type')
+        record.name = (static_data.get('Name') or '').strip() or None
+        dimension = static_data.get('Dimension')
+        if dimension:
+            record.length = (dimension.get('A') or 0) + (dimension.get('B') or 0) or None
+            record.beam = (dimension.get('C') or 0) + (dimension.get('D') or 0) or None
+    return record
+
+
+def peek_message_type(frame: Union[str, bytes]) -> Optional[Union[str, bytes]]:
+    """Read the MessageType value from a raw frame without decoding it
+
+    Returns None if the key is not found; the value has the frame's type.
+    """
+    if isinstance(frame, str):
+        key, quote = '"MessageType"', '"'
+    else:
+        key, quote = b'"MessageType"', b'"'
+    start = frame.find(key)
+    if start < 0:
+        return None
+    start = frame.find(quote, start + len(key)) + 1
+    end = frame.find(quote, start)
+    if start <= 0 or end < 0:
+        return None
+    return frame[start:end]
+
+
+class AISDecoder:
+    """Decodes raw AISstream frames into AISRecords
+
+    Frames whose MessageType is not wanted are rejected from a substring peek
+    before any JSON parsing; frames the peek cannot read a MessageType from
+    (truncated or garbage) are parsed in full, so they fail as malformed
+    rather than pass as unwanted. The JSON backend defaults to the fastest one
+    installed (orjson, then ujson, then the standard library); all produce
+    identical records.
+    """
+
+    def __init__(self, message_types: Iterable[str] = DEFAULT_MESSAGE_TYPES, backend: str = None):
+        if backend is None:
+            backend = next(iter(BACKENDS))
+        if backend not in BACKENDS:
+            raise ValueError(f"JSON backend {backend!r} is not available, expected one of {list(BACKENDS)}")
+        self.backend = backend
+        self.message_types = frozenset(message_types)
+        self._wanted = self.message_types | {t.encode() for t in self.message_types}
+        self._loads = BACKENDS[backend]
+        self.decoded = 0
+        self.rejected = 0
+
+    def decode(self, frame: Union[str, bytes]) -> Optional[AISRecord]:
+        """Return the record for a wanted frame, None for an unwanted one
+
+        Raises ValueError for frames that are not valid JSON.
+        """
+        message_type = peek_message_type(frame)
+        if message_type is not None and message_type not in self._wanted:
+            self.rejected += 1
+            return None
+        ais_data = self._loads(frame)
+        if not isinstance(ais_data, dict) or ais_data.get('MessageType') not in self.message_types:
+            self.rejected += 1
+            return None
+        self.decoded += 1
+        return record_from_dict(ais_data)
@@ -0,0 +1,314 @@
+"""Raw NMEA 0183 !AIVDM/!AIVDO decoding for local AIS receivers
+
+NMEADecoder turns sentences into the same AISRecords as AISDecoder, so it
+can be passed as AISToCoTConverter(decoder=...) and fed with NMEASource.
+Message types 1/2/3 (class A position), 5 (static and voyage data),
+18/19 (class B position) and 24 (class B static data) are decoded.
+"""
+import asyncio
+import binascii
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+
+from ais_decoder import AISRecord
+
+# The payload armoring is base64 with a different alphabet: translating to
+# the standard alphabet lets binascii unpack the 6-bit groups in C. Any other
+# character becomes '!', which a2b_base64 skips, so it shows as a short result
+_ARMOR = bytes(code + 48 if code < 40 else code + 56 for code in range(64))
+_TO_BASE64 = bytes.maketrans(_ARMOR + bytes(set(range(256)) - set(_ARMOR)),
+                             b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/' + b'!' * 192)
+_LOW_256 = (1 << 256) - 1
+
+# Checksum field (either case of hex digit) -> value, looked up instead of parsed
+_HEX_DIGITS = {digit: int(chr(digit), 16) for digit in b'0123456789abcdefABCDEF'}
+_CHECKSUMS = {bytes((high, low)): _HEX_DIGITS[high] << 4 | _HEX_DIGITS[low]
+              for high in _HEX_DIGITS for low in _HEX_DIGITS}
+_FILL_BITS = {b'': 0, b'0': 0, b'1': 1, b'2': 2, b'3': 3, b'4': 4, b'5': 5}
+
+# 6-bit value -> AIS text character
+_SIXBIT_TEXT = '@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_ !"#$%&\'()*+,-./0123456789:;<=>?'
+
+MESSAGE_TYPES = {
+    1: 'PositionReport',
+    2: 'PositionReport',
+    3: 'PositionReport',
+    5: 'ShipStaticData',
+    18: 'StandardClassBPositionReport',
+    19: 'ExtendedClassBPositionReport',
+    24: 'StaticDataReport',
+}
+
+
+def nmea_checksum(body: Union[str, bytes]) -> int:
+    """XOR of all characters between '!' and '*'
+
+    Folds the sentence as one big int in halves instead of looping over
+    characters; a sentence body (at most 80 characters) takes one pass of
+    fixed shifts.
+    """
+    if isinstance(body, str):
+        body = body.encode('ascii')
+    value = int.from_bytes(body, 'little')
+    while value >> 1024:
+        value = (value & ((1 << 1024) - 1)) ^ (value >> 1024)
+    value ^= value >> 512
+    value = (value ^ (value >> 256)) & _LOW_256
+    value ^= value >> 128
+    value ^= value >> 64
+    value ^= value >> 32
+    value ^= value >> 16
+    value ^= value >> 8
+    return value & 0xFF
+
+
+def payload_bits(payload: Union[str, bytes], fill_bits: int = 0) -> Tuple[int, int]:
+    """(value, bit length) of an armored payload, without the fill bits"""
+    if isinstance(payload, str):
+        payload = payload.encode('ascii')
+    pad = -len(payload) % 4  # Whole base64 quanta, padded with zero bits
+    try:
+        data = binascii.a2b_base64(payload.translate(_TO_BASE64) + b'A' * pad)
+    except binascii.Error:
+        data = b''
+    if len(data) * 4 != (len(payload) + pad) * 3:
+        raise ValueError(f"invalid payload characters in {payload!r}")
+    return int.from_bytes(data, 'big') >> (6 * pad + fill_bits), 6 * len(payload) - fill_bits
+
+
+class _Fields:
+    """Big-endian bit field access into a decoded payload"""
+    __slots__ = ('value', 'length')
+
+    def __init__(self, value: int, length: int):
+        self.value = value
+        self.length = length
+
+    def uint(self, start: int, width: int) -> int:
+        shift = self.length - start - width
+        if shift < 0:
+            raise ValueError(f"payload too short: {self.length} bits, field ends at {start + width}")
+        return (self.value >> shift) & ((1 << width) - 1)
+
+    def sint(self, start: int, width: int) -> int:
+        value = self.uint(start, width)
+        return value - (1 << width) if value >> (width - 1) else value
+
+    def text(self, start: int, width: int) -> str:
+        # Short payloads are common for type 5/24 text; decode what is there
+        width = min(width, self.length - start) // 6 * 6
+        value = self.uint(start, width) if width > 0 else 0
+        chars = [_SIXBIT_TEXT[(value >> shift) & 63] for shift in range(width - 6, -1, -6)]
+        return ''.join(chars).split('@', 1)[0].strip()
+
+
+def _position(record: AISRecord, value: int, length: int, end: int):
+    """Speed, position, course and heading, laid out the same in types 1/2/3, 18 and 19 up to `end`
+
+    The "not available" values (longitude 181, latitude 91, speed 1023, course
+    3600, heading 511) and anything out of range come out as None, like fields
+    missing from an AISstream frame.
+    """
+    # The hot path: the block is shifted down once, so the fields come out of
+    # a small int at fixed offsets rather than going through _Fields
+    if length < end:
+        raise ValueError(f"payload too short: {length} bits, position ends at {end}")
+    block = value >> (length - end)
+    heading = block & 0x1FF
+    record.heading = heading if heading < 360 else None
+    cog = (block >> 9) & 0xFFF
+    record.cog = cog / 10 if cog < 3600 else None
+    y = (block >> 21) & 0x7FFFFFF
+    lat = (y - 0x8000000 if y & 0x4000000 else y) / 600000
+    x = (block >> 48) & 0xFFFFFFF
+    lon = (x - 0x10000000 if x & 0x8000000 else x) / 600000
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        record.lat = lat
+        record.lon = lon
+    sog = (block >> 77) & 0x3FF
+    record.sog = sog / 10 if sog != 1023 else None
+
+
+def _static(record: AISRecord, fields: _Fields, name: Optional[int], ship_type: Optional[int], dimension: Optional[int]):
+    if name is not None:
+        record.name = fields.text(name, 120) or None
+    if ship_type is not None:
+        record.ship_type = fields.uint(ship_type, 8)
+    if dimension is not None:
+        record.length = fields.uint(dimension, 9) + fields.uint(dimension + 9, 9) or None
+        record.beam = fields.uint(dimension + 18, 6) + fields.uint(dimension + 24, 6) or None
+
+
+def decode_payload(payload: Union[str, bytes], fill_bits: int = 0) -> Optional[AISRecord]:
+    """Decode one complete AIS payload; None for message types that are not used"""
+    value, length = payload_bits(payload, fill_bits)
+    if length < 38:
+        raise ValueError(f"payload too short: {length} bits")
+    message_id = value >> (length - 6)
+    message_type = MESSAGE_TYPES.get(message_id)
+    if message_type is None:
+        return None
+    record = AISRecord(message_type, (value >> (length - 38)) & 0x3FFFFFFF)
+    if message_id <= 3:
+        _position(record, value, length, 137)
+    elif message_id == 18:
+        _position(record, value, length, 133)
+    elif message_id == 19:
+        # Class B position with the static fields appended: the name is used like
+        # AISstream's MetaData.ShipName, ship type and dimensions like type 5's
+        _position(record, value, length, 133)
+        _static(record, _Fields(value, length), 143, 263, 271)
+        record.ship_name = record.name or ''
+        record.is_static = record.lat is None  # Without a position only the static data is used
+    else:
+        record.is_static = True
+        if message_id == 5:
+            _static(record, _Fields(value, length), 112, 232, 240)
+        elif (value >> (length - 40)) & 3 == 0:  # Type 24 part A
+            _static(record, _Fields(value, length), 40, None, None)
+        else:  # Type 24 part B
+            _static(record, _Fields(value, length), None, 40, 132)
+    return record
+
+
+class NMEADecoder:
+    """Decodes !AIVDM/!AIVDO sentences into AISRecords
+
+    Multi-fragment messages are reassembled per (fragment count, sequence
+    id, channel); at most max_pending incomplete ones are kept. decode()
+    returns None for fragments awaiting the rest of their message and for
+    unused message types, and raises ValueError for malformed sentences and
+    checksum mismatches, like AISDecoder does for bad JSON.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self.decoded = 0
+        self.rejected = 0
+        self.fragments_dropped = 0
+        self._pending: Dict[tuple, list] = OrderedDict()
+
+    def decode(self, sentence: Union[str, bytes]) -> Optional[AISRecord]:
+        """Return the record a sentence completes, or None"""
+        data = sentence.encode('ascii', 'replace') if isinstance(sentence, str) else sentence
+        data = data.strip()
+        if data[:1] == b'\\':  # NMEA 4.0 tag block
+            data = data[data.find(b'\\', 1) + 1:]
+        star = data.rfind(b'*')
+        if data[:1] != b'!' or star < 0 or data[3:6] not in (b'VDM', b'VDO'):
+            raise ValueError(f"not an AIVDM/AIVDO sentence: {data[:80]!r}")
+        body = data[1:star]
+        checksum = _CHECKSUMS.get(data[star + 1:star + 3])
+        if checksum is None:
+            raise ValueError(f"invalid checksum field: {data[:80]!r}")
+        if nmea_checksum(body) != checksum:
+            raise ValueError(f"checksum mismatch: {data[:80]!r}")
+
+        parts = body.split(b',')
+        if len(parts) != 7:
+            raise ValueError(f"expected 7 fields, got {len(parts)}: {data[:80]!r}")
+        _, count, number, sequence_id, channel, payload, fill_bits = parts
+        if count == b'1':
+            return self._complete(payload, fill_bits)
+        return self._fragment(int(count), int(number), sequence_id, channel, payload, fill_bits)
+
+    def _fragment(self, count: int, number: int, sequence_id: bytes, channel: bytes, payload: bytes, fill_bits: bytes):
+        key = (count, sequence_id, channel)
+        pending = self._pending
+        if number == 1:
+            if key in pending:
+                self.fragments_dropped += len(pending.pop(key))
+            if len(pending) >= self.max_pending:
+                self.fragments_dropped += len(pending.popitem(last=False)[1])
+            pending[key] = [payload]
+            return None
+        parts = pending.get(key)
+        if parts is None or len(parts) != number - 1:
+            # Out of order or the start was missed: nothing to attach it to
+            self.fragments_dropped += 1
+            if parts is not None:
+                self.fragments_dropped += len(pending.pop(key))
+            return None
+        parts.append(payload)
+        if number < count:
+            return None
+        del pending[key]
+        return self._complete(b''.join(parts), fill_bits)
+
+    def _complete(self, payload: bytes, fill_bits: bytes) -> Optional[AISRecord]:
+        bits = _FILL_BITS.get(fill_bits)
+        if bits is None:
+            raise ValueError(f"invalid fill bits {fill_bits!r}")
+        record = decode_payload(payload, bits)
+        if record is None:
+            self.rejected += 1
+            return None
+        self.decoded += 1
+        return record
+
+
+class NMEASource:
+    """Async iterable of NMEA lines from a local receiver
+
+    protocol 'udp' listens on host:port for datagrams (one or more lines
+    each); 'tcp' connects to a receiver's NMEA server and reconnects when
+    the connection drops.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 10110, protocol: str = 'udp',
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.lower()
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.lines = 0
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        if self.protocol == 'udp':
+            return self._udp_lines()
+        return self._tcp_lines()
+
+    async def _udp_lines(self):
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                queue.put_nowait(data)
+
+        transport, _ = await loop.create_datagram_endpoint(_Protocol, local_addr=(self.host, self.port))
+        print(f"Listening for NMEA on UDP {self.host}:{self.port}")
+        try:
+            while True:
+                data = await queue.get()
+                for line in data.decode('ascii', 'replace').splitlines():
+                    if line:
+                        self.lines += 1
+                        yield line
+        finally:
+            transport.close()
+
+    async def _tcp_lines(self):
+        delay = self.reconnect_delay
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                print(f"Connected to NMEA feed at {self.host}:{self.port}")
+                delay = self.reconnect_delay
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError("feed closed")
+                    line = line.decode('ascii', 'replace').strip()
+                    if line:
+                        self.lines += 1
+                        yield line
+            except (OSError, ValueError) as e:  # ValueError: line longer than the stream limit
+                print(f"NMEA feed {self.host}:{self.port} failed ({e}). Reconnecting in {delay:.1f}s...")
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
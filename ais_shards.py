@@ -0,0 +1,157 @@
+"""Sharded AISstream subscriptions: the area of interest split over several websockets
+
+Each shard subscribes to its own group of BoundingBoxes on its own
+connection and reconnects on its own with jittered exponential backoff, so
+a dropped connection only blanks out that shard's part of the world, and a
+single connection no longer caps the ingest rate. Boxes of different
+shards share edges, so a report on an edge can arrive twice; FrameDeduper
+drops the second copy.
+"""
+import random
+import time
+from typing import AsyncIterator, List, Optional, Sequence
+
+# AISstream corner order is [[lat, lon], [lat, lon]]
+WORLD = [[-90.0, -180.0], [90.0, 180.0]]
+
+
+def box_area(box: Sequence[Sequence[float]]) -> float:
+    (lat1, lon1), (lat2, lon2) = box
+    return abs(lat2 - lat1) * abs(lon2 - lon1)
+
+
+def split_boxes(boxes: Sequence[Sequence[Sequence[float]]], shards: int) -> List[List[List[List[float]]]]:
+    """Group subscription boxes into `shards` groups of about the same area
+
+    While there are fewer boxes than shards the largest is halved across its
+    longer side; then boxes go largest first to the group with the least
+    area. Area stands in for traffic, which AISstream does not tell us.
+    """
+    boxes = [[[min(lat1, lat2), min(lon1, lon2)], [max(lat1, lat2), max(lon1, lon2)]]
+             for (lat1, lon1), (lat2, lon2) in boxes]
+    if shards <= 1:
+        return [boxes]
+    while len(boxes) < shards:
+        boxes.sort(key=box_area)
+        (south, west), (north, east) = boxes.pop()
+        if east - west >= north - south:
+            middle = (west + east) / 2
+            boxes += [[[south, west], [north, middle]], [[south, middle], [north, east]]]
+        else:
+            middle = (south + north) / 2
+            boxes += [[[south, west], [middle, east]], [[middle, west], [north, east]]]
+
+    groups = [[] for _ in range(shards)]
+    areas = [0.0] * shards
+    for box in sorted(boxes, key=box_area, reverse=True):
+        smallest = areas.index(min(areas))
+        groups[smallest].append(box)
+        areas[smallest] += box_area(box)
+    return groups
+
+
+class Backoff:
+    """Reconnect delays doubling from `initial` up to `maximum` seconds
+
+    Half of each delay is fixed and half random, so shards dropped by the
+    same outage do not all reconnect at the same moment.
+    """
+
+    def __init__(self, initial: float = 1.0, maximum: float = 60.0, factor: float = 2.0,
+                 rng: random.Random = None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.rng = rng if rng is not None else random.Random()
+        self.attempts = 0
+
+    def next(self) -> float:
+        ceiling = min(self.maximum, self.initial * self.factor ** min(self.attempts, 32))
+        self.attempts += 1
+        return ceiling / 2 + self.rng.uniform(0, ceiling / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class FrameDeduper:
+    """Drops frames already received recently, on any shard
+
+    AISstream sends the same message as the same text on every subscription
+    it matches, so frames are keyed by their hash. Two generations of up to
+    `window` keys are kept, enough to cover the delay between shards.
+    """
+
+    def __init__(self, window: int = 100000):
+        self.window = window
+        self.current = set()
+        self.previous = set()
+        self.duplicates = 0
+
+    def seen(self, frame) -> bool:
+        key = hash(frame)
+        if key in self.current or key in self.previous:
+            self.duplicates += 1
+            return True
+        self.current.add(key)
+        if len(self.current) >= self.window:
+            self.previous = self.current
+            self.current = set()
+        return False
+
+
+class Shard:
+    """One subscription and the counters of its connection
+
+    A gap is the time from the last frame before a connection was lost to
+    the first frame after it came back.
+    """
+
+    def __init__(self, index: int, boxes: List[List[List[float]]], backoff: Backoff = None):
+        self.index = index
+        self.boxes = boxes
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.frames = 0
+        self.connects = 0
+        self.gaps = 0
+        self.gap_time = 0.0
+        self.longest_gap = 0.0
+        self.last_frame: Optional[float] = None
+        self._rate_frames = 0
+        self._rate_start = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"Shard({self.index}, {len(self.boxes)} boxes)"
+
+    def subscription(self, api_key: str) -> dict:
+        return {"APIKey": api_key, "BoundingBoxes": self.boxes}
+
+    async def receive(self, websocket, deduper: FrameDeduper = None) -> AsyncIterator[str]:
+        """Yield frames from a websocket until it closes (raising ConnectionClosed), minus duplicates"""
+        frame = await websocket.recv()
+        now = time.monotonic()
+        self.backoff.reset()  # The subscription was accepted
+        if self.last_frame is not None:
+            gap = now - self.last_frame
+            self.gaps += 1
+            self.gap_time += gap
+            self.longest_gap = max(self.longest_gap, gap)
+        while True:
+            self.last_frame = now
+            self.frames += 1
+            if deduper is None or not deduper.seen(frame):
+                yield frame
+            frame = await websocket.recv()
+            now = time.monotonic()
+
+    def rate(self) -> float:
+        """Frames per second since the previous call"""
+        now = time.monotonic()
+        rate = (self.frames - self._rate_frames) / max(now - self._rate_start, 1e-9)
+        self._rate_frames, self._rate_start = self.frames, now
+        return rate
+
+    def stats(self) -> str:
+        return (f"shard {self.index} ({len(self.boxes)} boxes): {self.frames:,} frames, {self.rate():,.0f}/s, "
+                f"{self.connects} connections, {self.gaps} gaps (longest {self.longest_gap:.1f}s, "
+                f"total {self.gap_time:.1f}s)")
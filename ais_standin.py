@@ -0,0 +1,243 @@
+"""Local AISstream-compatible websocket server for load and reconnect testing
+
+Accepts the same subscription message as wss://stream.aisstream.io/v0/stream
+and streams synthetic PositionReport/StaticData frames inside the subscribed
+BoundingBoxes, optionally injecting disconnects, malformed frames and slow
+periods.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+
+import websockets
+
+from synthetic_ais import generate_frames
+
+
+def parse_boxes(boxes) -> list:
+    """(min_lat, min_lon, max_lat, max_lon) of each [[lat, lon], [lat, lon]] subscription box"""
+    parsed = []
+    for box in boxes:
+        (lat1, lon1), (lat2, lon2) = box
+        parsed.append((min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)))
+    return parsed
+
+
+def in_boxes(boxes, lat: float, lon: float) -> bool:
+    for min_lat, min_lon, max_lat, max_lon in boxes:
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            return True
+    return False
+
+
+def frame_position(frame: str):
+    metadata = json.loads(frame)['MetaData']
+    return metadata['latitude'], metadata['longitude']
+
+
+class AISStandIn:
+    """Synthetic AISstream server
+
+    rate is frames per second per connection. Every disconnect_every seconds
+    (varied by up to disconnect_jitter of it) the connection is dropped;
+    malformed_ratio of frames are truncated JSON; every slow_every seconds the
+    rate falls to slow_rate for slow_duration. Only frames inside a
+    connection's BoundingBoxes are sent to it.
+
+    With shared set, like the real service there is one feed of `rate` frames
+    per second and every connection gets the frames in its boxes, so
+    overlapping subscriptions receive identical frames.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, rate: float = 1000, fleet_size: int = 5000,
+                 disconnect_every: float = None, malformed_ratio: float = 0.0, slow_every: float = None,
+                 slow_duration: float = 5.0, slow_rate: float = 10.0, seed: int = 1, shared: bool = False,
+                 disconnect_jitter: float = 0.0):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.fleet_size = fleet_size
+        self.disconnect_every = disconnect_every
+        self.malformed_ratio = malformed_ratio
+        self.slow_every = slow_every
+        self.slow_duration = slow_duration
+        self.slow_rate = slow_rate
+        self.seed = seed
+        self.shared = shared
+        self.disconnect_jitter = disconnect_jitter
+        self.connections = 0
+        self.rejected = 0
+        self.disconnects = 0
+        self.frames_sent = 0
+        self.positions_sent = 0
+        self.malformed_sent = 0
+        self.subscriptions = []
+        self.delivered = set()  # Sequence numbers of shared position reports sent at least once
+        self._queues = {}  # Shared mode: connection -> (boxes, pending (sequence, frame, is_position))
+        self._feed = None
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/v0/stream"
+
+    async def start(self) -> str:
+        """Start listening; returns the stream URL"""
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        if self.shared:
+            self._feed = asyncio.ensure_future(self._run_feed())
+        return self.url
+
+    async def close(self):
+        if self._feed is not None:
+            self._feed.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @property
+    def unique_positions_sent(self) -> int:
+        """Shared mode: position reports sent on at least one connection"""
+        return len(self.delivered)
+
+    def stats(self) -> str:
+        return (f"{self.connections} connections ({self.rejected} rejected, {self.disconnects} injected disconnects), "
+                f"{self.frames_sent} frames sent ({self.positions_sent} position reports, {self.malformed_sent} malformed)")
+
+    def _rate_at(self, elapsed: float) -> float:
+        slow = self.slow_every and elapsed % self.slow_every >= self.slow_every - self.slow_duration
+        return self.slow_rate if slow else self.rate
+
+    async def _run_feed(self):
+        """Shared mode: generate the one feed and queue each frame for the connections it is in"""
+        frames = generate_frames(None, fleet_size=self.fleet_size, seed=self.seed, wall_clock=True)
+        start = last = time.monotonic()
+        owed = 0.0
+        sequence = 0
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            owed += (now - last) * self._rate_at(now - start)
+            last = now
+            for _ in range(int(owed)):
+                frame = next(frames)
+                sequence += 1
+                lat, lon = frame_position(frame)
+                is_position = '"PositionReport"' in frame
+                for boxes, pending in self._queues.values():
+                    if in_boxes(boxes, lat, lon):
+                        pending.append((sequence, frame, is_position))
+            owed -= int(owed)
+
+    async def _handle(self, websocket):
+        try:
+            subscription = json.loads(await asyncio.wait_for(websocket.recv(), 3))
+            if not subscription.get('APIKey') or not isinstance(subscription.get('BoundingBoxes'), list):
+                raise ValueError("subscription needs APIKey and BoundingBoxes")
+            boxes = parse_boxes(subscription['BoundingBoxes'])
+        except (ValueError, TypeError, AttributeError, asyncio.TimeoutError) as e:
+            self.rejected += 1
+            await websocket.send(json.dumps({'error': f"Invalid subscription: {e}"}))
+            await websocket.close()
+            return
+        self.connections += 1
+        self.subscriptions.append(subscription)
+        pending = None
+        if self.shared:
+            pending = collections.deque()
+            self._queues[websocket] = (boxes, pending)
+        try:
+            await self._stream(websocket, boxes, pending)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._queues.pop(websocket, None)
+
+    def _own_frames(self, boxes):
+        """Frames of a connection's own feed (when not shared), minus those outside its boxes"""
+        frames = generate_frames(None, fleet_size=self.fleet_size, seed=self.seed, wall_clock=True)
+        everywhere = in_boxes(boxes, -90, -180) and in_boxes(boxes, 90, 180) and len(boxes) == 1
+        sequence = 0
+        for frame in frames:
+            sequence += 1
+            if everywhere or in_boxes(boxes, *frame_position(frame)):
+                yield sequence, frame, '"PositionReport"' in frame
+
+    async def _stream(self, websocket, boxes, pending):
+        rng = random.Random(self.seed + self.connections)
+        frames = self._own_frames(boxes) if pending is None else None
+        start = time.monotonic()
+        sent = 0.0  # Frames owed so far at the current rate
+        last = start
+        disconnect_after = None
+        if self.disconnect_every:
+            disconnect_after = self.disconnect_every * (1 + rng.uniform(-1, 1) * self.disconnect_jitter)
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            elapsed = now - start
+            if disconnect_after and elapsed >= disconnect_after:
+                self.disconnects += 1
+                await websocket.close(1011, "injected disconnect")
+                return
+            if pending is None:
+                sent += (now - last) * self._rate_at(elapsed)
+                last = now
+                batch = [next(frames) for _ in range(int(sent))]
+                sent -= int(sent)
+            else:
+                batch = list(pending)
+                pending.clear()
+            for sequence, frame, is_position in batch:
+                malformed = self.malformed_ratio and rng.random() < self.malformed_ratio
+                if malformed:
+                    frame = frame[:rng.randrange(1, len(frame) - 1)]
+                await websocket.send(frame)
+                # Counted once sent, so a frame cut off by closing the server is not expected
+                self.frames_sent += 1
+                if malformed:
+                    self.malformed_sent += 1
+                elif is_position:
+                    self.positions_sent += 1
+                    if pending is not None:
+                        self.delivered.add(sequence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=1000, help="frames per second per connection")
+    parser.add_argument('--fleet', type=int, default=5000)
+    parser.add_argument('--disconnect-every', type=float, help="drop each connection after this many seconds")
+    parser.add_argument('--malformed', type=float, default=0.0, help="fraction of frames sent truncated")
+    parser.add_argument('--slow-every', type=float, help="start a slow period every this many seconds")
+    parser.add_argument('--slow-duration', type=float, default=5.0)
+    parser.add_argument('--slow-rate', type=float, default=10.0)
+    parser.add_argument('--shared', action='store_true',
+                        help="one feed at --rate split between connections by their boxes, like AISstream")
+    args = parser.parse_args()
+
+    async def serve():
+        server = AISStandIn(args.host, args.port, args.rate, args.fleet, args.disconnect_every, args.malformed,
+                           args.slow_every, args.slow_duration, args.slow_rate, shared=args.shared)
+        print(f"AISstream stand-in listening on {await server.start()}")
+        try:
+            while True:
+                await asyncio.sleep(10)
+                print(server.stats())
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+
+
+if __name__ == "__main__":
+    main()
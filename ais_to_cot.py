@@ -3,65 +3,148 @@ import asyncio
 import json
 import socket
 import datetime
-import xml.etree.ElementTree as ET
-from typing import Dict, Any, List, Set
+import sqlite3
+import time
+from typing import Dict, Any, AsyncIterable, List, Optional, Set
+
+from ais_capture import CaptureWriter
+from ais_decoder import AISDecoder, AISRecord, record_from_dict, time_utc_seconds
+from ais_nmea import NMEADecoder, NMEASource
+from ais_shards import WORLD, FrameDeduper, Shard, split_boxes
+from ais_workers import ConverterPool
+from cot_encoder import CoTClock, CoTEvent, CoTTemplate
+from cot_fanout import Destination, FanOut
+from cot_priority import PriorityBuffer
+from geofence import GeofenceIndex
+from metrics import Metrics, MetricsServer
+from tak_proto import TakProtoTemplate
+from track_snapshot import SnapshotWriter, gc_paused, load_snapshot
+from track_throttle import TrackThrottle
+from vessel_classifier import VesselClassifier
+from vessel_registry import VesselRegistry
 
 # Your AISstream.io API key
 API_KEY = "API KEY"
 
+# AISstream websocket endpoint (point at ais_standin.py for local load testing)
+STREAM_URL = "wss://stream.aisstream.io/v0/stream"
+
+# Optional JSON file with vessel classification rules (see vessel_rules.example.json)
+CLASSIFICATION_RULES = None
+
+# Worker processes for decoding and conversion (0 = convert in the main process)
+WORKERS = 0
+
+# Concurrent AISstream websockets, each subscribed to a share of the area of interest
+# and reconnecting on its own (1 = a single subscription)
+SHARDS = 1
+
+# Optional file to record raw AISstream frames to, for replay with ais_capture.py
+CAPTURE_FILE = None
+
+# Optional local receiver instead of AISstream: ('udp', '0.0.0.0', 10110) listens for
+# NMEA !AIVDM datagrams, ('tcp', host, port) connects to a receiver's NMEA server
+NMEA_SOURCE = None
+
+# Optional list of destinations to send to instead of prompting for one, each a dict of
+# Destination settings, e.g. {'host': '192.168.1.10', 'port': 8087, 'protocol': 'tcp',
+# 'exclude_types': ['a-f-G-E-V-F'], 'bbox': (50.0, -6.0, 61.0, 2.0)}
+DESTINATIONS = None
+
+# Optional local port to serve Prometheus metrics on (http://127.0.0.1:PORT/metrics)
+METRICS_PORT = None
+
+# Optional JSON file with areas of interest (see areas.example.json): only vessels inside
+# them are sent, and the AISstream subscription is narrowed to boxes around them
+AREAS_FILE = None
+
+# Optional file to keep a snapshot of vessel state in (written every SNAPSHOT_INTERVAL
+# seconds and on shutdown), so a restart re-sends tracks that are still current
+SNAPSHOT_FILE = None
+SNAPSHOT_INTERVAL = 60
+
+# Optional priority classes for the prompted destination (add 'priorities' to a DESTINATIONS
+# entry for those): when it falls behind, higher priority CoT types are sent first and the
+# lowest priority ones are dropped first; a class with a 'rate' only gets that many events
+# per second ahead of lower priorities. Types not listed go to the class without 'types'.
+# e.g. [{'name': 'military', 'types': ['a-n-G-U-C-F', 'a-n-G-E-V-A'], 'priority': 0},
+#       {'name': 'law', 'types': ['a-f-G-U-L-E'], 'priority': 1},
+#       {'name': 'passenger', 'types': ['a-f-G-E-V-P'], 'priority': 2, 'rate': 200},
+#       {'name': 'other', 'priority': 3}]
+PRIORITIES = None
+
 class AISToCoTConverter:
-    def __init__(self, cot_host: str, cot_port: int, protocol: str = 'tcp', include_types: Set[str] = None, exclude_types: Set[str] = None):
+    def __init__(self, cot_host: str, cot_port: int, protocol: str = 'tcp', include_types: Set[str] = None, exclude_types: Set[str] = None,
+                 queue_size: int = 100000, overflow: str = 'drop-oldest', coalesce: bool = True,
+                 throttle: TrackThrottle = None, classifier: VesselClassifier = None, workers: int = 0,
+                 capture_path: str = None, stream_url: str = STREAM_URL, decoder: AISDecoder = None,
+                 destinations: List[Destination] = None, encoding: str = 'xml', encodings: Set[str] = None,
+                 geofence: GeofenceIndex = None, shards: int = 1, metrics: Metrics = None,
+                 origin_times: bool = None, snapshot_path: str = None, snapshot_interval: float = 60,
+                 priorities: List[dict] = None):
         self.api_key = API_KEY
+        self.stream_url = stream_url
         self.cot_host = cot_host
         self.cot_port = cot_port
         self.protocol = protocol.lower()
         self.include_types = include_types
         self.exclude_types = exclude_types
-        self.socket = None
-        
-        if self.protocol == 'tcp':
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.cot_host, self.cot_port))
-        else:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Only position reports and static data are decoded; other frames are rejected unparsed
+        self.decoder = decoder if decoder is not None else AISDecoder(('PositionReport', 'StaticData'))
+        self.clock = CoTClock(datetime.timedelta(hours=1))
+        self.template = CoTTemplate(how='h-e', ce='10', le='10')  # AIS electronic tracking
+        self.vessels = VesselRegistry()  # Static data joined into later position reports
+        self.throttle = throttle  # Optional suppression of updates that add no information
+        self.classifier = classifier if classifier is not None else VesselClassifier()
+        # Optional areas of interest: positions outside them are dropped, and the
+        # AISstream subscription only covers them
+        self.geofence = geofence
+        self.outside = 0
+        # Optional counters and stage timings; events carry their time_utc as origin
+        # (for end-to-end lag) when metrics are on, also in worker processes
+        self.metrics = metrics
+        self.origin_times = origin_times if origin_times is not None else metrics is not None
+        # Sending happens on its own task per destination so a slow TAK server never blocks
+        # ingestion; when one falls behind, only the newest pending event per vessel is kept.
+        # Without explicit destinations, cot_host/cot_port is the only one.
+        if destinations is None:
+            destinations = [Destination(cot_host, cot_port, self.protocol, queue_size=queue_size,
+                                        overflow=overflow, coalesce=coalesce, encoding=encoding,
+                                        priorities=priorities)]
+        self.fanout = FanOut(destinations, metrics)
+        self.transport = destinations[0].transport  # The first destination, for stats
+        # Each event is encoded once in every encoding some destination uses
+        self.encodings = encodings if encodings is not None else self.fanout.encodings
+        self.xml = 'xml' in self.encodings
+        self.tak_template = TakProtoTemplate(how='h-e', ce='10', le='10') if 'protobuf' in self.encodings else None
+        # With workers, this process only reads frames; conversion runs in a ConverterPool
+        # built from the same settings
+        self.workers = workers
+        self.worker_args = (cot_host, cot_port, protocol)
+        self.worker_kwargs = {'include_types': include_types, 'exclude_types': exclude_types,
+                              'throttle': throttle, 'classifier': classifier, 'decoder': decoder,
+                              'encodings': self.encodings, 'geofence': geofence,
+                              'origin_times': self.origin_times}
+        self.pool: Optional[ConverterPool] = None
+        # The subscription is split over this many websockets; duplicates from
+        # shard edges are dropped before conversion
+        self.shards: List[Shard] = []
+        self.shard_count = shards
+        self.deduper = FrameDeduper() if shards > 1 else None
+        # Optional warm-start snapshot of the vessel registry, loaded on start and written
+        # every snapshot_interval seconds and on shutdown
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_writer = SnapshotWriter(snapshot_path, self.vessels) if snapshot_path else None
+        self.capture = CaptureWriter(capture_path) if capture_path else None
+        self.malformed = 0  # Frames that could not be decoded
 
     def get_vessel_type(self, mmsi: str, ship_type: int = None) -> str:
-        """Determine vessel type and return appropriate CoT type string"""
-        mmsi_str = str(mmsi) if mmsi else ''
-        
-        # Military prefixes
-        military_prefixes = {
-            '338': 'us',    # US military
-            '339': 'us',    # US military
-            '244': 'nato',  # Netherlands military
-            '235': 'nato',  # UK military
-            '250': 'nato',  # France military
-        }
-
-        # Check for military vessels first
-        for prefix, military_type in military_prefixes.items():
-            if mmsi_str.startswith(prefix):
-                return f'a-n-G-U-C-F' if military_type == 'us' else 'a-n-G-E-V-A'  # US Navy or NATO
-
-        # If ship_type is provided, categorize based on AIS type codes
-        if ship_type:
-            if ship_type == 35:
-                return 'a-n-G-U-C-F'  # Military operations
-            elif ship_type in [51, 55]:
-                return 'a-f-G-U-L-E'  # Law Enforcement
-            elif ship_type in range(30, 38):
-                return 'a-f-G-E-V-F'  # Fishing vessels
-            elif ship_type in range(60, 70):
-                return 'a-f-G-E-V-P'  # Passenger vessels
-            elif ship_type in range(70, 80):
-                return 'a-f-G-E-V-C'  # Cargo vessels
-            elif ship_type in range(80, 90):
-                return 'a-f-G-E-V-T'  # Tankers
-            elif ship_type == 40:
-                return 'a-f-G-E-V-H'  # High speed craft
-            
-        # Default to generic commercial vessel
-        return 'a-f-G-E-V'
+        """Determine vessel type and return appropriate CoT type string
+
+        Returns None if the MMSI is excluded by the classifier's allowlist/denylist.
+        """
+        return self.classifier.classify(mmsi, ship_type)
 
     def should_process_vessel(self, cot_type: str) -> bool:
         """Determine if vessel should be processed based on filters"""
@@ -71,105 +154,312 @@ class AISToCoTConverter:
             return cot_type not in self.exclude_types
         return True
 
-    def create_cot_from_ais(self, ais_data: Dict[str, Any]) -> str:
+    def create_cot_from_ais(self, ais_data: Dict[str, Any]) -> bytes:
         """Convert AIS message to CoT XML format"""
-        # Extract data from the correct locations
-        metadata = ais_data.get('MetaData', {})
-        position_report = ais_data.get('Message', {}).get('PositionReport', {})
-        
-        # Extract all needed fields
-        mmsi = metadata.get('MMSI')
-        ship_name = metadata.get('ShipName', '').strip()
-        lat = position_report.get('Latitude')
-        lon = position_report.get('Longitude')
-        course = position_report.get('TrueHeading')
-        speed = position_report.get('Sog')  # Speed over ground
+        return self.create_cot_from_record(record_from_dict(ais_data))
+
+    def create_cot_from_record(self, record: AISRecord) -> bytes:
+        """Convert a decoded AIS record to CoT XML format"""
+        event = self.convert_record(record)
+        return event.data if event is not None else None
+
+    def convert_record(self, record: AISRecord) -> Optional[CoTEvent]:
+        """Convert a decoded AIS record to a CoT event, or None if nothing should be sent"""
+        mmsi = record.mmsi
+        now = time.time()
+        metrics = self.metrics
+
+        # Static data carries no position: remember it for later position reports
+        if record.is_static:
+            if mmsi:
+                vessel = self.vessels.touch(mmsi, now)
+                known = (vessel.ship_type, vessel.name)
+                self.vessels.update_static_fields(mmsi, record.ship_type, record.name, record.length, record.beam, now)
+                if (vessel.ship_type, vessel.name) != known:
+                    vessel.sent_time = None  # Send the next position with the new details
+            return None
+
+        ship_name = record.ship_name
+        lat = record.lat
+        lon = record.lon
+        course = record.heading
+        speed = record.sog  # Speed over ground
+
+        # A report without a position (AIS "not available") has nothing to plot
+        if lat is None or lon is None:
+            if metrics is not None:
+                metrics.inc('cot_filtered_total', ('position',))
+            return None
+
+        # Drop positions outside the areas of interest before any other work
+        if self.geofence is not None and not self.geofence.contains(lat, lon):
+            self.outside += 1
+            if metrics is not None:
+                metrics.inc('cot_filtered_total', ('geofence',))
+            return None
+        if metrics is not None:
+            started = time.perf_counter()
         
-        # Get ship type from static data if available
-        ship_type = ais_data.get('Message', {}).get('StaticData', {}).get('Type')
+        # Get ship type, name and size from previously seen static data
+        vessel = None
+        ship_type = None
+        size_str = ""
+        if mmsi:
+            vessel = self.vessels.touch(mmsi, now)
+            if record.ship_type is not None:  # NMEA type 19 carries static data with its position
+                self.vessels.update_static_fields(mmsi, record.ship_type, record.name, record.length, record.beam,
+                                                  now)
+            ship_type = vessel.ship_type
+            if not ship_name and vessel.name:
+                ship_name = vessel.name
+            elif ship_name and not vessel.name:
+                vessel.name = ship_name  # Until static data names it, so snapshots keep the name
+            if vessel.length and vessel.beam:
+                size_str = f", Size: {vessel.length}x{vessel.beam}m"
         
-        # Determine vessel type for CoT
-        cot_type = self.get_vessel_type(mmsi, ship_type)
+        # Determine vessel type for CoT, cached on the vessel record
+        if vessel is not None:
+            cot_type = vessel.cot_type
+            if cot_type is None:
+                cot_type = vessel.cot_type = self.get_vessel_type(mmsi, ship_type)
+        else:
+            cot_type = self.get_vessel_type(mmsi, ship_type)
         
+        if metrics is not None:
+            classified = time.perf_counter()
+            metrics.observe('cot_stage_seconds', ('classify',), classified - started)
+
         # Check if we should process this vessel type
-        if not self.should_process_vessel(cot_type):
+        if cot_type is None or not self.should_process_vessel(cot_type):
+            if metrics is not None:
+                metrics.inc('cot_filtered_total', ('type',))
             return None
-        
-        # Create CoT XML
-        event = ET.Element('event')
-        event.set('version', '2.0')
-        event.set('type', cot_type)
-        event.set('uid', f"AIS.{mmsi if mmsi else 'UNKNOWN'}")
-        event.set('time', datetime.datetime.utcnow().isoformat() + 'Z')
-        event.set('start', datetime.datetime.utcnow().isoformat() + 'Z')
-        event.set('stale', (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).isoformat() + 'Z')
-        event.set('how', 'h-e') # AIS electronic tracking
-
-        # Point data
-        point = ET.SubElement(event, 'point')
-        point.set('lat', str(lat if lat is not None else 0))
-        point.set('lon', str(lon if lon is not None else 0))
-        point.set('hae', '0') # Height above ellipsoid
-        point.set('ce', '10') # Circular error
-        point.set('le', '10') # Linear error
-
-        # Detail data
-        detail = ET.SubElement(event, 'detail')
-        track = ET.SubElement(detail, 'track')
-        track.set('course', str(course if course is not None and course != 511 else 0))
-        track.set('speed', str(speed * 0.514444 if speed is not None else 0))
-        
-        contact = ET.SubElement(detail, 'contact')
-        contact.set('callsign', ship_name if ship_name else 'UNKNOWN')
-        
-        # Add vessel type to remarks if available
-        remarks = ET.SubElement(detail, 'remarks')
+
+        # Skip reports that dead reckoning from the last sent one already predicts
+        if self.throttle is not None and vessel is not None:
+            heading = course if course is not None and course != 511 else None
+            if not self.throttle.should_send(vessel, lat, lon, speed, heading, now):
+                if metrics is not None:
+                    metrics.inc('cot_filtered_total', ('throttle',))
+                return None
+        elif vessel is not None:
+            # Without a throttle the sent report is still kept, for snapshots
+            vessel.sent_time = now
+            vessel.sent_lat = lat
+            vessel.sent_lon = lon
+            vessel.sent_speed = speed
+            vessel.sent_course = course if course is not None and course != 511 else None
+
+        time_str, stale_str = self.clock.now()
+        if metrics is not None:
+            started = time.perf_counter()
+        event = self.encode_event(mmsi, cot_type, lat, lon, course, speed, ship_name, ship_type, size_str,
+                                  time_str, stale_str,
+                                  time_utc_seconds(record.time_utc) if self.origin_times else None)
+        if metrics is not None:
+            metrics.observe('cot_stage_seconds', ('serialize',), time.perf_counter() - started)
+        return event
+
+    def encode_event(self, mmsi, cot_type: str, lat: float, lon: float, course: float, speed: float,
+                     ship_name: str, ship_type: int, size_str: str, time_str: str, stale_str: str,
+                     origin: float = None) -> CoTEvent:
+        """Render CoT XML from the precompiled template, and TAK Protocol if used"""
         type_str = f", Type: {ship_type}" if ship_type else ""
-        remarks.text = f"MMSI: {mmsi if mmsi else 'UNKNOWN'}, Vessel: {ship_name if ship_name else 'UNKNOWN'}{type_str}"
+        uid = f"AIS.{mmsi if mmsi else 'UNKNOWN'}"
+        fields = (
+            cot_type,
+            uid,
+            time_str,
+            stale_str,
+            str(lat if lat is not None else 0),
+            str(lon if lon is not None else 0),
+            '0',  # Height above ellipsoid
+            str(course if course is not None and course != 511 else 0),
+            str(speed * 0.514444 if speed is not None else 0),
+            ship_name if ship_name else 'UNKNOWN',
+            f"MMSI: {mmsi if mmsi else 'UNKNOWN'}, Vessel: {ship_name if ship_name else 'UNKNOWN'}{type_str}{size_str}",
+        )
+        return CoTEvent(uid, cot_type, lat, lon, self.template.encode(*fields) if self.xml else None,
+                        self.tak_template.encode(*fields) if self.tak_template is not None else None, origin)
 
-        return ET.tostring(event, encoding='unicode')
+    def restore_snapshot(self, now: float = None) -> List[CoTEvent]:
+        """Load the vessel snapshot and return events for the tracks that are not stale yet
 
-    async def connect_and_process(self):
-        """Connect to AISstream and process messages"""
-        url = "wss://stream.aisstream.io/v0/stream"
-        
-        subscription_message = {
-            "APIKey": self.api_key,
-            "BoundingBoxes": [[[-180, -90], [180, 90]]]  # Whole world
-        }
+        Each event keeps the time of the report it repeats, so it goes stale
+        when the original would have rather than an hour after the restart.
+        """
+        if now is None:
+            now = time.time()
+        started = time.perf_counter()
+        with gc_paused():
+            loaded = load_snapshot(self.snapshot_path, self.vessels, now)
+            stale_after = self.clock.stale_after.total_seconds()
+            events = []
+            for vessel in self.vessels.records():
+                if vessel.sent_time is None or vessel.sent_time + stale_after <= now or vessel.sent_lat is None:
+                    continue
+                if self.geofence is not None and not self.geofence.contains(vessel.sent_lat, vessel.sent_lon):
+                    continue
+                cot_type = vessel.cot_type = self.get_vessel_type(vessel.mmsi, vessel.ship_type)
+                if cot_type is None or not self.should_process_vessel(cot_type):
+                    continue
+                size_str = f", Size: {vessel.length}x{vessel.beam}m" if vessel.length and vessel.beam else ""
+                events.append(self.encode_event(vessel.mmsi, cot_type, vessel.sent_lat, vessel.sent_lon,
+                                                vessel.sent_course, vessel.sent_speed, vessel.name, vessel.ship_type,
+                                                size_str, *self.clock.at(vessel.sent_time)))
+        if loaded:
+            print(f"Restored {loaded:,} vessels from {self.snapshot_path} in {time.perf_counter() - started:.2f}s, "
+                  f"re-sending {len(events):,} tracks that are not stale yet")
+        return events
+
+    def save_snapshot(self):
+        """Write the vessel snapshot now, blocking, after any periodic write in progress"""
+        started = time.perf_counter()
+        count = self.snapshot_writer.save()
+        print(f"Saved {count:,} vessels to {self.snapshot_path} in {time.perf_counter() - started:.2f}s")
+
+    async def snapshot_periodically(self):
+        """Write the vessel snapshot every snapshot_interval seconds, off the event loop"""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot_writer.write()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Snapshot to {self.snapshot_path} failed: {e}")
+
+    def convert_frame(self, message) -> Optional[CoTEvent]:
+        """Decode one raw AISstream frame and return its CoT event, or None if nothing should be sent"""
+        # Only position reports and static data get decoded
+        metrics = self.metrics
+        if metrics is None:
+            record = self.decoder.decode(message)
+        else:
+            started = time.perf_counter()
+            record = self.decoder.decode(message)
+            metrics.observe('cot_stage_seconds', ('decode',), time.perf_counter() - started)
+            metrics.inc('cot_messages_total', (record.message_type if record is not None else 'other',))
+        if record is None:
+            return None
+        return self.convert_record(record)
+
+    def throttle_stats(self) -> str:
+        """Track throttle counters, summed over the worker processes when converting in a pool"""
+        if self.pool is None:
+            return self.throttle.stats() if self.throttle is not None else "no throttle"
+        totals = TrackThrottle()
+        for checked, sent in self.pool.throttle_counts:
+            totals.checked += checked
+            totals.sent += sent
+        return totals.stats()
+
+    def send_converted(self, events: List[CoTEvent], malformed: int = 0):
+        """Queue a batch of CoT events from the worker pool, counting the frames it skipped as malformed"""
+        send = self.fanout.send_nowait
+        metrics = self.metrics
+        if malformed:
+            self.malformed += malformed
+            if metrics is not None:
+                metrics.inc('cot_errors_total', ('decode',), malformed)
+        for event in events:
+            if metrics is not None:
+                metrics.inc('cot_events_total', (event.cot_type,))
+            send(event)
+
+    async def process_frames(self, frames: AsyncIterable[str], pool: ConverterPool = None):
+        """Convert and queue every raw AISstream frame from an async iterable"""
+        capture = self.capture
+        async for message in frames:
+            if capture is not None:
+                capture.write(message)
+            if pool is not None:
+                pool.submit(message)
+                continue
+
+            try:
+                converted = self.convert_frame(message)
+            except ValueError as e:
+                self.malformed += 1
+                if self.metrics is not None:
+                    self.metrics.inc('cot_errors_total', ('decode',))
+                print(f"Skipping malformed frame: {e}")
+                continue
+            if converted is not None:
+                if self.metrics is not None:
+                    self.metrics.inc('cot_events_total', (converted.cot_type,))
+                await self.fanout.send(converted)
+
+    async def connect_and_process(self, source: AsyncIterable[str] = None):
+        """Connect to AISstream and process messages
+
+        If source is given (e.g. an ais_capture.ReplaySource), its frames are
+        processed instead and this returns once they are all sent.
+        """
+        boxes = self.geofence.subscription_boxes() if self.geofence is not None else [WORLD]
+        self.shards = [Shard(i, group) for i, group in enumerate(split_boxes(boxes, self.shard_count))]
+
+        self.fanout.start()
+        pool = None
+        if self.workers:
+            pool = self.pool = ConverterPool(self.workers, self.worker_args, self.worker_kwargs)
+            pool.start(self.send_converted)
+
+        # Vessel state lives in the worker processes when there are any, so it is only
+        # snapshotted when converting in this one
+        snapshots = None
+        if self.snapshot_path and not self.workers:
+            for event in self.restore_snapshot():
+                self.fanout.send_nowait(event)
+            snapshots = asyncio.ensure_future(self.snapshot_periodically())
+
+        if source is not None:
+            await self.process_frames(source, pool)
+            if pool is not None:
+                await pool.close()
+            if snapshots is not None:
+                snapshots.cancel()
+                self.save_snapshot()
+            await self.fanout.drain()
+            await self.fanout.close()
+            return
+
+        try:
+            await asyncio.gather(*(self.stream_shard(shard, pool) for shard in self.shards))
+        finally:
+            if snapshots is not None:
+                snapshots.cancel()
 
+    async def stream_shard(self, shard: Shard, pool: ConverterPool = None):
+        """Keep one shard's websocket connected and process its frames"""
+        subscription_message = json.dumps(shard.subscription(self.api_key))
+        name = f"AISstream shard {shard.index}" if len(self.shards) > 1 else "AISstream"
         while True:
             try:
-                async with websockets.connect(url) as websocket:
-                    await websocket.send(json.dumps(subscription_message))
-                    print(f"Connected to AISstream and forwarding to {self.cot_host}:{self.cot_port} via {self.protocol.upper()}")
-
-                    while True:
-                        message = await websocket.recv()
-                        ais_data = json.loads(message)
-                        
-                        # Process both position reports and static data
-                        if ais_data.get('MessageType') in ['PositionReport', 'StaticData']:
-                            cot_message = self.create_cot_from_ais(ais_data)
-                            
-                            # Only send if message was created (not filtered out)
-                            if cot_message:
-                                if self.protocol == 'tcp':
-                                    self.socket.send(cot_message.encode() + b'\n')
-                                else:
-                                    self.socket.sendto(cot_message.encode(), 
-                                                     (self.cot_host, self.cot_port))
+                async with websockets.connect(self.stream_url) as websocket:
+                    await websocket.send(subscription_message)
+                    shard.connects += 1
+                    print(f"Connected to {name} and forwarding to {self.cot_host}:{self.cot_port} via {self.protocol.upper()}")
+                    await self.process_frames(shard.receive(websocket, self.deduper), pool)
 
             except websockets.exceptions.ConnectionClosed:
-                print("Connection lost. Reconnecting...")
-                await asyncio.sleep(5)
+                if self.metrics is not None:
+                    self.metrics.inc('cot_errors_total', ('connection',))
+                delay = shard.backoff.next()
+                print(f"{name}: connection lost ({self.fanout.queue_depth} events queued). Reconnecting in {delay:.1f}s...")
+                await asyncio.sleep(delay)
             except Exception as e:
-                print(f"Error: {e}")
-                await asyncio.sleep(5)
+                if self.metrics is not None:
+                    self.metrics.inc('cot_errors_total', ('connection',))
+                delay = shard.backoff.next()
+                print(f"{name}: error: {e}. Reconnecting in {delay:.1f}s...")
+                await asyncio.sleep(delay)
 
-    def run(self):
-        """Run the converter"""
-        asyncio.get_event_loop().run_until_complete(self.connect_and_process())
+    def run(self, source: AsyncIterable[str] = None, metrics_port: int = None):
+        """Run the converter, serving /metrics on metrics_port if given"""
+        loop = asyncio.get_event_loop()
+        if metrics_port is not None:
+            port = loop.run_until_complete(MetricsServer(self.metrics, '127.0.0.1', metrics_port).start())
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+        loop.run_until_complete(self.connect_and_process(source))
 
 def get_valid_ip():
     while True:
@@ -193,12 +483,21 @@ def get_valid_port():
 
 def get_protocol():
     while True:
-        protocol = input("Enter protocol (tcp/udp) [default: tcp]: ").strip().lower()
+        protocol = input("Enter protocol (tcp/udp, or server to let TAK clients connect here) [default: tcp]: ").strip().lower()
         if protocol == "":
             return "tcp"
-        if protocol in ['tcp', 'udp']:
+        if protocol in ['tcp', 'udp', 'server']:
             return protocol
-        print("Invalid protocol. Please enter 'tcp' or 'udp'.")
+        print("Invalid protocol. Please enter 'tcp', 'udp' or 'server'.")
+
+def get_encoding():
+    while True:
+        encoding = input("Enter encoding (xml, or protobuf for TAK Protocol v1) [default: xml]: ").strip().lower()
+        if encoding == "":
+            return "xml"
+        if encoding in ['xml', 'protobuf']:
+            return encoding
+        print("Invalid encoding. Please enter 'xml' or 'protobuf'.")
 
 VESSEL_TYPES = {
     'mil-us': 'a-n-G-U-C-F',     # US Military vessels
@@ -246,28 +545,71 @@ def get_vessel_filters():
 def main():
     print("\n=== AIS to CoT Converter ===\n")
     
-    # Get connection details from user
-    ip = get_valid_ip()
-    port = get_valid_port()
-    protocol = get_protocol()
-    
-    # Get vessel type filters
-    include_types, exclude_types = get_vessel_filters()
-    
-    print(f"\nStarting converter with the following settings:")
-    print(f"Destination: {ip}:{port}")
-    print(f"Protocol: {protocol.upper()}")
-    if include_types:
-        print("Including only:", include_types)
-    if exclude_types:
-        print("Excluding:", exclude_types)
+    destinations = [Destination(**settings) for settings in DESTINATIONS] if DESTINATIONS else None
+    if destinations:
+        ip, port, protocol = destinations[0].host, destinations[0].port, destinations[0].protocol
+        encoding = destinations[0].encoding
+        include_types = exclude_types = None
+        print("Sending to:")
+        for destination in destinations:
+            print(f"  {destination}")
+    else:
+        # Get connection details from user
+        ip = get_valid_ip()
+        port = get_valid_port()
+        protocol = get_protocol()
+        encoding = get_encoding() if protocol != 'server' else 'xml'
+
+        # Get vessel type filters
+        include_types, exclude_types = get_vessel_filters()
+
+        print(f"\nStarting converter with the following settings:")
+        print(f"Destination: {ip}:{port}")
+        print(f"Protocol: {protocol.upper()} ({encoding})")
+        if include_types:
+            print("Including only:", include_types)
+        if exclude_types:
+            print("Excluding:", exclude_types)
     print("\nPress Ctrl+C to stop the converter.\n")
 
-    converter = AISToCoTConverter(ip, port, protocol, include_types, exclude_types)
+    classifier = VesselClassifier.from_file(CLASSIFICATION_RULES) if CLASSIFICATION_RULES else None
+    geofence = GeofenceIndex.from_file(AREAS_FILE) if AREAS_FILE else None
+    if geofence is not None:
+        print(f"Areas of interest: {len(geofence)} from {AREAS_FILE}, subscribing to "
+              f"{len(geofence.subscription_boxes())} bounding boxes")
+    source = None
+    decoder = None
+    if NMEA_SOURCE:
+        nmea_protocol, nmea_host, nmea_port = NMEA_SOURCE
+        source = NMEASource(nmea_host, nmea_port, nmea_protocol)
+        decoder = NMEADecoder()
+    converter = AISToCoTConverter(ip, port, protocol, include_types, exclude_types,
+                                  throttle=TrackThrottle(), classifier=classifier, workers=WORKERS,
+                                  capture_path=CAPTURE_FILE, decoder=decoder, destinations=destinations,
+                                  encoding=encoding, geofence=geofence, shards=SHARDS,
+                                  metrics=Metrics() if METRICS_PORT else None, snapshot_path=SNAPSHOT_FILE,
+                                  snapshot_interval=SNAPSHOT_INTERVAL, priorities=PRIORITIES)
+    if SNAPSHOT_FILE and WORKERS:
+        print("SNAPSHOT_FILE is ignored with WORKERS: vessel state is kept in the worker processes")
     try:
-        converter.run()
+        converter.run(source, METRICS_PORT)
     except KeyboardInterrupt:
         print("\nShutting down...")
+        print(f"Track updates: {converter.throttle_stats()}")
+        print(f"Destinations: {converter.fanout.stats()}")
+        for destination in converter.fanout.destinations:
+            if isinstance(getattr(destination.transport, 'buffer', None), PriorityBuffer):
+                print(f"  {destination}: {destination.transport.buffer.stats()}")
+        if len(converter.shards) > 1:
+            for shard in converter.shards:
+                print(f"  {shard.stats()}")
+            print(f"  {converter.deduper.duplicates:,} duplicate frames from shard edges dropped")
+        if SNAPSHOT_FILE and not WORKERS:
+            converter.save_snapshot()
+    finally:
+        if converter.capture is not None:
+            converter.capture.close()
+            print(f"Captured {converter.capture.frames} frames to {CAPTURE_FILE}")
 
 if __name__ == "__main__":
     main()
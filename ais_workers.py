@@ -0,0 +1,223 @@
+import asyncio
+import multiprocessing
+import queue
+import re
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from ais_nmea import payload_bits
+from cot_encoder import CoTEvent
+
+# Pulls the MMSI out of a raw AISstream frame without decoding the JSON
+_MMSI_PATTERN = re.compile(r'"MMSI"\s*:\s*(\d+)')
+_MMSI_BYTES_PATTERN = re.compile(rb'"MMSI"\s*:\s*(\d+)')
+# Fragment count, fragment number, sequence id, channel and the start of the payload
+# of an NMEA sentence, whose first 7 characters hold the MMSI (bits 8-37)
+_NMEA_PATTERN = re.compile(rb'!AIVD[MO],(\d),(\d),(\d?),([^,]?),([^,]{0,7})')
+
+
+def _nmea_mmsi(payload: bytes) -> Optional[int]:
+    try:
+        value, length = payload_bits(payload)
+    except ValueError:
+        return None
+    return (value >> (length - 38)) & 0x3FFFFFFF if length >= 38 else None
+
+
+def shard_for(frame: Union[str, bytes], shards: int, fragments: Dict[tuple, int] = None) -> int:
+    """Worker index for a raw frame; every frame for one MMSI maps to the same worker
+
+    Takes AISstream JSON frames and NMEA sentences, as str or bytes. Only the
+    first fragment of a multi-sentence NMEA message carries the MMSI, so
+    fragments (kept by the caller) maps each message in progress to that
+    fragment's worker for the rest of it. Frames without an MMSI go to 0.
+    """
+    if isinstance(frame, str):
+        match = _MMSI_PATTERN.search(frame)
+        if match:
+            return int(match.group(1)) % shards
+        frame = frame.encode('ascii', 'replace')
+    else:
+        match = _MMSI_BYTES_PATTERN.search(frame)
+        if match:
+            return int(match.group(1)) % shards
+    match = _NMEA_PATTERN.search(frame)
+    if match is None:
+        return 0
+    count, number, sequence_id, channel, payload = match.groups()
+    key = (count, sequence_id, channel)
+    if number != b'1':
+        if fragments is None:
+            return 0
+        return fragments.pop(key, 0) if number == count else fragments.get(key, 0)
+    mmsi = _nmea_mmsi(payload)
+    shard = mmsi % shards if mmsi is not None else 0
+    if count != b'1' and fragments is not None:
+        fragments[key] = shard
+    return shard
+
+
+def _throttle_counts(converter) -> Tuple[int, int]:
+    throttle = converter.throttle
+    return (throttle.checked, throttle.sent) if throttle is not None else (0, 0)
+
+
+def _worker_main(index: int, inbox, outbox, converter_args: tuple, converter_kwargs: Dict[str, Any]):
+    """Worker process: decode, classify and serialize batches of raw frames
+
+    Each result batch goes back as (index, events, throttle counts, malformed
+    frames, error), and a final one with events None marks the worker as
+    finished. Malformed frames (ValueError) are counted and skipped like in
+    process_frames; error is the traceback of the first other exception in
+    the batch, for the parent to raise.
+    """
+    from ais_to_cot import AISToCoTConverter
+
+    converter = AISToCoTConverter(*converter_args, **converter_kwargs)
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        results = []
+        malformed = 0
+        error = None
+        for frame in batch:
+            try:
+                converted = converter.convert_frame(frame)
+            except ValueError as e:
+                malformed += 1
+                print(f"Skipping malformed frame: {e}")
+                continue
+            except Exception:
+                if error is None:
+                    error = traceback.format_exc()
+                continue
+            if converted is not None:
+                results.append(converted)
+        outbox.put((index, results, _throttle_counts(converter), malformed, error))
+    outbox.put((index, None, _throttle_counts(converter), 0, None))
+
+
+class WorkerError(RuntimeError):
+    """An exception other than a malformed frame in a worker process"""
+
+
+class ConverterPool:
+    """Converts raw AISstream frames in N worker processes sharded by MMSI
+
+    The caller only forwards raw frames with submit(). Frames are batched per
+    shard to keep IPC overhead low, and since each MMSI always lands on the
+    same worker, per-vessel ordering and state (static data, throttling) stay
+    local to one process. Converted CoTEvents are handed back on
+    the event loop through the deliver callback, with the number of
+    malformed frames skipped. Any other exception in a worker is raised as
+    WorkerError by the next submit() or by close().
+
+    Each worker throttles with its own copy of the converter's TrackThrottle,
+    so throttle_counts holds every worker's latest (checked, sent) counters.
+    """
+
+    def __init__(self, workers: int, converter_args: tuple, converter_kwargs: Dict[str, Any] = None,
+                 batch_size: int = 200, flush_interval: float = 0.01, max_pending_batches: int = 1000):
+        self.workers = workers
+        self.converter_args = converter_args
+        self.converter_kwargs = converter_kwargs or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_batches = max_pending_batches
+        self.submitted = 0
+        self.dropped = 0  # Frames dropped because a worker's inbox was full
+        self.throttle_counts: List[Tuple[int, int]] = [(0, 0)] * workers
+        self._context = multiprocessing.get_context('spawn')
+        self._batches: List[List[str]] = [[] for _ in range(workers)]
+        self._fragments: Dict[tuple, int] = {}  # NMEA message in progress -> worker of its first fragment
+        self._error: Optional[str] = None
+        self._inboxes = []
+        self._outbox = None
+        self._processes = []
+        self._collector = None
+        self._flusher = None
+        self._loop = None
+        self._deliver = None
+
+    def start(self, deliver: Callable[[List[CoTEvent], int], None]):
+        """Start the workers; deliver is called on the running event loop with each result batch
+        and its malformed frame count"""
+        self._loop = asyncio.get_event_loop()
+        self._deliver = deliver
+        self._outbox = self._context.Queue()
+        for index in range(self.workers):
+            inbox = self._context.Queue(self.max_pending_batches)
+            process = self._context.Process(
+                target=_worker_main,
+                args=(index, inbox, self._outbox, self.converter_args, self.converter_kwargs),
+                daemon=True)
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    def submit(self, frame: Union[str, bytes]):
+        """Queue a raw frame for the worker that owns its MMSI"""
+        self._raise_worker_error()
+        shard = shard_for(frame, self.workers, self._fragments)
+        batch = self._batches[shard]
+        batch.append(frame)
+        self.submitted += 1
+        if len(batch) >= self.batch_size:
+            self._send_batch(shard)
+
+    def flush(self):
+        """Send all partially filled batches to their workers"""
+        for shard, batch in enumerate(self._batches):
+            if batch:
+                self._send_batch(shard)
+
+    async def close(self):
+        """Flush pending frames, stop the workers and wait for their last results"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+        self.flush()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        await self._loop.run_in_executor(None, self._collector.join)
+        for process in self._processes:
+            process.join()
+        self._inboxes = []
+        self._processes = []
+        self._raise_worker_error()
+
+    def _raise_worker_error(self):
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise WorkerError(f"conversion failed in a worker process:\n{error}")
+
+    def _send_batch(self, shard: int):
+        batch = self._batches[shard]
+        self._batches[shard] = []
+        try:
+            self._inboxes[shard].put_nowait(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def _collect(self):
+        """Collector thread: move worker results back onto the event loop"""
+        remaining = self.workers
+        while remaining:
+            index, results, counts, malformed, error = self._outbox.get()
+            self.throttle_counts[index] = counts
+            if error is not None and self._error is None:
+                self._error = error
+            if results is None:
+                remaining -= 1
+            elif results or malformed:
+                self._loop.call_soon_threadsafe(self._deliver, results, malformed)
@@ -0,0 +1,56 @@
+"""Conversion time of an OpenSky /states/all response
+
+Usage: python bench_adsb_poll.py [response.json]
+
+Uses a recorded response if given, otherwise a synthetic 10k-aircraft one
+with the same shape (including null callsigns, positions and velocities).
+Times a first poll, where every aircraft is new, and a following poll
+where a share of the aircraft have moved.
+"""
+import gc
+import json
+import sys
+import time
+
+from adsb_to_cot import ADSBToCoTConverter
+from synthetic_adsb import next_poll, synthetic_states
+
+AIRCRAFT = 10000
+MOVED = 0.6  # Share of aircraft with a new position in the next poll
+
+
+def converter() -> ADSBToCoTConverter:
+    converter = ADSBToCoTConverter('127.0.0.1', 9, 'udp')
+    converter.clock.now = lambda: ('2024-01-01T00:00:00Z', '2024-01-01T00:05:00Z')  # Comparable output
+    return converter
+
+
+def time_poll(states: list, previous: list = None) -> float:
+    """Best of 9 ms for converting `states`, after `previous` was converted if given"""
+    timings = []
+    for _ in range(9):
+        c = converter()
+        if previous is not None:
+            c.convert_states(previous, 0)
+        gc.collect()
+        start = time.perf_counter()
+        c.convert_states(states, 10)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1e3
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            states = json.load(f)['states']
+    else:
+        states = synthetic_states(AIRCRAFT)
+    moved = next_poll(states, MOVED)
+
+    for label, poll, previous in (("First poll", states, None), (f"Next poll ({MOVED:.0%} moved)", moved, states)):
+        ms = time_poll(poll, previous)
+        print(f"{label}: {ms:7.1f} ms ({ms * 1e3 / len(states):.2f} us/aircraft)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Burst test: CoalescingBuffer in front of a TCP sink that drains far slower than the input"""
+import asyncio
+import time
+
+from cot_transport import CoalescingBuffer, CoTTransport
+
+FLEET_SIZE = 2000
+BURST_EVENTS = 200000
+BURST_RATE = 50000  # Events per second produced during the burst
+SINK_RATE = 2000  # Events per second the sink will read
+SINK_PORT = 47010
+PADDING = b' ' + b'x' * 400  # Roughly the size of a real CoT event
+
+
+async def slow_sink(received: dict, done: asyncio.Event):
+    """TCP sink that reads one line at a time at SINK_RATE, remembering the last event per uid"""
+
+    async def handle(reader, writer):
+        interval = 1.0 / SINK_RATE
+        next_read = time.perf_counter()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            uid, seq = line.split()[:2]
+            received[uid] = int(seq)
+            received['_count'] = received.get('_count', 0) + 1
+            next_read += interval
+            delay = next_read - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        done.set()
+
+    return await asyncio.start_server(handle, '127.0.0.1', SINK_PORT)
+
+
+async def main():
+    received = {}
+    done = asyncio.Event()
+    server = await slow_sink(received, done)
+
+    buffer = CoalescingBuffer(maxsize=FLEET_SIZE * 2)
+    transport = CoTTransport('127.0.0.1', SINK_PORT, 'tcp', buffer)
+    transport.start()
+    while not transport.connected:
+        await asyncio.sleep(0.01)
+
+    # Burst: every vessel reports many times, much faster than the sink drains
+    latest = {}
+    peak_depth = 0
+    start = time.perf_counter()
+    for seq in range(BURST_EVENTS):
+        uid = f"AIS.{200000000 + seq % FLEET_SIZE}".encode()
+        latest[uid] = seq
+        transport.send_nowait(uid + b' ' + str(seq).encode() + PADDING, uid)
+        peak_depth = max(peak_depth, transport.queue_depth)
+        if seq % 500 == 0:
+            delay = start + seq / BURST_RATE - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+    burst_time = time.perf_counter() - start
+
+    # Let the sink catch up with everything still in flight
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        stale = sum(1 for uid, seq in latest.items() if received.get(uid) != seq)
+        if not stale and not transport.queue_depth:
+            break
+        await asyncio.sleep(0.1)
+    drain_time = time.perf_counter() - start
+    await transport.close()
+    await asyncio.wait_for(done.wait(), 10)
+    server.close()
+
+    delivered = received.pop('_count', 0)
+    print(f"Burst of {BURST_EVENTS:,} events for {FLEET_SIZE:,} tracks in {burst_time:.2f}s "
+          f"({BURST_EVENTS / burst_time:,.0f} events/s) into a {SINK_RATE:,} events/s sink")
+    print(f"Delivered {delivered:,}, coalesced {buffer.coalesced:,}, dropped {buffer.dropped:,}, "
+          f"peak queue depth {peak_depth:,}, drained in {drain_time:.2f}s")
+    print(f"Tracks whose last delivered event is not their newest: {stale}")
+
+    assert peak_depth <= FLEET_SIZE, "backlog grew past the fleet size"
+    assert buffer.dropped == 0, "events were dropped instead of coalesced"
+    assert stale == 0, "a track's newest event was lost"
+    assert delivered + buffer.coalesced == BURST_EVENTS
+    print("Coalescing bound holds")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""Decode cost per message for each installed JSON backend, vs a plain json.loads"""
+import json
+import timeit
+
+from ais_decoder import BACKENDS, AISDecoder, record_from_dict
+from synthetic_ais import generate_frames
+
+FRAMES = 20000
+
+
+def unwanted_frames(frames):
+    """The same frames relabelled as a message type the converter does not use"""
+    return [frame.replace('"MessageType": "PositionReport"', '"MessageType": "StandardClassBPositionReport"')
+                 .replace('"MessageType": "StaticData"', '"MessageType": "ShipStaticData"') for frame in frames]
+
+
+def main():
+    frames = list(generate_frames(FRAMES))
+    unwanted = unwanted_frames(frames)
+    frames_bytes = [frame.encode() for frame in frames]
+
+    # Every backend must produce exactly the records the stdlib path produces
+    expected = [record_from_dict(json.loads(frame)) for frame in frames]
+    for backend in BACKENDS:
+        decoder = AISDecoder(backend=backend)
+        assert [decoder.decode(frame) for frame in frames] == expected, f"{backend} records differ (str frames)"
+        assert [decoder.decode(frame) for frame in frames_bytes] == expected, f"{backend} records differ (bytes frames)"
+        assert all(decoder.decode(frame) is None for frame in unwanted), f"{backend} accepted unwanted frames"
+    print(f"Record equivalence passed for backends: {', '.join(BACKENDS)}")
+
+    def per_message(func, corpus):
+        return min(timeit.repeat(lambda: [func(frame) for frame in corpus], number=1, repeat=5)) / len(corpus) * 1e6
+
+    print(f"{'json.loads only (old path)':<28}: {per_message(json.loads, frames):6.2f} us/msg")
+    for backend in BACKENDS:
+        decoder = AISDecoder(backend=backend)
+        print(f"{backend + ' wanted':<28}: {per_message(decoder.decode, frames):6.2f} us/msg")
+        print(f"{backend + ' unwanted type':<28}: {per_message(decoder.decode, unwanted):6.2f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Fan-out to several destinations: shared encoding, per-destination filters, slow consumer isolation
+
+Usage: python bench_fanout.py [FRAMES]
+
+Replays synthetic frames through one AISToCoTConverter into three local
+destinations: a TCP sink taking everything, a UDP sink with a bounding box
+and a type filter, and a TCP server that accepts but never reads. Checks
+that each event was encoded once, that the filters were applied, and that
+the stalled destination did not hold back the others.
+"""
+import asyncio
+import sys
+import time
+
+from ais_to_cot import AISToCoTConverter
+from cot_fanout import Destination
+from cot_sink import CoTSink
+from synthetic_ais import generate_frames
+
+FRAMES = 50000
+BBOX = (30.0, -30.0, 70.0, 40.0)  # Roughly Europe and the North Atlantic
+EXCLUDED = {'a-f-G-E-V'}  # Other civilian vessels
+
+
+async def frames_from(frames):
+    for i, frame in enumerate(frames):
+        yield frame
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # Let the writer tasks run
+
+
+async def run(frames, fan_out: bool):
+    fast = CoTSink()
+    fast_port = await fast.start()
+    regional = CoTSink(protocol='udp')
+    regional_port = await regional.start()
+    released = asyncio.Event()
+
+    async def never_read(reader, writer):
+        await released.wait()
+        writer.close()
+    stalled = await asyncio.start_server(never_read, '127.0.0.1', 0)
+    stalled_port = stalled.sockets[0].getsockname()[1]
+
+    destinations = [Destination('127.0.0.1', fast_port, 'tcp', coalesce=False, queue_size=len(frames))]
+    if fan_out:
+        destinations += [
+            Destination('127.0.0.1', regional_port, 'udp', exclude_types=EXCLUDED, bbox=BBOX, coalesce=False,
+                        queue_size=len(frames)),
+            Destination('127.0.0.1', stalled_port, 'tcp', coalesce=False, queue_size=1000),
+        ]
+    converter = AISToCoTConverter('127.0.0.1', fast_port, destinations=destinations)
+
+    # Count encodes and record what each destination should get
+    encoded = []
+    encode = converter.template.encode
+
+    def counting_encode(*args):
+        encoded.append(args)
+        return encode(*args)
+    converter.template.encode = counting_encode
+
+    start = time.perf_counter()
+    source = frames_from(frames)
+    converter.fanout.start()
+    await converter.process_frames(source)
+    await asyncio.gather(destinations[0].transport.drain(10), *(d.transport.drain(1) for d in destinations[1:2]))
+    await fast.wait_for(len(encoded), timeout=10)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.2)  # Last UDP datagrams
+
+    await converter.fanout.close()
+    for sink in (fast, regional):
+        await sink.close()
+    released.set()
+    stalled.close()
+    await asyncio.sleep(0)
+    return converter, destinations, fast, regional, encoded, elapsed
+
+
+def in_bbox(args) -> bool:
+    lat, lon = float(args[4]), float(args[5])
+    return BBOX[0] <= lat <= BBOX[2] and BBOX[1] <= lon <= BBOX[3]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FRAMES
+    frames = list(generate_frames(count))
+
+    _, _, single_sink, _, single_encoded, single_elapsed = asyncio.run(run(frames, fan_out=False))
+    converter, destinations, fast, regional, encoded, elapsed = asyncio.run(run(frames, fan_out=True))
+    fast_dest, regional_dest, stalled_dest = destinations
+
+    expected_regional = sum(1 for args in encoded if args[0] not in EXCLUDED and in_bbox(args))
+    print(f"1 destination  : {count / single_elapsed:10,.0f} frames/s, {len(single_encoded):,} events encoded")
+    print(f"3 destinations : {count / elapsed:10,.0f} frames/s, {len(encoded):,} events encoded")
+    print(f"  TCP all      : {fast.events:,} received")
+    print(f"  UDP filtered : {regional_dest.transport.sent:,} sent of {expected_regional:,} matching, "
+          f"{regional.events:,} received ({regional_dest.filtered:,} filtered out)")
+    print(f"  TCP stalled  : {stalled_dest.transport.sent:,} written, {stalled_dest.transport.dropped:,} dropped, "
+          f"{stalled_dest.transport.queue_depth:,} still queued")
+
+    assert len(encoded) == len(single_encoded) == fast.events, "events were encoded more than once or lost"
+    assert regional_dest.transport.sent == expected_regional, "bbox/type filter sent the wrong events"
+    assert regional.events <= expected_regional
+    assert stalled_dest.transport.dropped > 0, "the stalled destination never filled up"
+    print("Fan-out check passed")
+
+
+if __name__ == "__main__":
+    main()
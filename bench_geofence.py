@@ -0,0 +1,127 @@
+"""Geofence grid index vs a linear scan over thousands of polygons
+
+Usage: python bench_geofence.py [AREAS]
+
+Builds AREAS random port-sized polygons (plus a few large boxes) and
+compares GeofenceIndex.contains with testing every area in turn (with a
+bounding box pre-check), on positions near the areas and uniformly over the
+world. Every answer is checked against the scan. Then reports the derived
+AISstream subscription boxes, and the cost and drop rate of the geofence in
+AISToCoTConverter and ADSBToCoTConverter on synthetic traffic.
+"""
+import math
+import random
+import sys
+import time
+
+from ais_to_cot import AISToCoTConverter
+from bench_adsb_poll import converter as adsb_converter
+from geofence import Box, GeofenceIndex, Polygon
+from synthetic_adsb import synthetic_states
+from synthetic_ais import generate_frames
+
+AREAS = 5000
+POINTS = 200000
+
+
+def random_areas(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    areas = []
+    for i in range(count):
+        lat, lon = rng.uniform(-60, 70), rng.uniform(-175, 175)
+        radius = rng.uniform(0.02, 0.5)
+        sides = rng.randrange(4, 24)
+        areas.append(Polygon([(lat + radius * rng.uniform(0.5, 1) * math.sin(2 * math.pi * k / sides),
+                               lon + radius * rng.uniform(0.5, 1) * math.cos(2 * math.pi * k / sides))
+                              for k in range(sides)], name=f"port-{i}"))
+    for i in range(count // 500):
+        lat, lon = rng.uniform(-60, 50), rng.uniform(-175, 160)
+        areas.append(Box(lat, lon, lat + rng.uniform(2, 10), lon + rng.uniform(2, 10), name=f"sea-{i}"))
+    return areas
+
+
+def scan(areas, lat: float, lon: float) -> bool:
+    for area in areas:
+        min_lat, min_lon, max_lat, max_lon = area.bounds
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon and area.contains(lat, lon):
+            return True
+    return False
+
+
+def sample_points(areas, count: int, seed: int = 2) -> list:
+    """Half near an area, half anywhere"""
+    rng = random.Random(seed)
+    points = []
+    for i in range(count):
+        if i % 2:
+            points.append((rng.uniform(-90, 90), rng.uniform(-180, 180)))
+        else:
+            min_lat, min_lon, max_lat, max_lon = rng.choice(areas).bounds
+            points.append((rng.uniform(min_lat - 0.2, max_lat + 0.2), rng.uniform(min_lon - 0.2, max_lon + 0.2)))
+    return points
+
+
+def coverage(boxes) -> float:
+    """Share of the globe's surface inside subscription boxes"""
+    covered = sum(math.radians(east - west) * (math.sin(math.radians(north)) - math.sin(math.radians(south)))
+                  for (south, west), (north, east) in boxes)
+    return covered / (4 * math.pi)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else AREAS
+    areas = random_areas(count)
+    points = sample_points(areas, POINTS)
+
+    start = time.perf_counter()
+    index = GeofenceIndex(areas)
+    build = time.perf_counter() - start
+    print(f"{len(areas):,} areas: index built in {build:.2f}s, {index.cells:,} cells of {index.cell_size:.3f} deg")
+
+    start = time.perf_counter()
+    indexed = [index.contains(lat, lon) for lat, lon in points]
+    index_time = time.perf_counter() - start
+    subset = points[:5000]  # The scan is too slow for every point
+    start = time.perf_counter()
+    scanned = [scan(areas, lat, lon) for lat, lon in subset]
+    scan_time = (time.perf_counter() - start) / len(subset) * len(points)
+    assert indexed[:len(subset)] == scanned, "index and scan disagree"
+    mismatches = sum(indexed[i] != scan(areas, *points[i]) for i in range(0, len(points), 40))
+    assert mismatches == 0, f"{mismatches} index answers differ from the scan"
+    print(f"Lookups: index {index_time / len(points) * 1e9:,.0f} ns, linear scan {scan_time / len(points) * 1e9:,.0f} ns "
+          f"per point ({scan_time / index_time:,.0f}x), {sum(indexed) / len(points):.0%} inside")
+
+    for cell_size in (0.05, 0.25, 1.0):
+        sized = GeofenceIndex(areas, cell_size)
+        start = time.perf_counter()
+        for lat, lon in points:
+            sized.contains(lat, lon)
+        print(f"  cell {cell_size:4} deg: {sized.cells:9,} cells, "
+              f"{(time.perf_counter() - start) / len(points) * 1e9:5,.0f} ns per point")
+
+    # Ports all over the world need most of it; a few regions need far less
+    example = GeofenceIndex.from_file('areas.example.json')
+    for name, areas in (('random areas', index), ('areas.example.json', example)):
+        boxes = areas.subscription_boxes()
+        print(f"Subscription, {name}: {len(boxes)} bounding boxes covering {coverage(boxes):.2%} of the globe")
+
+    frames = list(generate_frames(50000))
+    for name, geofence in (('no geofence', None), ('geofence', index)):
+        converter = AISToCoTConverter('127.0.0.1', 0, geofence=geofence)
+        start = time.perf_counter()
+        sent = sum(1 for frame in frames if converter.convert_frame(frame) is not None)
+        elapsed = time.perf_counter() - start
+        print(f"Converter, {name:<11}: {elapsed / len(frames) * 1e6:5.2f} us/frame, {sent:,} events, "
+              f"{converter.outside:,} positions outside the areas")
+
+    states = synthetic_states(20000)
+    converter = adsb_converter()
+    converter.geofence = index
+    start = time.perf_counter()
+    results, _ = converter.convert_states(states, 0)
+    elapsed = time.perf_counter() - start
+    print(f"ADS-B: {elapsed / len(states) * 1e6:5.2f} us/aircraft, {len(results):,} of {len(states):,} aircraft "
+          f"inside, {converter.outside:,} outside")
+
+if __name__ == "__main__":
+    main()
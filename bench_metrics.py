@@ -0,0 +1,206 @@
+"""Cost of the metrics instrumentation, and a check of what /metrics reports
+
+Usage: python bench_metrics.py [FRAMES] [--seconds S]
+
+First converts synthetic frames and queues them to an idle destination
+with metrics off and on, each against a baseline without instrumentation:
+a copy of the modules with every `metrics is not None` block and the
+instrumented branch of every `metrics is None` check removed. The three
+run alternately in fresh interpreters. Then streams the local AISstream stand-in
+through a converter with metrics into a CoT sink, scrapes /metrics over
+HTTP and checks the counters against the sink, printing each stage's
+latency percentiles and the end-to-end lag from time_utc.
+"""
+import argparse
+import ast
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from ais_standin import AISStandIn
+from ais_to_cot import AISToCoTConverter
+from cot_sink import CoTSink
+from metrics import LATENCY_BUCKETS, Metrics, MetricsServer
+from synthetic_ais import generate_frames
+
+FRAMES = 50000
+ROUNDS = 5  # Alternating runs of the baseline and the instrumented tree
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def convert_time(count: int, with_metrics: bool, repeat: int = 3) -> float:
+    """Best per-frame seconds to convert and queue `count` synthetic frames"""
+    frames = list(generate_frames(count))
+
+    def run():
+        metrics = Metrics() if with_metrics else None
+        converter = AISToCoTConverter('127.0.0.1', 9, 'udp', coalesce=False, queue_size=len(frames), metrics=metrics)
+        convert = converter.convert_frame
+        send = converter.fanout.send_nowait
+        for frame in frames:
+            event = convert(frame)
+            if event is not None:
+                send(event)
+
+    return min(timeit.timeit(run, number=1) for _ in range(repeat)) / count
+
+
+def _is_metrics_check(test: ast.expr, op: type) -> bool:
+    """Whether test is `metrics <op> None` or `self.metrics <op> None`"""
+    return (isinstance(test, ast.Compare) and len(test.ops) == 1 and isinstance(test.ops[0], op)
+            and isinstance(test.comparators[0], ast.Constant) and test.comparators[0].value is None
+            and (getattr(test.left, 'id', None) == 'metrics' or getattr(test.left, 'attr', None) == 'metrics'))
+
+
+class _StripMetrics(ast.NodeTransformer):
+    """Drops every `if metrics is not None:` block and keeps only the plain branch of `if metrics is None:`"""
+
+    def visit_If(self, node: ast.If):
+        node = self.generic_visit(node)
+        if _is_metrics_check(node.test, ast.IsNot):
+            return node.orelse
+        if _is_metrics_check(node.test, ast.Is):
+            return node.body
+        return node
+
+
+def stripped_tree() -> str:
+    """A copy of the modules with every metrics check removed: the code as it runs without instrumentation"""
+    directory = tempfile.mkdtemp()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in os.listdir(here):
+        if name.endswith('.py'):
+            with open(os.path.join(here, name)) as f:
+                tree = _StripMetrics().visit(ast.parse(f.read()))
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write(ast.unparse(ast.fix_missing_locations(tree)))
+    return directory
+
+
+def timed_in(directory: str, count: int, with_metrics: bool) -> float:
+    """convert_time in a fresh interpreter importing the modules in directory"""
+    code = f"import bench_metrics; print(bench_metrics.convert_time({count}, {with_metrics}))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=directory, check=True, capture_output=True, text=True)
+    return float(output.stdout.split()[-1])
+
+
+def convert_times(count: int) -> tuple:
+    """Best per-frame seconds without the instrumentation, with metrics off and with metrics on
+
+    The three are run alternately so drifting machine load affects them alike.
+    """
+    baseline = stripped_tree()
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = [float('inf')] * 3
+    for _ in range(ROUNDS):
+        for i, (directory, with_metrics) in enumerate(((baseline, False), (here, False), (here, True))):
+            best[i] = min(best[i], timed_in(directory, count, with_metrics))
+    shutil.rmtree(baseline)
+    return tuple(best)
+
+
+def parse(text: str) -> dict:
+    """(name, {label: value}) -> value of every sample in Prometheus text"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#') or not line:
+            continue
+        name, labels, value = _SAMPLE.match(line).groups()
+        pairs = dict(re.findall(r'(\w+)="([^"]*)"', labels or ''))
+        samples[name, tuple(sorted(pairs.items()))] = float(value)
+    return samples
+
+
+def total(samples: dict, name: str, **labels) -> float:
+    return sum(value for (sample, pairs), value in samples.items()
+               if sample == name and all(dict(pairs).get(k) == v for k, v in labels.items()))
+
+
+def percentile(samples: dict, name: str, q: float, **labels) -> float:
+    """Upper bound of the histogram bucket holding quantile q"""
+    count = total(samples, name + '_count', **labels)
+    for bound in LATENCY_BUCKETS:
+        if total(samples, name + '_bucket', le=repr(bound), **labels) >= q * count:
+            return bound
+    return float('inf')
+
+
+async def scrape(port: int) -> str:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200'), head
+    return body.decode()
+
+
+async def end_to_end(seconds: float):
+    standin = AISStandIn(rate=3000, fleet_size=20000)
+    url = await standin.start()
+    sink = CoTSink()
+    port = await sink.start()
+    metrics = Metrics()
+    server = MetricsServer(metrics, port=0)
+    metrics_port = await server.start()
+    # No throttle and no coalescing: every position report becomes exactly one event
+    converter = AISToCoTConverter('127.0.0.1', port, 'tcp', coalesce=False, stream_url=url, metrics=metrics)
+    task = asyncio.ensure_future(converter.connect_and_process())
+    await asyncio.sleep(seconds)
+    await standin.close()
+    await converter.fanout.drain(10)
+    await sink.wait_for(standin.positions_sent, timeout=10)
+    text = await scrape(metrics_port)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await converter.fanout.close()
+    await sink.close()
+    await server.close()
+    return standin, sink, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('frames', type=int, nargs='?', default=FRAMES)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    baseline, off, on = convert_times(args.frames)
+    print(f"Convert and queue, no instrumentation: {baseline * 1e6:6.2f} us/frame")
+    print(f"Convert and queue, metrics off       : {off * 1e6:6.2f} us/frame ({off / baseline - 1:+.1%})")
+    print(f"Convert and queue, metrics on        : {on * 1e6:6.2f} us/frame ({on / baseline - 1:+.1%})")
+
+    standin, sink, text = asyncio.run(end_to_end(args.seconds))
+    samples = parse(text)
+    events = total(samples, 'cot_events_total')
+    sent = total(samples, 'cot_sent_total')
+    print(f"\n/metrics after {args.seconds:.0f}s of the stand-in ({len(text.splitlines())} lines):")
+    print(f"  messages {total(samples, 'cot_messages_total'):,.0f}, events {events:,.0f}, sent {sent:,.0f}, "
+          f"filtered {total(samples, 'cot_filtered_total'):,.0f}, errors {total(samples, 'cot_errors_total'):,.0f}; "
+          f"sink received {sink.events:,}")
+    for stage in ('decode', 'classify', 'serialize'):
+        print(f"  {stage:<10}: p50 <= {percentile(samples, 'cot_stage_seconds', 0.5, stage=stage) * 1e6:7.1f} us, "
+              f"p99 <= {percentile(samples, 'cot_stage_seconds', 0.99, stage=stage) * 1e6:7.1f} us")
+    for name, label in (('cot_send_seconds', 'send'), ('cot_lag_seconds', 'lag')):
+        print(f"  {label:<10}: p50 <= {percentile(samples, name, 0.5) * 1e3:7.2f} ms, "
+              f"p99 <= {percentile(samples, name, 0.99) * 1e3:7.2f} ms")
+
+    assert events == sent == sink.events == standin.positions_sent, "counters disagree with the sink"
+    assert total(samples, 'cot_messages_total', message_type='PositionReport') == standin.positions_sent
+    assert total(samples, 'cot_lag_seconds_count') == sent, "not every event had its lag recorded"
+    assert percentile(samples, 'cot_lag_seconds', 0.5) <= 1, "median lag from time_utc over a second"
+    assert off / baseline < 1.02, "disabled instrumentation costs more than 2% of conversion"
+    print("\nMetrics check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""NMEA !AIVDM decode throughput on a synthetic corpus
+
+Usage: python bench_nmea.py [SENTENCES]
+
+Encodes the synthetic fleet as types 1, 5 (two fragments), 18, 19 and 24,
+checks every decoded record field against the values that were encoded,
+then times NMEADecoder.decode on one core.
+"""
+import sys
+import time
+
+from ais_nmea import NMEADecoder
+from ais_to_cot import AISToCoTConverter
+from synthetic_nmea import generate_messages, generate_sentences
+
+SENTENCES = 200000
+
+
+def check_round_trip():
+    decoder = NMEADecoder()
+    by_type = {}
+    corpus = []
+    messages = generate_messages(fleet_size=500)
+    for _ in range(18000):
+        message, expected = next(messages)
+        corpus += message
+        *fragments, last = message
+        assert all(decoder.decode(fragment) is None for fragment in fragments), message
+        record = decoder.decode(last)
+        assert record == expected, f"{message} decoded to {record}, expected {expected}"
+        by_type[record.message_type] = by_type.get(record.message_type, 0) + 1
+    assert set(by_type) == {'PositionReport', 'ShipStaticData', 'StandardClassBPositionReport',
+                            'ExtendedClassBPositionReport', 'StaticDataReport'}, by_type
+    assert decoder.fragments_dropped == 0, "multi-fragment messages were not reassembled"
+    print(f"Round trip passed: {sum(by_type.values()):,} records match the encoded values "
+          f"({', '.join(f'{t} {n}' for t, n in sorted(by_type.items()))})")
+
+    # The records feed the normal conversion pipeline
+    converter = AISToCoTConverter('127.0.0.1', 4242, 'udp', decoder=NMEADecoder())
+    events = [converter.convert_frame(sentence) for sentence in corpus]
+    positions = by_type['PositionReport'] + by_type['StandardClassBPositionReport'] + by_type['ExtendedClassBPositionReport']
+    assert sum(1 for event in events if event) == positions, "position reports were not all converted"
+
+    # Corrupted sentences are rejected, not decoded
+    sentence = next(generate_sentences(1))
+    corrupted = sentence[:20] + ('A' if sentence[20] != 'A' else 'B') + sentence[21:]
+    try:
+        NMEADecoder().decode(corrupted)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("checksum mismatch was not detected")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else SENTENCES
+    check_round_trip()
+
+    corpus = list(generate_sentences(count))
+    best = None
+    for _ in range(5):
+        decoder = NMEADecoder()
+        decode = decoder.decode
+        start = time.perf_counter()
+        for sentence in corpus:
+            decode(sentence)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{count:,} sentences -> {decoder.decoded:,} records ({decoder.rejected} unused types)")
+    print(f"Decode: {best / count * 1e6:.2f} us/sentence, {count / best:,.0f} sentences/s on one core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""End-to-end benchmark: replay a capture through connect_and_process into a local sink
+
+Usage: python bench_pipeline.py [capture file] [--speed N] [--protocol tcp|udp]
+
+Without a capture file a synthetic one is generated, so this runs offline.
+Reports msgs/sec, per-stage latency percentiles and peak RSS.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from ais_capture import ReplaySource, read_capture, write_synthetic_capture
+from ais_to_cot import AISToCoTConverter
+from cot_sink import CoTSink
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return "no samples"
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1e6
+    return f"p50 {pick(0.50):8.1f}  p90 {pick(0.90):8.1f}  p99 {pick(0.99):8.1f}  max {samples[-1] * 1e6:9.1f} us"
+
+
+def stage_latencies(path):
+    """Time the decode and convert stages frame by frame"""
+    converter = AISToCoTConverter('127.0.0.1', 4242, 'udp')
+    decode, convert = [], []
+    clock = time.perf_counter
+    for _, frame in read_capture(path):
+        t0 = clock()
+        record = converter.decoder.decode(frame)
+        t1 = clock()
+        if record is not None:
+            converter.create_cot_from_record(record)
+            convert.append(clock() - t1)
+        decode.append(t1 - t0)
+    return decode, convert
+
+
+async def run_pipeline(path, speed, protocol):
+    sink = CoTSink(protocol=protocol, record_times=True)
+    port = await sink.start()
+    converter = AISToCoTConverter('127.0.0.1', port, protocol, coalesce=False)
+    source = ReplaySource(path, speed)
+
+    # Every position report becomes exactly one event (no throttle, no coalescing,
+    # FIFO transport), so the nth event at the sink belongs to the nth report
+    position_times = []
+
+    async def timed_frames():
+        async for frame in source:
+            if '"PositionReport"' in frame:
+                position_times.append(time.perf_counter())
+            yield frame
+
+    start = time.perf_counter()
+    await converter.connect_and_process(timed_frames())
+    await sink.wait_for(len(position_times), timeout=30)
+    elapsed = time.perf_counter() - start
+    await sink.close()
+    end_to_end = [arrival - sent for sent, arrival in zip(position_times, sink.arrivals)]
+    return source.frames, sink.events, elapsed, end_to_end, converter.transport.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('capture', nargs='?')
+    parser.add_argument('--speed', type=float, default=0, help="replay rate multiple, 0 for max speed")
+    parser.add_argument('--protocol', default='tcp', choices=['tcp', 'udp'])
+    parser.add_argument('--frames', type=int, default=100000, help="synthetic capture size")
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'synthetic.cap.gz')
+        write_synthetic_capture(path, args.frames)
+        print(f"Generated synthetic capture: {args.frames:,} frames, {os.path.getsize(path) / 1e6:.1f} MB")
+
+    decode, convert = stage_latencies(path)
+    frames, events, elapsed, end_to_end, dropped = asyncio.run(run_pipeline(path, args.speed, args.protocol))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"Pipeline   : {frames:,} frames -> {events:,} events in {elapsed:.2f}s "
+          f"({frames / elapsed:,.0f} msgs/s, {dropped:,} dropped) via {args.protocol.upper()}")
+    print(f"decode     : {percentiles(decode)}")
+    print(f"convert    : {percentiles(convert)}")
+    print(f"end-to-end : {percentiles(end_to_end)}")
+    print(f"Peak RSS   : {peak_rss:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
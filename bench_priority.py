@@ -0,0 +1,178 @@
+"""Synthetic overload: per-class latency and drop rates with a FIFO vs a priority send buffer
+
+Usage: python bench_priority.py [--seconds S] [--rate R] [--sink-rate R]
+
+Offers a mixed fleet's updates (a few military and law enforcement
+vessels among thousands of cargo ships, tankers, fishing and passenger
+vessels) at --rate events per second to a TCP sink that reads only
+--sink-rate per second, through the default latest-wins buffer (with default socket buffers and
+with the small one priority destinations use) and then through a PriorityBuffer with the military and law enforcement classes on
+top and a rate budget on passenger vessels. Reports each class's delivery
+ratio, shed events and latency from queueing to arrival, and checks that
+with priorities the important classes lose nothing and keep a bounded
+latency while the rest is shed.
+"""
+import argparse
+import asyncio
+import random
+import socket
+import time
+
+from cot_fanout import PRIORITY_SEND_BUFFER, Destination
+
+QUEUE_SIZE = 5000
+PADDING = b' ' + b'x' * 400  # Roughly the size of a real CoT event
+TICK = 0.01
+
+# CoT type, share of the fleet
+FLEET_MIX = [
+    ('a-n-G-U-C-F', 0.003),  # US military
+    ('a-n-G-E-V-A', 0.002),  # NATO military
+    ('a-f-G-U-L-E', 0.005),  # Law enforcement
+    ('a-f-G-E-V-P', 0.04),   # Passenger
+    ('a-f-G-E-V-F', 0.10),   # Fishing
+    ('a-f-G-E-V-C', 0.45),   # Cargo
+    ('a-f-G-E-V-T', 0.25),   # Tanker
+    ('a-f-G-E-V', 0.15),     # Other
+]
+FLEET_SIZE = 20000
+
+PRIORITIES = [
+    {'name': 'military', 'types': ['a-n-G-U-C-F', 'a-n-G-E-V-A'], 'priority': 0},
+    {'name': 'law', 'types': ['a-f-G-U-L-E'], 'priority': 1},
+    {'name': 'passenger', 'types': ['a-f-G-E-V-P'], 'priority': 2, 'rate': 100},
+    {'name': 'other', 'priority': 3},
+]
+CLASS_OF = {cot_type: c['name'] for c in PRIORITIES for cot_type in c.get('types', ())}
+BOUNDED_LATENCY = 0.25  # seconds, p99 for the military and law enforcement classes
+
+
+def fleet(seed: int = 1) -> list:
+    rng = random.Random(seed)
+    types = [cot_type for cot_type, _ in FLEET_MIX]
+    weights = [share for _, share in FLEET_MIX]
+    return [(f"AIS.{200000000 + i}", cot_type) for i, cot_type in enumerate(rng.choices(types, weights, k=FLEET_SIZE))]
+
+
+async def slow_sink(sink_rate: float, arrivals: dict):
+    """TCP sink reading one event at a time at sink_rate; arrivals[class] gets each event's latency
+
+    Its socket and stream buffers are kept small, so the backlog builds up
+    in the converter like it does in front of a saturated link.
+    """
+    async def handle(reader, writer):
+        interval = 1.0 / sink_rate
+        next_read = time.perf_counter()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                _, cot_type, queued = line.split()[:3]
+                arrivals.setdefault(CLASS_OF.get(cot_type.decode(), 'other'), []).append(
+                    time.perf_counter() - float(queued))
+                next_read += interval
+                delay = next_read - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8192)
+    listener.bind(('127.0.0.1', 0))
+    return await asyncio.start_server(handle, sock=listener, limit=4096)
+
+
+async def run(priorities, seconds: float, rate: float, sink_rate: float, send_buffer: int = None):
+    """Overload one destination; returns its buffer, events offered and latencies per class, and the duration"""
+    arrivals = {}
+    server = await slow_sink(sink_rate, arrivals)
+    destination = Destination('127.0.0.1', server.sockets[0].getsockname()[1], queue_size=QUEUE_SIZE,
+                              priorities=priorities, send_buffer=send_buffer)
+    transport = destination.transport
+    transport.start()
+    while not transport.connected:
+        await asyncio.sleep(0.01)
+
+    vessels = fleet()
+    rng = random.Random(2)
+    offered = {}
+    per_tick = int(rate * TICK)
+    start = time.perf_counter()
+    next_tick = start
+    seq = 0
+    while time.perf_counter() - start < seconds:
+        for uid, cot_type in rng.choices(vessels, k=per_tick):
+            seq += 1
+            name = CLASS_OF.get(cot_type, 'other')
+            offered[name] = offered.get(name, 0) + 1
+            data = b'%s %s %.6f %d' % (uid.encode(), cot_type.encode(), time.perf_counter(), seq) + PADDING
+            transport.send_nowait(data, uid, None, cot_type)
+        next_tick += TICK
+        await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+
+    await transport.close()
+    server.close()
+    return transport.buffer, offered, arrivals, elapsed
+
+
+def percentile(values: list, q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+def report(name: str, offered: dict, arrivals: dict, elapsed: float) -> dict:
+    print(f"\n== {name} ==")
+    print(f"  {'class':<10} {'offered':>8} {'delivered':>9} {'ratio':>6} {'per sec':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    results = {}
+    for c in PRIORITIES:
+        latencies = arrivals.get(c['name'], [])
+        sent = offered.get(c['name'], 0)
+        results[c['name']] = (sent, len(latencies), percentile(latencies, 0.99))
+        print(f"  {c['name']:<10} {sent:>8,} {len(latencies):>9,} {len(latencies) / max(sent, 1):>6.1%} "
+              f"{len(latencies) / elapsed:>8,.0f} {percentile(latencies, 0.5) * 1e3:>8,.0f} "
+              f"{percentile(latencies, 0.99) * 1e3:>8,.0f} {max(latencies, default=float('nan')) * 1e3:>8,.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rate', type=float, default=20000, help="events offered per second")
+    parser.add_argument('--sink-rate', type=float, default=2000, help="events per second the sink reads")
+    args = parser.parse_args()
+    print(f"Offering {args.rate:,.0f} events/s from {FLEET_SIZE:,} vessels to a sink reading "
+          f"{args.sink_rate:,.0f}/s for {args.seconds:.0f}s, {QUEUE_SIZE:,} event buffer")
+
+    fifo, *measured = asyncio.run(run(None, args.seconds, args.rate, args.sink_rate))
+    report("Latest-wins FIFO, default socket buffers", *measured)
+    print(f"  buffer: {fifo.dropped:,} dropped, {fifo.coalesced:,} coalesced")
+    fifo, *measured = asyncio.run(run(None, args.seconds, args.rate, args.sink_rate, PRIORITY_SEND_BUFFER))
+    baseline = report(f"Latest-wins FIFO, {PRIORITY_SEND_BUFFER // 1024} KB socket buffer", *measured)
+    print(f"  buffer: {fifo.dropped:,} dropped, {fifo.coalesced:,} coalesced")
+
+    buffer, offered, arrivals, elapsed = asyncio.run(run(PRIORITIES, args.seconds, args.rate, args.sink_rate))
+    results = report("Priority buffer", offered, arrivals, elapsed)
+    for priority_class in buffer.classes:
+        print(f"  {priority_class.stats()}")
+
+    by_name = {c.name: c for c in buffer.classes}
+    for name in ('military', 'law'):
+        sent, delivered, p99 = results[name]
+        assert by_name[name].dropped == 0, f"{name} events were shed"
+        assert p99 < BOUNDED_LATENCY, f"{name} p99 latency {p99 * 1e3:.0f} ms is not bounded"
+        assert p99 < baseline[name][2] / 2, f"{name} latency did not improve on the FIFO"
+        assert delivered >= 0.9 * sent, f"only {delivered / sent:.0%} of {name} updates were delivered"
+    assert by_name['other'].dropped > 0, "the overload did not shed low-priority events"
+    passenger = by_name['passenger']
+    assert passenger.sent - passenger.over_budget <= PRIORITIES[2]['rate'] * elapsed + passenger.burst + 1, \
+        "passenger vessels were sent beyond their rate budget"
+    print("\nPriority check passed")
+
+
+if __name__ == "__main__":
+    main()
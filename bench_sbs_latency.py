@@ -0,0 +1,153 @@
+"""Reception-to-CoT latency: streaming SBS-1 ingest vs OpenSky polling
+
+Usage: python bench_sbs_latency.py [--seconds N] [--rate R] [--poll-interval S]
+
+Serves the same synthetic dump1090 track from sbs_standin.SBSStandIn twice
+and measures, for every position line, the time until a CoT event carrying
+that position (or a later one of the same aircraft) arrives at a local sink.
+First through ADSBToCoTConverter.stream_sbs, then through the polling loop
+(connect_and_process) with its OpenSky fetch answered by a stand-in that
+merges the same feed into state vectors, the way OpenSky aggregates its
+receivers (OpenSky's own delay not included).
+"""
+import argparse
+import asyncio
+import re
+import time
+from collections import defaultdict
+
+import sbs
+from adsb_to_cot import ADSBToCoTConverter
+from aircraft_registry import AircraftRegistry
+from cot_sink import CoTSink
+from sbs_standin import SBSStandIn
+
+_POSITION = re.compile(rb'uid="ADSB\.([0-9a-f]+)".*?<point lat="([^"]*)"')
+
+
+class OpenSkyStandIn:
+    """Merges an SBS-1 feed into an aircraft table and answers polls with /states/all rows"""
+
+    def __init__(self):
+        self.aircraft = AircraftRegistry()
+        self._writer = None
+        self._task = None
+
+    async def start(self, host: str, port: int):
+        reader, self._writer = await asyncio.open_connection(host, port)
+        self._task = asyncio.ensure_future(self._read(reader))
+
+    async def _read(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            sbs.apply_sbs_line(self.aircraft, line.decode('ascii'), time.time())
+
+    async def fetch(self) -> list:
+        return [[r.icao24, r.callsign, 'Germany', r.last_seen, r.last_seen, r.lon, r.lat, r.alt, False, r.speed,
+                 r.heading] for r in self.aircraft.records() if r.lat is not None]
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._writer.close()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return "no samples"
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1e3
+    return f"p50 {pick(0.50):9.2f}  p90 {pick(0.90):9.2f}  p99 {pick(0.99):9.2f}  max {samples[-1] * 1e3:9.2f} ms"
+
+
+def latencies(standin: SBSStandIn, sink: CoTSink):
+    """Per position line, the time until its aircraft's first event at or past that position; and the undelivered"""
+    # Every synthetic position moves its aircraft north, so a later event covers all earlier positions
+    arrivals = defaultdict(list)
+    for event, arrival in zip(sink.received, sink.arrivals):
+        icao24, lat = _POSITION.search(event).groups()
+        arrivals[icao24.decode()].append((float(lat), arrival))
+    samples = []
+    missed = 0
+    delivered = defaultdict(int)  # icao24 -> index of the first arrival not yet known to be too early
+    for sent, line in zip(standin.position_times, standin.position_lines):
+        fields = line.split(',')
+        icao24, lat = fields[sbs.HEX_IDENT].lower(), float(fields[sbs.LATITUDE])
+        events = arrivals[icao24]
+        i = delivered[icao24]
+        while i < len(events) and events[i][0] < lat:
+            i += 1
+        delivered[icao24] = i
+        if i == len(events):
+            missed += 1
+        else:
+            samples.append(events[i][1] - sent)
+    return samples, missed
+
+
+async def stream_latency(seconds, rate):
+    standin = SBSStandIn(rate=rate, record_times=True)
+    feed_port = await standin.start()
+    sink = CoTSink(record_times=True, record_events=True)
+    port = await sink.start()
+    converter = ADSBToCoTConverter('127.0.0.1', port, 'tcp', coalesce=False)
+    task = asyncio.ensure_future(converter.stream_sbs('127.0.0.1', feed_port))
+    await asyncio.sleep(seconds)
+    await standin.close()
+    await sink.wait_for(standin.positions_sent, timeout=10)
+    task.cancel()
+    await converter.transport.close()
+    await sink.close()
+    return standin, converter, sink, latencies(standin, sink)
+
+
+async def poll_latency(seconds, rate, poll_interval):
+    standin = SBSStandIn(rate=rate, record_times=True)
+    feed_port = await standin.start()
+    sink = CoTSink(record_times=True, record_events=True)
+    port = await sink.start()
+    opensky = OpenSkyStandIn()
+    await opensky.start('127.0.0.1', feed_port)
+    converter = ADSBToCoTConverter('127.0.0.1', port, 'tcp', poll_interval=poll_interval)
+    converter.fetch_adsb_data = opensky.fetch
+    task = asyncio.ensure_future(converter.connect_and_process())
+    await asyncio.sleep(seconds)
+    await standin.close()
+    # One more poll picks up the last positions
+    await asyncio.sleep(poll_interval + 1)
+    task.cancel()
+    opensky.close()
+    await converter.transport.close()
+    await sink.close()
+    return standin, converter, sink, latencies(standin, sink)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--rate', type=float, default=2000, help="SBS-1 lines per second")
+    parser.add_argument('--poll-interval', type=float, default=10)
+    args = parser.parse_args()
+
+    standin, converter, sink, (streaming, stream_missed) = asyncio.run(stream_latency(args.seconds, args.rate))
+    print(f"Stand-in : {standin.stats()}")
+    print(f"Sink     : {sink.events:,} events for {standin.positions_sent:,} positions, "
+          f"{converter.malformed} malformed lines")
+    print(f"Streaming: {percentiles(streaming)}")
+    assert sink.events == standin.positions_sent and not stream_missed, "position updates were lost"
+
+    standin, converter, sink, (polling, poll_missed) = asyncio.run(
+        poll_latency(args.seconds, args.rate, args.poll_interval))
+    print(f"Stand-in : {standin.stats()}")
+    print(f"Sink     : {sink.events:,} events for {standin.positions_sent:,} positions")
+    print(f"Polling  : {percentiles(polling)}  (every {args.poll_interval:g}s)")
+
+    assert poll_missed == 0, f"{poll_missed} positions never reached the sink by polling"
+    assert sorted(streaming)[len(streaming) // 2] < sorted(polling)[len(polling) // 2], \
+        "streaming was not faster than polling"
+
+
+if __name__ == "__main__":
+    main()
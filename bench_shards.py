@@ -0,0 +1,109 @@
+"""Sharded AISstream subscriptions against the local stand-in with frequent disconnects
+
+Usage: python bench_shards.py [--seconds S] [--rate R] [--shards N]
+
+The stand-in runs one shared feed (like AISstream) and drops every
+connection every few seconds. The converter ingests it over one websocket,
+then over --shards websockets, then over the same shards with overlapping
+boxes so every report near a shard edge arrives twice. Each run reports
+per-shard rates and gaps, how much of the area-time was dark and how long
+the whole area was dark at once, and checks that every position report the
+stand-in delivered came out exactly once.
+"""
+import argparse
+import asyncio
+import time
+
+import ais_to_cot
+from ais_shards import box_area, split_boxes
+from ais_standin import AISStandIn
+from ais_to_cot import AISToCoTConverter
+from cot_sink import CoTSink
+
+OVERLAP = 2.0  # degrees each box is widened by in the overlapping run
+SAMPLE = 0.02  # seconds between checks of which shards are receiving
+DARK_AFTER = 0.1  # seconds without a frame before a shard counts as dark (the stand-in sends every 10 ms)
+
+
+def overlapping_boxes(boxes, shards):
+    """split_boxes with every box widened, so neighbouring shards overlap"""
+    return [[[[max(-90.0, south - OVERLAP), max(-180.0, west - OVERLAP)],
+              [min(90.0, north + OVERLAP), min(180.0, east + OVERLAP)]]
+             for (south, west), (north, east) in group]
+            for group in split_boxes(boxes, shards)]
+
+
+async def run(shards: int, seconds: float, rate: float):
+    standin = AISStandIn(rate=rate, fleet_size=20000, disconnect_every=4, disconnect_jitter=0.5, shared=True)
+    url = await standin.start()
+    sink = CoTSink()
+    port = await sink.start()
+    # No throttle and no coalescing: every position report must become exactly one event
+    converter = AISToCoTConverter('127.0.0.1', port, 'tcp', coalesce=False, stream_url=url, shards=shards)
+    task = asyncio.ensure_future(converter.connect_and_process())
+    start = time.monotonic()
+    all_dark = 0
+    samples = 0
+    while time.monotonic() - start < seconds:
+        await asyncio.sleep(SAMPLE)
+        now = time.monotonic()
+        if converter.shards and all(shard.last_frame is not None for shard in converter.shards):
+            samples += 1
+            all_dark += all(now - shard.last_frame > DARK_AFTER for shard in converter.shards)
+    elapsed = time.monotonic() - start
+
+    await standin.close()
+    await converter.fanout.drain(10)
+    await sink.wait_for(standin.unique_positions_sent, timeout=10)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await converter.fanout.close()
+    await sink.close()
+    return standin, converter, sink, elapsed, all_dark / max(samples, 1)
+
+
+def report(name, standin, converter, sink, elapsed, all_dark):
+    shards = converter.shards
+    total_area = sum(box_area(box) for shard in shards for box in shard.boxes)
+    dark = sum(shard.gap_time * sum(box_area(box) for box in shard.boxes) / total_area for shard in shards)
+    duplicates = converter.deduper.duplicates if converter.deduper is not None else 0
+    print(f"\n== {name} ==")
+    for shard in shards:
+        print(f"  {shard.stats()}")
+    print(f"Dark    : {dark / elapsed:.1%} of the area-time, the whole area at once {all_dark:.1%} of the time "
+          f"(longest gap {max(shard.longest_gap for shard in shards):.1f}s)")
+    print(f"Frames  : {sum(shard.frames for shard in shards):,} received, {duplicates:,} edge duplicates dropped")
+    print(f"Sink    : {sink.events:,} events for {standin.unique_positions_sent:,} position reports delivered")
+    assert standin.disconnects >= len(shards), "disconnects were not injected"
+    assert sink.events == standin.unique_positions_sent, "position reports were lost or duplicated"
+    return all_dark
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--rate', type=float, default=3000, help="stand-in frames per second")
+    parser.add_argument('--shards', type=int, default=4)
+    args = parser.parse_args()
+
+    single = report("1 websocket", *asyncio.run(run(1, args.seconds, args.rate)))
+    sharded = report(f"{args.shards} shards", *asyncio.run(run(args.shards, args.seconds, args.rate)))
+
+    # Widen the shards' boxes so the stand-in sends reports near their edges on two connections
+    ais_to_cot.split_boxes = overlapping_boxes
+    try:
+        results = asyncio.run(run(args.shards, args.seconds, args.rate))
+    finally:
+        ais_to_cot.split_boxes = split_boxes
+    report(f"{args.shards} overlapping shards", *results)
+    assert results[1].deduper.duplicates > 0, "overlapping shards produced no duplicates"
+
+    print(f"\nWhole area dark: {single:.1%} of the time with one websocket, {sharded:.1%} with {args.shards} shards")
+    print("Shard test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Warm-start snapshot write/load time and size, and the tracks re-sent after a restart
+
+Usage: python bench_snapshot.py [VESSELS] [--aircraft N]
+
+Fills an AIS converter with VESSELS vessels from synthetic traffic and an
+ADS-B converter with --aircraft aircraft from a synthetic OpenSky poll,
+spreads their last send times over twice the CoT stale time, and times
+writing the snapshot (in full, and the longest the copy on the event loop
+keeps it from running anything else), its size, and loading it into a
+fresh converter. Checks that every record comes back unchanged, that
+loading takes well under a second, that a periodic write cut short by
+shutdown leaves a complete snapshot, and that exactly the tracks still
+within their stale time are re-sent, each with the time and stale of its
+original event.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import tempfile
+import time
+
+from adsb_to_cot import ADSBToCoTConverter
+from ais_to_cot import AISToCoTConverter
+from synthetic_adsb import synthetic_states
+from synthetic_ais import generate_frames
+from track_snapshot import TABLES, SnapshotWriter, copy_snapshot, load_snapshot, write_snapshot
+
+VESSELS = 150000
+AIRCRAFT = 100000
+
+_TIMES = re.compile(rb'time="([^"]*)" start="[^"]*" stale="([^"]*)"')
+
+
+def ais_converter(path: str) -> AISToCoTConverter:
+    # No throttle: every report is sent, so every vessel has a last sent report
+    return AISToCoTConverter('127.0.0.1', 9, 'udp', coalesce=False, snapshot_path=path)
+
+
+def adsb_converter(path: str) -> ADSBToCoTConverter:
+    return ADSBToCoTConverter('127.0.0.1', 9, 'udp', snapshot_path=path)
+
+
+def age_tracks(registry, stale_after: float, now: float, seed: int = 3):
+    """Spread last send times over twice the stale time, so about half the tracks are still current"""
+    rng = random.Random(seed)
+    for record in registry.records():
+        if record.sent_time is None:
+            continue  # Seen but never sent (static data only)
+        record.sent_time = now - rng.uniform(0, 2 * stale_after)
+        record.last_seen = max(record.last_seen, record.sent_time)
+
+
+async def timed_copy(registry):
+    """Copy a registry the way the periodic snapshot does; returns the copy and the longest stall it caused"""
+    stalls = []
+
+    async def ticker():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            stalls.append(now - last)
+            last = now
+
+    ticks = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    tables = await copy_snapshot(registry)
+    ticks.cancel()
+    return tables, max(stalls)
+
+
+async def cut_short(writer: SnapshotWriter, after: float):
+    """Start a periodic write and cancel it after `after` seconds, like shutdown does"""
+    task = asyncio.ensure_future(writer.write())
+    await asyncio.sleep(after)
+    task.cancel()
+
+
+def check_shutdown(registry, fresh, path: str, now: float):
+    """The final save waits for a periodic write in progress instead of racing it"""
+    writer = SnapshotWriter(path, registry)
+    for after in (0.001, 0.05, 0.2):
+        asyncio.run(cut_short(writer, after))
+        writer.save()
+        assert load_snapshot(path, fresh, now) == len(registry), "the final snapshot is incomplete"
+    leftovers = [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
+    assert not leftovers, f"temporary files left behind: {leftovers}"
+
+
+def snapshot_cycle(name: str, registry, fresh, path: str, now: float):
+    """Write registry to path and load it into fresh; returns the load time"""
+    started = time.perf_counter()
+    tables, stall = asyncio.run(timed_copy(registry))
+    copied = time.perf_counter() - started
+    write_snapshot(path, tables)
+    written = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded = load_snapshot(path, fresh, now)
+    load_time = time.perf_counter() - started
+    size = os.path.getsize(path)
+    print(f"{name}: {len(registry):,} records, {size / 1e6:.1f} MB ({size / len(registry):.0f} bytes each); "
+          f"write {written:.2f}s (copy {copied * 1e3:.0f} ms, stalling the event loop {stall * 1e3:.0f} ms at most), "
+          f"load {load_time:.2f}s")
+    assert stall < 0.05, f"copying stalled the event loop for {stall * 1e3:.0f} ms"
+
+    _, columns, _ = TABLES[type(registry)]
+    assert loaded == len(registry), f"{len(registry) - loaded} records were not restored"
+    for record in registry.records():
+        restored = fresh.get(getattr(record, columns[0]))
+        assert all(getattr(restored, column) == getattr(record, column) for column in columns), \
+            f"{getattr(record, columns[0])} changed on the way through the snapshot"
+    return load_time
+
+
+def check_resent(name: str, registry, clock, events, now: float):
+    """Exactly the unexpired tracks come back, each with its original time and stale"""
+    stale_after = clock.stale_after.total_seconds()
+    current = {record.sent_time for record in registry.records()
+               if record.sent_time is not None and record.sent_lat is not None
+               and record.sent_time + stale_after > now}
+    resent = [_TIMES.search(data).groups() for data in events]
+    print(f"{name}: re-sent {len(resent):,} of {len(registry):,} tracks on restart "
+          f"({len(current):,} within the {stale_after / 60:.0f} minute stale time)")
+    assert len(resent) == len(current), "re-sent tracks do not match the unexpired ones"
+    expected = {clock.at(sent_time) for sent_time in current}
+    assert {(time_str.decode(), stale_str.decode()) for time_str, stale_str in resent} == expected, \
+        "re-sent tracks do not carry their original time and stale"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('vessels', type=int, nargs='?', default=VESSELS)
+    parser.add_argument('--aircraft', type=int, default=AIRCRAFT)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    now = time.time()
+
+    path = os.path.join(directory, 'ais.db')
+    converter = ais_converter(path)
+    for frame in generate_frames(args.vessels * 2, fleet_size=args.vessels):
+        converter.convert_frame(frame)
+    age_tracks(converter.vessels, converter.clock.stale_after.total_seconds(), now)
+    restarted = ais_converter(path)
+    ais_load = snapshot_cycle("AIS", converter.vessels, restarted.vessels, path, now)
+    check_shutdown(converter.vessels, ais_converter(path).vessels, path, now)
+    started = time.perf_counter()
+    events = ais_converter(path).restore_snapshot(now)
+    print(f"  load and re-encode on restart: {time.perf_counter() - started:.2f}s")
+    check_resent("AIS", converter.vessels, converter.clock, [event.data for event in events], now)
+
+    path = os.path.join(directory, 'adsb.db')
+    converter = adsb_converter(path)
+    converter.convert_states(synthetic_states(args.aircraft), now)
+    age_tracks(converter.aircraft, converter.clock.stale_after.total_seconds(), now)
+    restarted = adsb_converter(path)
+    adsb_load = snapshot_cycle("\nADS-B", converter.aircraft, restarted.aircraft, path, now)
+    started = time.perf_counter()
+    results = adsb_converter(path).restore_snapshot(now)
+    print(f"  load and re-encode on restart: {time.perf_counter() - started:.2f}s")
+    check_resent("ADS-B", converter.aircraft, converter.clock, [data for _, data in results], now)
+
+    with open(path, 'wb') as corrupt:
+        corrupt.write(b'not a snapshot')
+    assert adsb_converter(path).restore_snapshot(now) == [], "a corrupt snapshot was not ignored"
+
+    assert ais_load < 1 and adsb_load < 1, "loading a snapshot took a second or more"
+    print("\nSnapshot check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""TAK Protocol v1 (protobuf) vs XML: round-trip checks, size and encode time
+
+Usage: python bench_tak_proto.py [FRAMES]
+
+Every event is encoded both ways and the decoded protobuf is compared
+field by field with the parsed XML: the reference.py encoder samples
+(escaping, unicode), synthetic AIS traffic through AISToCoTConverter, and
+OpenSky states through ADSBToCoTConverter. Framed messages are also sent
+over local TCP (streaming header) and UDP (mesh header) destinations and
+decoded on arrival. Then the sizes and per-event encode times are compared
+with the template XML encoder and the ElementTree build it replaced.
+"""
+import asyncio
+import datetime
+import sys
+import timeit
+
+from adsb_to_cot import ADSBToCoTConverter
+from ais_to_cot import AISToCoTConverter
+from cot_encoder import CoTClock, CoTTemplate
+from cot_fanout import Destination, FanOut
+from reference import SAMPLES, build_with_elementtree, check
+from synthetic_adsb import synthetic_states
+from synthetic_ais import generate_frames
+from tak_proto import TakProtoTemplate, decode_message, frame, unframe, varint
+
+FRAMES = 20000
+
+
+def check_samples():
+    clock = CoTClock(datetime.timedelta(hours=1))
+    time_str, stale_str = clock.now()
+    xml, tak = CoTTemplate(), TakProtoTemplate()
+    for cot_type, uid, lat, lon, course, speed, callsign, remarks in SAMPLES:
+        fields = (cot_type, uid, time_str, stale_str, lat, lon, '0', course, speed, callsign, remarks)
+        check(xml.encode(*fields), tak.encode(*fields))
+    print(f"Round trip: {len(SAMPLES)} encoder samples match")
+
+
+def ais_fields(frames):
+    """Convert frames with XML and protobuf outputs; returns (encode arguments, events)"""
+    converter = AISToCoTConverter('127.0.0.1', 0, encodings={'xml', 'protobuf'})
+    fields = []
+    encode = converter.template.encode
+
+    def recording_encode(*args):
+        fields.append(args)
+        return encode(*args)
+    converter.template.encode = recording_encode
+    events = [event for event in map(converter.convert_frame, frames) if event is not None]
+    return fields, events
+
+
+def check_ais(events):
+    for event in events:
+        check(event.data, event.tak)
+    for framing in ('stream', 'mesh'):
+        for event in events[:1000]:
+            check(event.data, frame(event.tak, framing), framing)
+    print(f"Round trip: {len(events):,} AIS events match (and 1,000 framed for TCP and UDP)")
+
+
+def check_adsb(count: int = 5000):
+    states = synthetic_states(count)
+    results = {}
+    for encoding, protocol in (('xml', 'tcp'), ('protobuf', 'tcp'), ('protobuf', 'udp')):
+        converter = ADSBToCoTConverter('127.0.0.1', 0, protocol, encoding=encoding)
+        results[encoding, protocol] = dict(converter.convert_states(states, 0)[0])
+    xml = results['xml', 'tcp']
+    for (encoding, protocol), events in results.items():
+        if encoding == 'protobuf':
+            assert events.keys() == xml.keys()
+            for uid, data in events.items():
+                check(xml[uid], data, 'stream' if protocol == 'tcp' else 'mesh', same_tick=False)
+    print(f"Round trip: {len(xml):,} ADS-B events match (TCP and UDP framing)")
+
+
+async def check_wire(events):
+    """Send framed events (one per uid) to local TCP and UDP listeners and decode what arrives"""
+    received = {'tcp': [], 'udp': []}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                magic = await reader.readexactly(1)
+                assert magic == b'\xbf', f"lost framing: {magic!r}"
+                length = shift = 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7f) << shift
+                    shift += 7
+                    if byte < 0x80:
+                        break
+                payload = await reader.readexactly(length)
+                received['tcp'].append(b'\xbf' + varint(length) + payload)
+        except asyncio.IncompleteReadError:
+            pass
+
+    class Datagrams(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            received['udp'].append(data)
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    transport, _ = await asyncio.get_event_loop().create_datagram_endpoint(Datagrams, local_addr=('127.0.0.1', 0))
+    fanout = FanOut([
+        Destination('127.0.0.1', server.sockets[0].getsockname()[1], 'tcp', coalesce=False, encoding='protobuf'),
+        Destination('127.0.0.1', transport.get_extra_info('sockname')[1], 'udp', coalesce=False, encoding='protobuf'),
+    ])
+    fanout.start()
+    for event in events:
+        fanout.send_nowait(event)
+        await asyncio.sleep(0)  # Pace the UDP sends so the local receive buffer keeps up
+    await fanout.drain(10)
+    for _ in range(100):
+        if len(received['tcp']) >= len(events):
+            break
+        await asyncio.sleep(0.01)
+    await fanout.close()
+    server.close()
+    transport.close()
+
+    by_uid = {event.uid: event for event in events}
+    for protocol, framing in (('tcp', 'stream'), ('udp', 'mesh')):
+        for data in received[protocol]:
+            fields = decode_message(data, framing)
+            check(by_uid[fields['uid']].data, unframe(data, framing))
+    assert len(received['tcp']) == len(events), f"TCP: {len(received['tcp'])} of {len(events)} events decoded"
+    print(f"Wire: {len(received['tcp']):,}/{len(events):,} events over TCP and "
+          f"{len(received['udp']):,}/{len(events):,} over UDP decoded")
+
+
+def compare(fields):
+    xml, tak = CoTTemplate(), TakProtoTemplate()
+    stream = TakProtoTemplate(framing='stream')
+    xml_sizes = sum(len(xml.encode(*args)) for args in fields) / len(fields)
+    tak_sizes = sum(len(stream.encode(*args)) for args in fields) / len(fields)
+    print(f"\nSize over {len(fields):,} AIS events:")
+    print(f"  XML              : {xml_sizes:6.1f} bytes/event")
+    print(f"  TAK protobuf     : {tak_sizes:6.1f} bytes/event with the streaming header "
+          f"({tak_sizes / xml_sizes:.0%} of XML, mesh header adds 2 more)")
+
+    sample = fields[:2000]
+
+    def run_elementtree():
+        for cot_type, uid, t, s, lat, lon, hae, course, speed, callsign, remarks in sample:
+            build_with_elementtree(cot_type, uid, t, s, lat, lon, course, speed, callsign, remarks)
+
+    def run(template):
+        encode = template.encode
+        return lambda: [encode(*args) for args in sample]
+
+    print("Encode time:")
+    for name, func in (('ElementTree XML', run_elementtree), ('CoTTemplate XML', run(xml)),
+                       ('TAK protobuf', run(tak)), ('TAK + framing', run(stream))):
+        best = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"  {name:<17}: {best / len(sample) * 1e6:6.2f} us/event")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else FRAMES
+    fields, events = ais_fields(list(generate_frames(count)))
+    check_samples()
+    check_ais(events)
+    check_adsb()
+    asyncio.run(check_wire(list({event.uid: event for event in events[:10000]}.values())))
+    compare(fields)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Load test of the embedded TAK server with hundreds of stand-in clients
+
+Usage: python bench_tak_server.py [--clients N] [--stalled N] [--tracks N] [--rate R] [--seconds S]
+
+Runs a TAKServer in this process and stand-in TAK clients in worker
+processes. The clients that never read and half of the others connect
+before the live traffic starts, the rest join while it is running. Every
+reading client must end up with the same latest event per uid as the
+server's table (snapshot plus live updates, coalesced or not), and the
+stalled ones must neither hold back the others nor grow without bound. Both
+slow client policies are run: 'coalesce', then 'disconnect' with a small
+per-client queue.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import multiprocessing
+import random
+import socket
+import time
+
+from cot_encoder import CoTClock, CoTTemplate
+from tak_server import TAKServer
+
+END = b'<event uid="END" />'
+
+
+def uid_of(line: bytes) -> bytes:
+    start = line.find(b'uid="') + 5
+    return line[start:line.find(b'"', start)]
+
+
+def digest(latest) -> str:
+    h = hashlib.sha1()
+    for uid in sorted(latest):
+        h.update(uid + b'\0' + latest[uid] + b'\n')
+    return h.hexdigest()
+
+
+async def reading_client(port: int, tracks: int, delay: float):
+    await asyncio.sleep(delay)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    connected = time.perf_counter()
+    latest = {}
+    snapshot_time = None
+    events = 0
+    buffered = b''
+    try:
+        while True:
+            chunk = await reader.read(262144)
+            if not chunk:
+                return None, events, snapshot_time, True
+            lines = (buffered + chunk).split(b'\n')
+            buffered = lines.pop()
+            for line in lines:
+                if line == END:
+                    return digest(latest), events, snapshot_time, False
+                latest[uid_of(line)] = line
+                events += 1
+            if snapshot_time is None and len(latest) >= tracks:
+                snapshot_time = time.perf_counter() - connected
+    finally:
+        writer.close()
+
+
+async def stalled_client(port: int, delay: float, done: asyncio.Event):
+    await asyncio.sleep(delay)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_event_loop().sock_connect(sock, ('127.0.0.1', port))
+    _, writer = await asyncio.open_connection(sock=sock)
+    await done.wait()
+    writer.close()
+
+
+async def clients(port, tracks, specs):
+    done = asyncio.Event()
+    stalled = [asyncio.ensure_future(stalled_client(port, delay, done)) for delay, is_stalled in specs if is_stalled]
+    results = await asyncio.gather(*(reading_client(port, tracks, delay) for delay, is_stalled in specs
+                                     if not is_stalled))
+    done.set()
+    await asyncio.gather(*stalled)
+    return results
+
+
+def client_process(port, tracks, specs, results):
+    results.put(asyncio.run(clients(port, tracks, specs)))
+
+
+class Traffic:
+    """Position updates for a fixed set of tracks, each event unique"""
+
+    def __init__(self, tracks: int, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.tracks = tracks
+        self.template = CoTTemplate()
+        self.clock = CoTClock(datetime.timedelta(hours=1))
+        self.sequence = 0
+
+    def event(self, track: int):
+        self.sequence += 1
+        uid = f"TRACK.{track}"
+        time_str, stale_str = self.clock.now()
+        rng = self.rng
+        return uid, self.template.encode(
+            'a-f-G-E-V-C', uid, time_str, stale_str, f"{rng.uniform(-60, 60):.5f}", f"{rng.uniform(-180, 180):.5f}",
+            '0', str(rng.randrange(360)), f"{rng.uniform(0, 15):.1f}", f"VESSEL {track}", f"Update {self.sequence}")
+
+    def random_event(self):
+        return self.event(self.rng.randrange(self.tracks))
+
+
+async def run(args, policy: str, client_queue: int):
+    server = TAKServer('127.0.0.1', 0, client_queue=client_queue, slow_clients=policy)
+    port = await server.listen()
+    traffic = Traffic(args.tracks)
+    for track in range(args.tracks):
+        uid, data = traffic.event(track)
+        server.send_nowait(data, uid)
+
+    # Every process gets a share of early, late and stalled clients; late ones
+    # join spread over the middle of the run
+    specs = [[] for _ in range(args.processes)]
+    for i in range(args.clients):
+        stalled = i < args.stalled
+        delay = 0 if stalled or i % 2 == 0 else args.seconds * (0.3 + 0.3 * i / args.clients)
+        specs[i % args.processes].append((delay, stalled))
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client_process, args=(port, args.tracks, spec, results))
+                 for spec in specs]
+    for process in processes:
+        process.start()
+
+    loop = asyncio.get_event_loop()
+    early = sum(1 for spec in specs for delay, _ in spec if delay == 0)
+    deadline = loop.time() + 30
+    while server.connections < early and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+
+    sending = 0.0
+    sent = 0
+    start = time.perf_counter()
+    owed = 0.0
+    last = start
+    while time.perf_counter() - start < args.seconds:
+        await asyncio.sleep(0.01)
+        now = time.perf_counter()
+        owed += (now - last) * args.rate
+        last = now
+        for _ in range(int(owed)):
+            uid, data = traffic.random_event()
+            t = time.perf_counter()
+            server.send_nowait(data, uid)
+            sending += time.perf_counter() - t
+            sent += 1
+        owed -= int(owed)
+    expected = digest({uid_of(line): line for line in server.snapshot()})
+    stalled_depth = max((len(client.buffer) for client in server.clients), default=0)
+    server.send_nowait(END)
+
+    outcomes = []
+    for _ in processes:
+        outcomes += await loop.run_in_executor(None, results.get)
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    await server.close()
+    return server, outcomes, expected, sent, sending, stalled_depth, elapsed
+
+
+def report(args, policy, server, outcomes, expected, sent, sending, stalled_depth, elapsed):
+    reading = args.clients - args.stalled
+    snapshot_times = sorted(outcome[2] for outcome in outcomes if outcome[2] is not None)
+    delivered = sum(outcome[1] for outcome in outcomes)
+    mismatched = sum(1 for outcome in outcomes if outcome[0] != expected)
+    disconnected = sum(1 for outcome in outcomes if outcome[3])
+    print(f"\n== slow_clients='{policy}', {args.clients} clients ({args.stalled} never read), {args.tracks} tracks ==")
+    print(f"Live events      : {sent:,} at {args.rate:,.0f}/s, fan-out {sending / max(sent, 1) * 1e6:.1f} us per event "
+          f"({sending / max(sent, 1) / args.clients * 1e9:.0f} ns per client)")
+    print(f"Delivered        : {delivered:,} events to {reading} reading clients in {elapsed:.1f}s "
+          f"({delivered / elapsed:,.0f}/s, {server.snapshot_events:,} in snapshots)")
+    if snapshot_times:
+        print(f"Snapshot         : p50 {snapshot_times[len(snapshot_times) // 2] * 1e3:.0f} ms, "
+              f"max {snapshot_times[-1] * 1e3:.0f} ms until a client had every track")
+    print(f"Slow clients     : {server.disconnected_slow} disconnected, largest pending buffer {stalled_depth:,} events, "
+          f"{server.dropped:,} dropped")
+    print(f"Final state      : {reading - mismatched}/{reading} reading clients match the server's latest events")
+    assert len(outcomes) == reading
+    assert disconnected == 0, f"{disconnected} reading clients were disconnected"
+    assert mismatched == 0, f"{mismatched} clients did not end with the latest event of every track"
+    if policy == 'coalesce':
+        assert server.disconnected_slow == 0
+        assert stalled_depth <= args.tracks, "a stalled client's buffer grew past one event per track"
+    else:
+        assert server.disconnected_slow == args.stalled, "stalled clients were not disconnected"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--stalled', type=int, default=30)
+    parser.add_argument('--tracks', type=int, default=5000)
+    parser.add_argument('--rate', type=float, default=1000, help="live events per second")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--processes', type=int, default=4, help="processes running the stand-in clients")
+    args = parser.parse_args()
+
+    for policy, client_queue in (('coalesce', 100000), ('disconnect', 3000)):
+        report(args, policy, *asyncio.run(run(args, policy, client_queue)))
+    print("\nTAK server load test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Simulated fleet through TrackThrottle: output volume cut vs track fidelity"""
+import math
+import random
+import time
+
+from track_throttle import KNOTS_TO_MS, METERS_PER_DEGREE, TrackThrottle
+from vessel_registry import VesselRegistry
+
+FLEET_SIZE = 2000
+MOORED_FRACTION = 0.7
+REPORT_INTERVAL = 3.0  # Seconds between position reports per vessel
+DURATION = 1800.0      # Simulated seconds
+
+
+class SimVessel:
+    def __init__(self, rng, mmsi):
+        self.mmsi = mmsi
+        self.lat = rng.uniform(-60, 60)
+        self.lon = rng.uniform(-180, 180)
+        self.moored = rng.random() < MOORED_FRACTION
+        self.speed = 0.0 if self.moored else rng.uniform(5, 20)
+        self.course = rng.uniform(0, 360)
+
+    def step(self, rng, dt):
+        if self.moored:
+            return
+        if rng.random() < 0.002:
+            self.course = (self.course + rng.uniform(-60, 60)) % 360
+        if rng.random() < 0.002:
+            self.speed = max(0.0, self.speed + rng.uniform(-5, 5))
+        distance = self.speed * KNOTS_TO_MS * dt
+        self.lat += distance * math.cos(math.radians(self.course)) / METERS_PER_DEGREE
+        self.lon += distance * math.sin(math.radians(self.course)) / (
+            METERS_PER_DEGREE * math.cos(math.radians(self.lat)))
+
+    def report(self, rng):
+        """Reported position with GPS jitter of a few metres, heading rounded like AIS"""
+        jitter = 5.0 / METERS_PER_DEGREE
+        return (self.lat + rng.uniform(-jitter, jitter), self.lon + rng.uniform(-jitter, jitter),
+                round(self.speed, 1), int(self.course))
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    dy = (lat1 - lat2) * METERS_PER_DEGREE
+    dx = (lon1 - lon2) * METERS_PER_DEGREE * math.cos(math.radians(lat1))
+    return math.hypot(dx, dy)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    rng = random.Random(5)
+    fleet = [SimVessel(rng, 200000000 + i) for i in range(FLEET_SIZE)]
+    registry = VesselRegistry()
+    throttle = TrackThrottle()
+
+    dr_errors = []
+    last_sent_errors = []
+    now = 0.0
+    start = time.perf_counter()
+    while now < DURATION:
+        now += REPORT_INTERVAL
+        for vessel in fleet:
+            vessel.step(rng, REPORT_INTERVAL)
+            lat, lon, speed, course = vessel.report(rng)
+            record = registry.touch(vessel.mmsi, now)
+            if not throttle.should_send(record, lat, lon, speed, course, now):
+                # What a receiver shows for this track right now vs the truth
+                predicted_lat, predicted_lon = throttle.predict(record, now)
+                dr_errors.append(distance_m(vessel.lat, vessel.lon, predicted_lat, predicted_lon))
+                last_sent_errors.append(distance_m(vessel.lat, vessel.lon, record.sent_lat, record.sent_lon))
+    elapsed = time.perf_counter() - start
+
+    print(f"{FLEET_SIZE:,} vessels ({MOORED_FRACTION:.0%} moored), a report every {REPORT_INTERVAL:.0f}s "
+          f"for {DURATION / 60:.0f} simulated minutes")
+    print(f"Throttle: {throttle.stats()}, {throttle.checked / max(throttle.sent, 1):.1f}x fewer events")
+    print(f"Error while suppressed, dead-reckoned : p95 {percentile(dr_errors, 0.95):.0f} m, "
+          f"max {max(dr_errors):.0f} m (threshold {throttle.position_error:.0f} m)")
+    print(f"Error while suppressed, last position : p95 {percentile(last_sent_errors, 0.95):.0f} m, "
+          f"max {max(last_sent_errors):.0f} m")
+    print(f"Cost: {elapsed / throttle.checked * 1e6:.2f} us/report (including the simulation)")
+
+
+if __name__ == "__main__":
+    main()
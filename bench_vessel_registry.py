@@ -0,0 +1,62 @@
+"""Memory benchmark: VesselRegistry stays bounded under a whole-world vessel churn"""
+import random
+import time
+import tracemalloc
+
+from vessel_registry import VesselRegistry
+
+MAX_VESSELS = 150000
+DISTINCT_MMSIS = 600000
+UPDATES = 1000000
+
+
+def static_data(mmsi):
+    return {
+        'Type': 30 + mmsi % 60,
+        'Name': f"VESSEL {mmsi}",
+        'Dimension': {'A': 100, 'B': 20, 'C': 10, 'D': 12},
+    }
+
+
+def main():
+    rng = random.Random(1)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+
+    registry = VesselRegistry(max_vessels=MAX_VESSELS, max_age=3600)
+    now = time.time()
+
+    # Fill to the cap with fully populated records
+    for mmsi in range(200000000, 200000000 + MAX_VESSELS):
+        registry.update_static(mmsi, static_data(mmsi), now)
+    full = tracemalloc.get_traced_memory()[0] - base
+    print(f"Filled {len(registry):,} vessels: {full / 1e6:.1f} MB ({full / len(registry):.0f} bytes/vessel)")
+
+    # Churn far more distinct MMSIs than the cap through the registry
+    start = time.perf_counter()
+    for i in range(UPDATES):
+        mmsi = 200000000 + rng.randrange(DISTINCT_MMSIS)
+        now += 0.001
+        if i % 10 == 0:
+            registry.update_static(mmsi, static_data(mmsi), now)
+        else:
+            registry.touch(mmsi, now)
+    elapsed = time.perf_counter() - start
+    churned, peak = tracemalloc.get_traced_memory()
+    churned -= base
+    peak -= base
+    tracemalloc.stop()
+
+    print(f"After {UPDATES:,} updates over {DISTINCT_MMSIS:,} MMSIs: {len(registry):,} vessels, "
+          f"{registry.evicted:,} evicted, {churned / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)")
+    print(f"Update cost: {elapsed / UPDATES * 1e6:.2f} us/update (includes tracemalloc overhead)")
+
+    assert len(registry) <= MAX_VESSELS, "registry grew past max_vessels"
+    assert churned <= full * 1.25, "memory grew past the filled-registry footprint"
+    # Transient headroom is the hash table resize while the registry is at its cap
+    assert peak <= full * 1.5, "peak memory grew past the filled-registry footprint"
+    print("Memory bound holds")
+
+
+if __name__ == "__main__":
+    main()
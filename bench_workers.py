@@ -0,0 +1,72 @@
+"""Throughput scaling of the multi-process conversion mode (ConverterPool)"""
+import argparse
+import asyncio
+import os
+import time
+
+from ais_to_cot import AISToCoTConverter
+from ais_capture import read_capture
+from ais_workers import ConverterPool
+from synthetic_ais import generate_frames
+
+FRAMES = 200000
+WORKER_COUNTS = [1, 2, 4, 8]
+CONVERTER_ARGS = ('127.0.0.1', 4242, 'udp')
+
+
+def run_single_process(frames):
+    converter = AISToCoTConverter(*CONVERTER_ARGS)
+    start = time.perf_counter()
+    converted = 0
+    for frame in frames:
+        if converter.convert_frame(frame) is not None:
+            converted += 1
+    return time.perf_counter() - start, converted
+
+
+async def run_pool(frames, workers):
+    pool = ConverterPool(workers, CONVERTER_ARGS)
+    converted = 0
+
+    def deliver(results, malformed):
+        nonlocal converted
+        converted += len(results)
+
+    pool.start(deliver)
+    await asyncio.sleep(2)  # Let the spawned workers import and settle
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        pool.submit(frame)
+        if i % 1000 == 0:
+            await asyncio.sleep(0)
+    await pool.close()
+    await asyncio.sleep(0)
+    return time.perf_counter() - start, converted, pool.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('workers', nargs='*', type=int, default=WORKER_COUNTS)
+    parser.add_argument('--capture', help="capture file to replay (default: synthetic frames)")
+    args = parser.parse_args()
+
+    if args.capture:
+        frames = [frame for _, frame in read_capture(args.capture)]
+    else:
+        frames = list(generate_frames(FRAMES, fleet_size=20000))
+    counts = args.workers
+    print(f"{len(frames):,} {'captured' if args.capture else 'synthetic'} frames, {os.cpu_count()} CPU(s)")
+
+    elapsed, converted = run_single_process(frames)
+    baseline = len(frames) / elapsed
+    print(f"{'in-process':<11}: {baseline:10,.0f} msgs/s ({converted:,} events)")
+
+    for workers in counts:
+        elapsed, converted, dropped = asyncio.run(run_pool(frames, workers))
+        rate = len(frames) / elapsed
+        print(f"{workers:>2} worker(s): {rate:10,.0f} msgs/s ({converted:,} events, {dropped:,} dropped), "
+              f"{rate / baseline:.2f}x in-process")
+
+
+if __name__ == "__main__":
+    main()
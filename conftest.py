@@ -0,0 +1,2 @@
+# test_ais.py is a manual check against the live AISstream service (API key, network), not a unit test
+collect_ignore = ['test_ais.py']
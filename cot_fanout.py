@@ -0,0 +1,179 @@
+"""Sending converted events to several CoT destinations
+
+Each event is encoded once by the converter; FanOut queues the same bytes
+to every Destination whose filters accept it.
+"""
+import asyncio
+from typing import Iterable, List, Sequence
+
+from cot_encoder import CoTEvent
+from cot_priority import PriorityBuffer
+from cot_transport import CoalescingBuffer, CoTTransport, SendBuffer
+from metrics import Metrics, Sample, transport_samples
+from tak_proto import ENCODINGS, frame
+from tak_server import TAKServer
+
+# Socket buffer bytes for TCP destinations with priorities: about 80 XML events (the kernel
+# doubles it), a fraction of a second at the rates where shedding starts
+PRIORITY_SEND_BUFFER = 32768
+
+
+class Destination:
+    """One CoT output with its own filters and send buffer
+
+    include_types/exclude_types work like the converter's filters. bbox is
+    (min_lat, min_lon, max_lat, max_lon); a min_lon greater than max_lon
+    wraps across the antimeridian. Events without a position never match a
+    bbox. protocol 'server' listens on host:port for TAK clients instead of
+    connecting out (see TAKServer); coalesce=False then disconnects clients
+    that fall queue_size events behind. encoding 'protobuf' sends TAK
+    Protocol v1 with the streaming header over TCP and the mesh header over
+    UDP instead of XML. priorities is a list of cot_priority.PriorityClass
+    settings; the destination then sends the most important CoT types first
+    and sheds the least important when it falls behind, and over TCP keeps
+    at most send_buffer bytes in socket buffers (PRIORITY_SEND_BUFFER unless
+    given) so events queued behind the network do not undo the ordering.
+    """
+
+    def __init__(self, host: str, port: int, protocol: str = 'tcp', include_types: Iterable[str] = None,
+                 exclude_types: Iterable[str] = None, bbox: Sequence[float] = None, queue_size: int = 100000,
+                 overflow: str = 'drop-oldest', coalesce: bool = True, encoding: str = 'xml',
+                 priorities: Sequence[dict] = None, send_buffer: int = None):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.lower()
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}")
+        if encoding == 'protobuf' and self.protocol == 'server':
+            raise ValueError("The embedded TAK server only serves XML")
+        self.encoding = encoding
+        self.framing = None if encoding == 'xml' else 'stream' if self.protocol == 'tcp' else 'mesh'
+        self.include_types = frozenset(include_types) if include_types else None
+        self.exclude_types = frozenset(exclude_types) if exclude_types else None
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+                raise ValueError(f"Invalid bbox {bbox!r}, expected (min_lat, min_lon, max_lat, max_lon)")
+            bbox = (min_lat, min_lon, max_lat, max_lon)
+        self.bbox = bbox
+        self.overflow = overflow
+        self.filtered = 0
+        if self.protocol == 'server':
+            if overflow == 'block':
+                raise ValueError("The 'block' overflow policy would let one TAK client stall the others")
+            if priorities:
+                raise ValueError("The embedded TAK server does not prioritise by CoT type")
+            self.transport = TAKServer(host, port, queue_size, 'coalesce' if coalesce else 'disconnect')
+        else:
+            if priorities:
+                buffer = PriorityBuffer(priorities, queue_size, overflow, coalesce)
+                if send_buffer is None:
+                    send_buffer = PRIORITY_SEND_BUFFER
+            elif coalesce:
+                buffer = CoalescingBuffer(queue_size, overflow)
+            else:
+                buffer = SendBuffer(queue_size, overflow)
+            self.transport = CoTTransport(host, port, self.protocol, buffer,
+                                          delimiter=b'\n' if self.framing is None else b'', send_buffer=send_buffer)
+
+    def __repr__(self) -> str:
+        return f"Destination({self.host}:{self.port}/{self.protocol}, {self.encoding})"
+
+    def encoded(self, event: CoTEvent) -> bytes:
+        """The event in this destination's encoding"""
+        if self.framing is None:
+            return event.data
+        return frame(event.tak, self.framing)
+
+    def accepts(self, event: CoTEvent) -> bool:
+        """Whether the event passes this destination's type and area filters"""
+        if self.include_types is not None:
+            if event.cot_type not in self.include_types:
+                return False
+        elif self.exclude_types is not None and event.cot_type in self.exclude_types:
+            return False
+        if self.bbox is not None:
+            lat, lon = event.lat, event.lon
+            if lat is None or lon is None:
+                return False
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            if not min_lat <= lat <= max_lat:
+                return False
+            if min_lon <= max_lon:
+                return min_lon <= lon <= max_lon
+            return lon >= min_lon or lon <= max_lon
+        return True
+
+
+class FanOut:
+    """Queues each converted event to every destination that accepts it
+
+    Destinations each have their own buffer and writer task, so a slow or
+    unreachable one only fills (and drops from) its own buffer. For the
+    same reason the 'block' overflow policy is only allowed when there is a
+    single destination. With metrics, every destination's counters are
+    collected and CoTTransport destinations time their sends.
+    """
+
+    def __init__(self, destinations: List[Destination], metrics: Metrics = None):
+        if not destinations:
+            raise ValueError("FanOut needs at least one destination")
+        if len(destinations) > 1 and any(d.overflow == 'block' for d in destinations):
+            raise ValueError("The 'block' overflow policy would let one destination stall the others")
+        self.destinations = list(destinations)
+        self.encodings = frozenset(d.encoding for d in self.destinations)
+        self._unfiltered = all(d.include_types is None and d.exclude_types is None and d.bbox is None
+                               for d in self.destinations)
+        if metrics is not None:
+            for destination in self.destinations:
+                if isinstance(destination.transport, CoTTransport):
+                    destination.transport.metrics = metrics
+            metrics.collect(self.samples)
+
+    def samples(self) -> List[Sample]:
+        """Sent, dropped, lost and queued counts per destination, for Metrics.collect"""
+        return [sample for d in self.destinations for sample in transport_samples(self.name(d), d.transport)]
+
+    @staticmethod
+    def name(destination: Destination) -> str:
+        return f"{destination.host}:{destination.transport.port}/{destination.protocol}"
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(d.transport.queue_depth for d in self.destinations)
+
+    def send_nowait(self, event: CoTEvent):
+        """Queue an event to every accepting destination, applying their drop policies"""
+        data, uid = event.data, event.uid
+        for destination in self.destinations:
+            if self._unfiltered or destination.accepts(event):
+                destination.transport.send_nowait(data if destination.framing is None else destination.encoded(event),
+                                                  uid, event.origin, event.cot_type)
+            else:
+                destination.filtered += 1
+
+    async def send(self, event: CoTEvent):
+        """Like send_nowait, but waits for space on a single blocking destination"""
+        if len(self.destinations) > 1:
+            self.send_nowait(event)
+            return
+        destination = self.destinations[0]
+        if self._unfiltered or destination.accepts(event):
+            await destination.transport.send(destination.encoded(event), event.uid, event.origin, event.cot_type)
+        else:
+            destination.filtered += 1
+
+    def start(self):
+        for destination in self.destinations:
+            destination.transport.start()
+
+    async def drain(self, timeout: float = None):
+        await asyncio.gather(*(d.transport.drain(timeout) for d in self.destinations))
+
+    async def close(self):
+        await asyncio.gather(*(d.transport.close() for d in self.destinations))
+
+    def stats(self) -> str:
+        return ', '.join(f"{d.host}:{d.transport.port}/{d.protocol} {d.transport.sent} sent, {d.filtered} filtered, "
+                         f"{d.transport.dropped} dropped, {d.transport.queue_depth} queued"
+                         for d in self.destinations)
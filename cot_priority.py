@@ -0,0 +1,207 @@
+"""Priority-aware send buffer: important CoT types go first, low-priority updates are shed first
+
+In a plain send buffer, a military contact waits behind every cargo update
+that arrived before it once the destination falls behind. PriorityBuffer
+keeps one queue per priority class, and the writer always takes the next
+event from the most important class that is within its rate budget. A
+class over its budget is only served when no class within budget has
+anything waiting, so a flood of one type cannot starve the rest. When the
+buffer is full, the oldest event of the least important class waiting is
+dropped. Within a class a newer event for a track replaces its pending one,
+like CoalescingBuffer.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Overflow policies PriorityBuffer supports: which event of the class being shed is dropped
+SHED_POLICIES = ('drop-oldest', 'drop-newest')
+
+
+class PriorityClass:
+    """CoT types sharing a priority (0 is the most important), with an optional rate budget
+
+    rate is the events per second the class is sent at its priority, in
+    bursts of up to `burst` events (default: one second's worth); beyond it
+    the class waits until nothing within budget does. A class without types
+    takes every CoT type no other class lists.
+    """
+
+    def __init__(self, name: str, types: Iterable[str] = None, priority: int = 0, rate: float = None,
+                 burst: float = None):
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate budget of {name!r} must be positive")
+        self.name = name
+        self.types = frozenset(types) if types else None
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate or 0, 1)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.pending = OrderedDict()
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.over_budget = 0  # Sent beyond the rate budget because nothing else was waiting
+
+    def __repr__(self) -> str:
+        budget = f", {self.rate:g}/s" if self.rate is not None else ""
+        return f"PriorityClass({self.name!r}, priority {self.priority}{budget})"
+
+    def within_budget(self, now: float) -> bool:
+        """Take a token if the class may send now"""
+        if self.rate is None:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def stats(self) -> str:
+        return (f"{self.name}: {self.sent} sent ({self.over_budget} over budget), {self.dropped} dropped, "
+                f"{self.coalesced} coalesced, {len(self.pending)} queued")
+
+
+class PriorityBuffer:
+    """Send buffer with per-CoT-type priority classes and rate budgets
+
+    classes is a list of PriorityClass settings, e.g. {'name': 'military',
+    'types': ['a-n-G-U-C-F'], 'priority': 0}; if none of them is a default
+    class (without types), one named 'other' is added below all the others.
+    The buffer holds at most maxsize events across all classes. Events for
+    a uid that changes class (a vessel reclassified by its static data)
+    move with it, so a track never has two pending events.
+    """
+
+    blocking = False  # Overload is handled by shedding, never by stalling the converter
+
+    def __init__(self, classes: Sequence[Dict[str, Any]], maxsize: int = 100000, overflow: str = 'drop-oldest',
+                 coalesce: bool = True):
+        if overflow not in SHED_POLICIES:
+            raise ValueError(f"Priority buffers shed load, overflow must be one of {SHED_POLICIES}, not {overflow!r}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.coalesce = coalesce
+        self.classes: List[PriorityClass] = sorted((PriorityClass(**settings) for settings in classes),
+                                                   key=lambda c: c.priority)
+        defaults = [c for c in self.classes if c.types is None]
+        if len(defaults) > 1:
+            raise ValueError(f"Only one priority class may leave out types, got {defaults}")
+        if defaults:
+            self.default = defaults[0]
+        else:
+            lowest = self.classes[-1].priority + 1 if self.classes else 0
+            self.default = PriorityClass('other', priority=lowest)
+            self.classes.append(self.default)
+        self._by_type = {}
+        for priority_class in self.classes:
+            for cot_type in priority_class.types or ():
+                if cot_type in self._by_type:
+                    raise ValueError(f"CoT type {cot_type} is in priority classes "
+                                     f"{self._by_type[cot_type].name!r} and {priority_class.name!r}")
+                self._by_type[cot_type] = priority_class
+        self._owner: Dict[Any, PriorityClass] = {}  # uid -> class it has an event pending in
+        self._size = 0
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dropped(self) -> int:
+        return sum(c.dropped for c in self.classes)
+
+    @property
+    def coalesced(self) -> int:
+        return sum(c.coalesced for c in self.classes)
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def class_of(self, cot_type: Optional[str]) -> PriorityClass:
+        return self._by_type.get(cot_type, self.default)
+
+    def put(self, data: bytes, key: Optional[str] = None, cot_type: Optional[str] = None) -> bool:
+        """Queue or replace an event without waiting; returns False if it was dropped"""
+        target = self._by_type.get(cot_type, self.default)
+        owner = self._owner
+        if key is None or not self.coalesce:
+            key = object()
+        else:
+            current = owner.get(key)
+            if current is target:
+                target.pending[key] = data
+                target.coalesced += 1
+                return True
+            if current is not None:  # Reclassified: the newer event replaces the one in the old class
+                del current.pending[key]
+                current.coalesced += 1
+                self._size -= 1
+        if self._size >= self.maxsize and not self._shed(target):
+            target.dropped += 1
+            return False
+        target.pending[key] = data
+        target.queued += 1
+        owner[key] = target
+        self._size += 1
+        self._ready.set()
+        return True
+
+    def _shed(self, incoming: PriorityClass) -> bool:
+        """Drop one event to make room for one of `incoming`; False if the incoming one should go instead"""
+        for victim in reversed(self.classes):
+            if victim.pending:
+                break
+        if victim.priority < incoming.priority or (victim is incoming and self.overflow == 'drop-newest'):
+            return False
+        key, _ = victim.pending.popitem(last=False)
+        self._owner.pop(key, None)
+        victim.dropped += 1
+        self._size -= 1
+        return True
+
+    def _next(self) -> bytes:
+        now = time.monotonic()
+        waiting = None
+        for priority_class in self.classes:
+            if priority_class.pending:
+                if priority_class.within_budget(now):
+                    break
+                if waiting is None:
+                    waiting = priority_class
+        else:
+            priority_class = waiting
+            priority_class.over_budget += 1
+        key, data = priority_class.pending.popitem(last=False)
+        self._owner.pop(key, None)
+        priority_class.sent += 1
+        self._size -= 1
+        self._space.set()
+        return data
+
+    async def get(self) -> bytes:
+        """Wait for and return the next event to send"""
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._next()
+
+    def get_nowait(self) -> bytes:
+        """The next event to send; raises IndexError if the buffer is empty"""
+        if not self._size:
+            raise IndexError("get from an empty PriorityBuffer")
+        return self._next()
+
+    async def wait_for_space(self):
+        """Wait until put() would not need to shed"""
+        while self.full():
+            self._space.clear()
+            await self._space.wait()
+
+    def stats(self) -> str:
+        return '; '.join(c.stats() for c in self.classes)
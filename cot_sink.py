@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import List, Optional
+
+
+class CoTSink:
+    """Local TCP/UDP CoT receiver for benchmarks and load tests
+
+    Counts newline-delimited events (TCP) or datagrams (UDP) and optionally
+    records the arrival time of each one, and with record_events its bytes.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, protocol: str = 'tcp',
+                 record_times: bool = False, record_events: bool = False):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.lower()
+        self.record_times = record_times
+        self.record_events = record_events
+        self.events = 0
+        self.bytes = 0
+        self.arrivals: List[float] = []
+        self.received: List[bytes] = []
+        self.last_event: Optional[bytes] = None
+        self._server = None
+        self._transport = None
+        self._writers = set()
+
+    async def start(self) -> int:
+        """Start listening; returns the bound port"""
+        loop = asyncio.get_event_loop()
+        if self.protocol == 'tcp':
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+        else:
+            sink = self
+
+            class _Protocol(asyncio.DatagramProtocol):
+                def datagram_received(self, data, addr):
+                    sink._received(data)
+
+            self._transport, _ = await loop.create_datagram_endpoint(_Protocol, local_addr=(self.host, self.port))
+            self.port = self._transport.get_extra_info('sockname')[1]
+        return self.port
+
+    async def wait_for(self, events: int, timeout: float) -> bool:
+        """Wait until at least `events` have arrived; False on timeout"""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while self.events < events:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def close(self):
+        """Stop listening and wait briefly for open connections to finish"""
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        if self._transport is not None:
+            self._transport.close()
+        for _ in range(100):
+            if not self._writers:
+                break
+            await asyncio.sleep(0.01)
+
+    def _received(self, event: bytes):
+        self.events += 1
+        self.bytes += len(event)
+        self.last_event = event
+        if self.record_times:
+            self.arrivals.append(time.perf_counter())
+        if self.record_events:
+            self.received.append(event)
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        buffered = b''
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                *events, buffered = (buffered + chunk).split(b'\n')
+                for event in events:
+                    self._received(event)
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
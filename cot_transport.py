@@ -0,0 +1,301 @@
+import asyncio
+import socket
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+# What SendBuffer.put does when the buffer is full
+OVERFLOW_POLICIES = ('drop-oldest', 'drop-newest', 'block')
+
+
+class SendBuffer:
+    """Bounded FIFO of encoded CoT events waiting for the socket writer"""
+
+    def __init__(self, maxsize: int = 10000, overflow: str = 'drop-oldest'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.blocking = overflow == 'block'
+        self.dropped = 0
+        self._items = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    def put(self, data: bytes, key: Optional[str] = None, cot_type: Optional[str] = None) -> bool:
+        """Queue an event without waiting; returns False if it was dropped (cot_type is unused)"""
+        items = self._items
+        if len(items) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow != 'drop-oldest':
+                return False
+            items.popleft()
+        items.append(data)
+        self._ready.set()
+        return True
+
+    async def get(self) -> bytes:
+        """Wait for and return the next event to send"""
+        items = self._items
+        while not items:
+            self._ready.clear()
+            await self._ready.wait()
+        self._space.set()
+        return items.popleft()
+
+    def get_nowait(self) -> bytes:
+        """The next event to send; raises IndexError if the buffer is empty"""
+        data = self._items.popleft()
+        self._space.set()
+        return data
+
+    async def wait_for_space(self):
+        """Wait until put() would not overflow"""
+        while self.full():
+            self._space.clear()
+            await self._space.wait()
+
+
+class CoalescingBuffer:
+    """Latest-wins send buffer keyed by CoT uid
+
+    A newer event for a uid that is still waiting replaces the pending one in
+    place, so the backlog never holds more than one event per track and stale
+    positions are never sent. Events queued without a key are never coalesced.
+    """
+
+    def __init__(self, maxsize: int = 100000, overflow: str = 'drop-oldest'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.blocking = overflow == 'block'
+        self.dropped = 0
+        self.coalesced = 0
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def full(self) -> bool:
+        return len(self._pending) >= self.maxsize
+
+    def put(self, data: bytes, key: Optional[str] = None, cot_type: Optional[str] = None) -> bool:
+        """Queue or replace an event without waiting; returns False if it was dropped (cot_type is unused)"""
+        pending = self._pending
+        if key is None:
+            key = object()
+        elif key in pending:
+            pending[key] = data
+            self.coalesced += 1
+            return True
+        if len(pending) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow != 'drop-oldest':
+                return False
+            pending.popitem(last=False)
+        pending[key] = data
+        self._ready.set()
+        return True
+
+    async def get(self) -> bytes:
+        """Wait for and return the next event to send"""
+        pending = self._pending
+        while not pending:
+            self._ready.clear()
+            await self._ready.wait()
+        self._space.set()
+        return pending.popitem(last=False)[1]
+
+    def get_nowait(self) -> bytes:
+        """The next event to send; raises KeyError if the buffer is empty"""
+        data = self._pending.popitem(last=False)[1]
+        self._space.set()
+        return data
+
+    async def wait_for_space(self):
+        """Wait until put() would not overflow"""
+        while self.full():
+            self._space.clear()
+            await self._space.wait()
+
+
+class CoTTransport:
+    """Asyncio writer stage that drains a SendBuffer to a TCP or UDP CoT destination
+
+    Conversion only ever queues into the buffer (a SendBuffer, a
+    CoalescingBuffer or a cot_priority.PriorityBuffer, which orders events by
+    CoT type), so a slow or unreachable destination cannot stall ingestion.
+    TCP connections and UDP sockets are reopened with exponential backoff
+    whenever they fail or cannot be opened. TCP events are followed by delimiter, which is empty for
+    self-framing encodings.
+
+    With a metrics.Metrics, each event is queued with the time it was
+    queued and its source time (origin, seconds since the epoch) so the
+    writer can record queue-to-socket time and end-to-end lag.
+
+    send_buffer caps the bytes a TCP connection holds in the socket and
+    asyncio write buffers. Events there are past any reordering, so a
+    priority buffer sets it to keep its ordering effective when the
+    destination falls behind, at some cost in throughput on long links.
+    """
+
+    def __init__(self, host: str, port: int, protocol: str = 'tcp', buffer=None,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0, delimiter: bytes = b'\n',
+                 metrics=None, send_buffer: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.protocol = protocol.lower()
+        self.buffer = buffer if buffer is not None else SendBuffer()
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.delimiter = delimiter
+        self.metrics = metrics
+        self.send_buffer = send_buffer
+        self.connected = False
+        self.sent = 0
+        self.lost = 0  # Taken from the buffer but not written because the connection failed
+        self._task = None
+        self._opened = False  # The current attempt got a connection (or UDP socket)
+        self._in_flight = None  # Taken from the buffer and not yet written
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.buffer)
+
+    @property
+    def dropped(self) -> int:
+        return self.buffer.dropped
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}/{self.protocol}"
+
+    def send_nowait(self, data: bytes, key: Optional[str] = None, origin: Optional[float] = None,
+                    cot_type: Optional[str] = None) -> bool:
+        """Queue an event, applying the drop policy if the buffer is full"""
+        if self.metrics is None:
+            return self.buffer.put(data, key, cot_type)
+        return self.buffer.put((data, time.time(), origin), key, cot_type)
+
+    async def send(self, data: bytes, key: Optional[str] = None, origin: Optional[float] = None,
+                   cot_type: Optional[str] = None) -> bool:
+        """Queue an event, waiting for space first if the overflow policy is 'block'"""
+        buffer = self.buffer
+        if buffer.blocking and buffer.full():
+            await buffer.wait_for_space()
+        if self.metrics is None:
+            return buffer.put(data, key, cot_type)
+        return buffer.put((data, time.time(), origin), key, cot_type)
+
+    def _written(self, item: tuple):
+        """Record the send time and lag of an event (data, queued, origin) just written"""
+        now = time.time()
+        labels = (self.name,)
+        self.metrics.observe('cot_send_seconds', labels, now - item[1])
+        if item[2] is not None:
+            self.metrics.observe('cot_lag_seconds', labels, now - item[2])
+
+    def start(self) -> asyncio.Task:
+        """Start the writer task if it is not already running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def drain(self, timeout: float = None):
+        """Wait until everything queued so far has been handed to the socket"""
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while len(self.buffer) and (deadline is None or loop.time() < deadline):
+            await asyncio.sleep(0.01)
+
+    async def close(self):
+        """Stop the writer task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """Drain the buffer to the destination forever
+
+        A TCP connection or UDP socket that cannot be opened, or fails, is
+        reopened with exponential backoff, starting over once one opens.
+        """
+        serve = self._serve_tcp if self.protocol == 'tcp' else self._serve_udp
+        delay = self.reconnect_delay
+        while True:
+            self._opened = False
+            self._in_flight = None
+            try:
+                await serve()
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if self._in_flight is not None:
+                    self.lost += 1
+                if self._opened:
+                    delay = self.reconnect_delay
+                print(f"CoT output to {self.host}:{self.port} failed ({e}). "
+                      f"Reconnecting in {delay:.1f}s ({self.queue_depth} queued)...")
+            finally:
+                self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _serve_tcp(self):
+        buffer = self.buffer
+        delimiter = self.delimiter
+        metrics = self.metrics
+        _, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.send_buffer is not None:
+                writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+                writer.transport.set_write_buffer_limits(high=self.send_buffer)
+            self.connected = self._opened = True
+            print(f"CoT output connected to {self.host}:{self.port} via TCP")
+            while True:
+                data = self._in_flight = await buffer.get()
+                if metrics is None:
+                    writer.write(data + delimiter)
+                    await writer.drain()
+                else:
+                    writer.write(data[0] + delimiter)
+                    await writer.drain()
+                    self._written(data)
+                self._in_flight = None
+                self.sent += 1
+        finally:
+            writer.close()
+
+    async def _serve_udp(self):
+        loop = asyncio.get_event_loop()
+        buffer = self.buffer
+        metrics = self.metrics
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(self.host, self.port))
+        try:
+            self.connected = self._opened = True
+            while True:
+                data = self._in_flight = await buffer.get()
+                # asyncio closes the socket on a send error and then drops datagrams silently
+                if transport.is_closing():
+                    raise ConnectionError("UDP socket closed")
+                if metrics is None:
+                    transport.sendto(data)
+                else:
+                    transport.sendto(data[0])
+                    self._written(data)
+                self._in_flight = None
+                self.sent += 1
+        finally:
+            transport.close()
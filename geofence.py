@@ -0,0 +1,261 @@
+"""Areas of interest: fast point-in-area checks and derived subscription boxes
+
+Areas are lat/lon boxes and polygons. GeofenceIndex compiles them into a
+uniform grid: a cell entirely inside some area answers True straight away,
+a cell no area touches answers False, and only cells crossed by an area's
+edge test the few areas that cross them. The same areas give the tight
+bounding boxes to subscribe to upstream, so traffic outside them is never
+received.
+"""
+import json
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Cells in the index when cell_size is not given; the cell size is chosen
+# so the areas' bounding boxes fit in about this many
+AUTO_CELLS = 250000
+MIN_CELL_SIZE = 0.05  # degrees
+
+
+class Box:
+    """An area between two latitudes and two longitudes (min_lon <= max_lon)"""
+    __slots__ = ('name', 'min_lat', 'min_lon', 'max_lat', 'max_lon')
+
+    def __init__(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, name: str = None):
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise ValueError(f"Invalid box {(min_lat, min_lon, max_lat, max_lon)!r}, "
+                             f"expected (min_lat, min_lon, max_lat, max_lon)")
+        self.name = name
+        self.min_lat = min_lat
+        self.min_lon = min_lon
+        self.max_lat = max_lat
+        self.max_lon = max_lon
+
+    def __repr__(self) -> str:
+        return f"Box({self.min_lat}, {self.min_lon}, {self.max_lat}, {self.max_lon}, name={self.name!r})"
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return self.min_lat, self.min_lon, self.max_lat, self.max_lon
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon
+
+
+class Polygon:
+    """A simple polygon of (lat, lon) vertices, not crossing the antimeridian"""
+    __slots__ = ('name', 'points', 'bounds', '_edges')
+
+    def __init__(self, points: Sequence[Sequence[float]], name: str = None):
+        points = [(float(lat), float(lon)) for lat, lon in points]
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()  # Closed rings repeat the first vertex
+        if len(points) < 3:
+            raise ValueError(f"A polygon needs at least 3 points, got {len(points)}")
+        for lat, lon in points:
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"Invalid polygon point {(lat, lon)!r}")
+        self.name = name
+        self.points = points
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+        self.bounds = (min(lats), min(lons), max(lats), max(lons))
+        # (lat1, lat2, lon at lat1, lon change per degree of lat) of every non-horizontal edge
+        self._edges = [(lat1, lat2, lon1, (lon2 - lon1) / (lat2 - lat1))
+                       for (lat1, lon1), (lat2, lon2) in zip(points, points[1:] + points[:1]) if lat1 != lat2]
+
+    def __repr__(self) -> str:
+        return f"Polygon({len(self.points)} points, name={self.name!r})"
+
+    def edges(self) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+        return list(zip(self.points, self.points[1:] + self.points[:1]))
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Even-odd rule: count edge crossings of a ray from the point towards increasing longitude"""
+        inside = False
+        for lat1, lat2, lon1, slope in self._edges:
+            if (lat1 > lat) != (lat2 > lat) and lon < lon1 + (lat - lat1) * slope:
+                inside = not inside
+        return inside
+
+
+Area = Union[Box, Polygon]
+
+
+def parse_area(config: dict) -> List[Area]:
+    """Areas from one config entry: {"box": [min_lat, min_lon, max_lat, max_lon]} or
+    {"polygon": [[lat, lon], ...]}, with an optional "name"
+
+    A box whose min_lon is greater than its max_lon crosses the antimeridian
+    and is split in two.
+    """
+    name = config.get('name')
+    if 'box' in config:
+        min_lat, min_lon, max_lat, max_lon = config['box']
+        if min_lon > max_lon:
+            return [Box(min_lat, min_lon, max_lat, 180, name), Box(min_lat, -180, max_lat, max_lon, name)]
+        return [Box(min_lat, min_lon, max_lat, max_lon, name)]
+    if 'polygon' in config:
+        return [Polygon(config['polygon'], name)]
+    raise ValueError(f"Area needs a 'box' or a 'polygon': {config!r}")
+
+
+class GeofenceIndex:
+    """Grid index answering whether a position is inside any area of interest
+
+    contains() is one dict lookup for positions in cells entirely inside or
+    outside every area; only cells on an area's edge run the exact test,
+    against just the areas crossing that cell.
+    """
+
+    def __init__(self, areas: Iterable[Area], cell_size: float = None):
+        self.areas: List[Area] = list(areas)
+        if not self.areas:
+            raise ValueError("GeofenceIndex needs at least one area")
+        if cell_size is None:
+            covered = sum((area.bounds[2] - area.bounds[0]) * (area.bounds[3] - area.bounds[1])
+                          for area in self.areas)
+            cell_size = max(MIN_CELL_SIZE, math.sqrt(covered / AUTO_CELLS))
+        self.cell_size = cell_size
+        self._inverse = 1 / cell_size
+        self._columns = int(360 * self._inverse) + 2
+        # Cell key -> True when the cell is entirely inside an area, else the areas crossing it
+        self._cells: Dict[int, Union[bool, tuple]] = {}
+        for area in self.areas:
+            self._add(area)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'GeofenceIndex':
+        """Build from {"cell_size": optional degrees, "areas": [area, ...]} (see parse_area)"""
+        areas = [area for entry in config['areas'] for area in parse_area(entry)]
+        return cls(areas, config.get('cell_size'))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'GeofenceIndex':
+        """Load areas from a JSON file (see areas.example.json)"""
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.areas)
+
+    @property
+    def cells(self) -> int:
+        return len(self._cells)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int((lat + 90) * self._inverse), int((lon + 180) * self._inverse)
+
+    def _cell_bounds(self, row: int, column: int) -> Tuple[float, float, float, float]:
+        size = self.cell_size
+        return row * size - 90, column * size - 180, (row + 1) * size - 90, (column + 1) * size - 180
+
+    def _add(self, area: Area):
+        min_lat, min_lon, max_lat, max_lon = area.bounds
+        (first_row, first_column), (last_row, last_column) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        if isinstance(area, Polygon):
+            edge_cells = self._edge_cells(area)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell_min_lat, cell_min_lon, cell_max_lat, cell_max_lon = self._cell_bounds(row, column)
+                if isinstance(area, Box):
+                    inside = (min_lat <= cell_min_lat and cell_max_lat <= max_lat
+                              and min_lon <= cell_min_lon and cell_max_lon <= max_lon)
+                elif (row, column) in edge_cells:
+                    inside = False
+                elif area.contains((cell_min_lat + cell_max_lat) / 2, (cell_min_lon + cell_max_lon) / 2):
+                    # No edge crosses this cell, so its centre decides for all of it
+                    inside = True
+                else:
+                    continue
+                key = row * self._columns + column
+                current = self._cells.get(key)
+                if inside or current is True:
+                    self._cells[key] = True
+                else:
+                    self._cells[key] = (current or ()) + (area,)
+
+    def _edge_cells(self, polygon: Polygon) -> set:
+        """Every cell a polygon edge passes through (and possibly a few neighbours)"""
+        cells = set()
+        size = self.cell_size
+        for (lat1, lon1), (lat2, lon2) in polygon.edges():
+            steps = int(max(abs(lat2 - lat1), abs(lon2 - lon1)) / size) + 1
+            for step in range(steps):
+                # Each piece is shorter than a cell, so its bounding box covers the cells it crosses
+                start, end = step / steps, (step + 1) / steps
+                a = self._cell(lat1 + (lat2 - lat1) * start, lon1 + (lon2 - lon1) * start)
+                b = self._cell(lat1 + (lat2 - lat1) * end, lon1 + (lon2 - lon1) * end)
+                for row in range(min(a[0], b[0]), max(a[0], b[0]) + 1):
+                    for column in range(min(a[1], b[1]), max(a[1], b[1]) + 1):
+                        cells.add((row, column))
+        return cells
+
+    def contains(self, lat: Optional[float], lon: Optional[float]) -> bool:
+        """Whether a position is inside any area; positions without lat/lon, or out of range, never are"""
+        # Out of range coordinates (like AIS "not available" 91/181) would index a wrong cell
+        if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return False
+        cell = self._cells.get(int((lat + 90) * self._inverse) * self._columns + int((lon + 180) * self._inverse))
+        if cell is None:
+            return False
+        if cell is True:
+            return True
+        for area in cell:
+            if area.contains(lat, lon):
+                return True
+        return False
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min_lat, min_lon, max_lat, max_lon) around every area"""
+        boxes = [area.bounds for area in self.areas]
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    def subscription_boxes(self, max_boxes: int = 50, resolution: float = 1.0) -> List[List[List[float]]]:
+        """At most max_boxes AISstream BoundingBoxes ([[min_lat, min_lon], [max_lat, max_lon]]) covering every area
+
+        The areas' bounding boxes are rasterized at `resolution` degrees and
+        merged into rectangles; the resolution is doubled until few enough
+        rectangles remain.
+        """
+        while True:
+            boxes = self._cover(resolution)
+            if len(boxes) <= max_boxes:
+                return boxes
+            resolution *= 2
+
+    def _cover(self, resolution: float) -> List[List[List[float]]]:
+        inverse = 1 / resolution
+        rows: Dict[int, set] = {}
+        for min_lat, min_lon, max_lat, max_lon in (area.bounds for area in self.areas):
+            columns = range(math.floor((min_lon + 180) * inverse), math.floor((max_lon + 180) * inverse) + 1)
+            for row in range(math.floor((min_lat + 90) * inverse), math.floor((max_lat + 90) * inverse) + 1):
+                rows.setdefault(row, set()).update(columns)
+
+        # Runs of consecutive columns per row, then identical runs on consecutive rows merged
+        open_runs: Dict[Tuple[int, int], int] = {}  # (first column, last column) -> first row
+        rectangles = []
+        previous_row = None
+        for row in sorted(rows):
+            columns = sorted(rows[row])
+            runs = set()
+            start = end = columns[0]
+            for column in columns[1:]:
+                if column != end + 1:
+                    runs.add((start, end))
+                    start = column
+                end = column
+            runs.add((start, end))
+            for run, first_row in list(open_runs.items()):
+                if run not in runs or previous_row != row - 1:
+                    rectangles.append((first_row, previous_row, run))
+                    del open_runs[run]
+            for run in runs:
+                open_runs.setdefault(run, row)
+            previous_row = row
+        rectangles += [(first_row, previous_row, run) for run, first_row in open_runs.items()]
+
+        return [[[max(-90.0, first_row * resolution - 90), max(-180.0, first * resolution - 180)],
+                 [min(90.0, (last_row + 1) * resolution - 90), min(180.0, (last + 1) * resolution - 180)]]
+                for first_row, last_row, (first, last) in sorted(rectangles)]
@@ -0,0 +1,204 @@
+"""Pipeline counters and latency histograms, served as Prometheus text on /metrics
+
+Converters take an optional Metrics and skip every measurement when it is
+None, so an unused registry costs one `is None` check per stage. Counters
+and histograms are plain dicts keyed by (name, label values); values owned
+by other objects (transport sent/dropped counts, queue depths) are read by
+collectors only when /metrics is scraped.
+"""
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds in seconds, from a microsecond stage to a minute of lag
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help, label names)
+DEFINITIONS = {
+    'cot_messages_total': ('counter', "Input messages by type", ('message_type',)),
+    'cot_events_total': ('counter', "CoT events converted and queued, by CoT type", ('cot_type',)),
+    'cot_filtered_total': ('counter', "Positions not converted, by reason", ('reason',)),
+    'cot_errors_total': ('counter', "Errors by pipeline stage", ('stage',)),
+    'cot_sent_total': ('counter', "Events written to each destination", ('destination',)),
+    'cot_dropped_total': ('counter', "Events dropped by each destination's buffer", ('destination',)),
+    'cot_lost_total': ('counter', "Events taken from a buffer but lost with the connection", ('destination',)),
+    'cot_queue_depth': ('gauge', "Events waiting in each destination's buffer", ('destination',)),
+    'cot_class_sent_total': ('counter', "Events taken from a priority buffer, by priority class",
+                             ('destination', 'class')),
+    'cot_class_dropped_total': ('counter', "Events shed by a priority buffer, by priority class",
+                                ('destination', 'class')),
+    'cot_class_queue_depth': ('gauge', "Events waiting in a priority buffer, by priority class",
+                              ('destination', 'class')),
+    'cot_stage_seconds': ('histogram', "Time spent in each pipeline stage, per message (per poll for fetch)",
+                          ('stage',)),
+    'cot_send_seconds': ('histogram', "Time from queueing an event to writing it to the socket", ('destination',)),
+    'cot_lag_seconds': ('histogram', "Time from the source timestamp (AIS time_utc, OpenSky time_position) "
+                                     "to writing the event to the socket", ('destination',)),
+}
+
+Sample = Tuple[str, tuple, float]
+
+
+class Histogram:
+    """Cumulative-bucket histogram; counts[i] holds observations <= buckets[i], the last one the rest"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (inf if past the last bucket)"""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """Registry of the counters and histograms in DEFINITIONS"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        self.histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[name, labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def collect(self, collector: Callable[[], Iterable[Sample]]):
+        """Add a function returning (name, label values, value) samples, called on every scrape"""
+        self.collectors.append(collector)
+
+    def value(self, name: str, labels: tuple = ()) -> float:
+        """Current value of a counter, or of a collected sample"""
+        if (name, labels) in self.counters:
+            return self.counters[name, labels]
+        for collector in self.collectors:
+            for sample_name, sample_labels, value in collector():
+                if (sample_name, sample_labels) == (name, labels):
+                    return value
+        return 0
+
+    def histogram(self, name: str, labels: tuple) -> Optional[Histogram]:
+        return self.histograms.get((name, labels))
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        samples: Dict[str, List[Tuple[tuple, float]]] = {}
+        for (name, labels), value in self.counters.items():
+            samples.setdefault(name, []).append((labels, value))
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append((labels, value))
+        histograms: Dict[str, List[Tuple[tuple, Histogram]]] = {}
+        for (name, labels), histogram in self.histograms.items():
+            histograms.setdefault(name, []).append((labels, histogram))
+
+        lines = []
+        for name, (kind, help_text, label_names) in DEFINITIONS.items():
+            if name not in samples and name not in histograms:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples.get(name, ())):
+                lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+            for labels, histogram in sorted(histograms.get(name, ()), key=lambda item: item[0]):
+                total = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    total += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (le,))} {total}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(histogram.sum)}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def transport_samples(name: str, transport) -> List[Sample]:
+    """Collector samples for one destination's transport (CoTTransport or TAKServer)"""
+    labels = (name,)
+    samples = [('cot_sent_total', labels, transport.sent),
+               ('cot_dropped_total', labels, transport.dropped),
+               ('cot_lost_total', labels, getattr(transport, 'lost', 0)),
+               ('cot_queue_depth', labels, transport.queue_depth)]
+    # Per-class counts of a cot_priority.PriorityBuffer
+    for priority_class in getattr(getattr(transport, 'buffer', None), 'classes', ()):
+        class_labels = (name, priority_class.name)
+        samples += [('cot_class_sent_total', class_labels, priority_class.sent),
+                    ('cot_class_dropped_total', class_labels, priority_class.dropped),
+                    ('cot_class_queue_depth', class_labels, len(priority_class.pending))]
+    return samples
+
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics with Metrics.render()"""
+
+    def __init__(self, metrics: Metrics, host: str = '127.0.0.1', port: int = 9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self._server = None
+
+    async def start(self) -> int:
+        """Start listening; returns the port"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+            method, _, rest = request.partition(b' ')
+            path = rest.split(b' ', 1)[0].split(b'?', 1)[0]
+            if method == b'GET' and path == b'/metrics':
+                self.scrapes += 1
+                status, body = '200 OK', self.metrics.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,70 @@
+"""SBS-1 (BaseStation) messages as sent by dump1090 on TCP port 30003
+
+Each line is one CSV message carrying part of an aircraft's state: the
+callsign (MSG,1), a position (MSG,2/3), a velocity (MSG,4) or an altitude
+(MSG,5/6/7). apply_sbs_line merges them into an AircraftRegistry.
+"""
+import datetime
+from typing import Optional
+
+from aircraft_registry import AircraftRecord, AircraftRegistry
+
+FEET_TO_METERS = 0.3048
+KNOTS_TO_MS = 0.514444
+
+# SBS-1 CSV fields
+MESSAGE_TYPE = 0
+TRANSMISSION_TYPE = 1
+HEX_IDENT = 4
+DATE_GENERATED = 6
+TIME_GENERATED = 7
+CALLSIGN = 10
+ALTITUDE = 11      # feet
+GROUND_SPEED = 12  # knots
+TRACK = 13
+LATITUDE = 14
+LONGITUDE = 15
+FIELDS = 22
+
+
+def format_sbs_line(transmission_type: int, icao24: str, generated: datetime.datetime, callsign: str = '',
+                    altitude='', ground_speed='', track='', lat='', lon='') -> str:
+    """One SBS-1 MSG line, with the same generated and logged time"""
+    date = generated.strftime('%Y/%m/%d')
+    clock = generated.strftime('%H:%M:%S.%f')[:-3]
+    return (f"MSG,{transmission_type},1,1,{icao24.upper()},1,{date},{clock},{date},{clock},"
+            f"{callsign},{altitude},{ground_speed},{track},{lat},{lon},,,0,0,0,0\r\n")
+
+
+def generated_time(line: str) -> Optional[datetime.datetime]:
+    """The date/time generated fields of an SBS-1 line, None if absent"""
+    fields = line.split(',')
+    if len(fields) < FIELDS or not fields[DATE_GENERATED] or not fields[TIME_GENERATED]:
+        return None
+    return datetime.datetime.strptime(f"{fields[DATE_GENERATED]} {fields[TIME_GENERATED]}", '%Y/%m/%d %H:%M:%S.%f')
+
+
+def apply_sbs_line(registry: AircraftRegistry, line: str, now: float) -> Optional[AircraftRecord]:
+    """Merge one SBS-1 line into the registry
+
+    Returns the aircraft's record when the line carried a position, None for
+    any other line. Raises ValueError for lines with unparseable numbers.
+    """
+    fields = line.rstrip('\r\n').split(',')
+    if len(fields) < FIELDS or fields[MESSAGE_TYPE] != 'MSG' or not fields[HEX_IDENT]:
+        return None
+    record = registry.touch(fields[HEX_IDENT].lower(), now)
+    callsign = fields[CALLSIGN].strip()
+    if callsign:
+        record.callsign = callsign
+    if fields[ALTITUDE]:
+        record.alt = round(float(fields[ALTITUDE]) * FEET_TO_METERS, 1)
+    if fields[GROUND_SPEED]:
+        record.speed = round(float(fields[GROUND_SPEED]) * KNOTS_TO_MS, 2)
+    if fields[TRACK]:
+        record.heading = float(fields[TRACK])
+    if not fields[LATITUDE] or not fields[LONGITUDE]:
+        return None
+    record.lat = float(fields[LATITUDE])
+    record.lon = float(fields[LONGITUDE])
+    return record
@@ -0,0 +1,185 @@
+"""Local dump1090-compatible SBS-1 server for tests and latency measurements
+
+Serves synthetic traffic, or replays a recorded port 30003 feed paced by
+the generated timestamps of its lines.
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import time
+from typing import Iterator, List
+
+from sbs import format_sbs_line, generated_time
+
+CALLSIGN_PREFIXES = ['DLH', 'UAL', 'BAW', 'AFR', 'RCH', 'SWA', 'RYR', 'EZY', 'KLM', 'AAL']
+
+
+class SyntheticAircraft:
+    def __init__(self, rng: random.Random):
+        self.icao24 = f"{rng.randrange(1 << 24):06x}"
+        self.callsign = f"{rng.choice(CALLSIGN_PREFIXES)}{rng.randrange(1, 9999)}"
+        self.lat = rng.uniform(45, 55)
+        self.lon = rng.uniform(0, 15)
+        self.altitude = rng.randrange(1000, 40000, 25)  # feet
+        self.ground_speed = rng.randrange(150, 500)     # knots
+        self.track = rng.randrange(360)
+
+
+def generate_sbs_lines(aircraft: int = 500, seed: int = 1) -> Iterator[str]:
+    """Endless dump1090-style traffic for a random fleet
+
+    Half the lines are positions (MSG,3), one in twenty identification
+    (MSG,1) and the rest velocities (MSG,4).
+    """
+    rng = random.Random(seed)
+    fleet = [SyntheticAircraft(rng) for _ in range(aircraft)]
+    sequence = 0
+    while True:
+        sequence += 1
+        plane = rng.choice(fleet)
+        now = datetime.datetime.utcnow()
+        if sequence % 20 == 0:
+            yield format_sbs_line(1, plane.icao24, now, callsign=plane.callsign)
+        elif sequence % 2 == 0:
+            yield format_sbs_line(4, plane.icao24, now, ground_speed=plane.ground_speed, track=plane.track)
+        else:
+            # Every position report moves the aircraft, so each one is a new state
+            plane.lat += 0.001
+            plane.lon += 0.001
+            yield format_sbs_line(3, plane.icao24, now, altitude=plane.altitude,
+                                  lat=f"{plane.lat:.5f}", lon=f"{plane.lon:.5f}")
+
+
+def read_sbs_file(path: str) -> List[str]:
+    with open(path) as f:
+        return [line if line.endswith('\r\n') else line.rstrip('\n') + '\r\n' for line in f if line.strip()]
+
+
+class SBSStandIn:
+    """Serves SBS-1 lines to every client that connects
+
+    With path, the recorded lines are replayed at `speed` times their
+    original pace (0 for as fast as possible), otherwise synthetic traffic
+    is sent at `rate` lines per second. record_times keeps the send time and
+    text of every position line for latency measurements.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, path: str = None, speed: float = 1.0,
+                 rate: float = 1000, aircraft: int = 500, seed: int = 1, record_times: bool = False):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.speed = speed
+        self.rate = rate
+        self.aircraft = aircraft
+        self.seed = seed
+        self.record_times = record_times
+        self.connections = 0
+        self.lines_sent = 0
+        self.positions_sent = 0
+        self.position_times: List[float] = []
+        self.position_lines: List[str] = []
+        self._lines = read_sbs_file(path) if path else None
+        self._server = None
+        self._writers = set()
+
+    async def start(self) -> int:
+        """Start listening; returns the bound port"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    def stats(self) -> str:
+        return f"{self.connections} connections, {self.lines_sent} lines sent ({self.positions_sent} positions)"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            if self._lines is not None:
+                await self._replay(writer)
+            else:
+                await self._synthetic(writer)
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _send(self, writer, line: str):
+        if writer.is_closing():
+            raise ConnectionResetError("stand-in closed the connection")
+        writer.write(line.encode())
+        self.lines_sent += 1
+        if line.startswith(('MSG,3,', 'MSG,2,')):
+            self.positions_sent += 1
+            if self.record_times:
+                self.position_times.append(time.perf_counter())
+                self.position_lines.append(line)
+
+    async def _synthetic(self, writer):
+        lines = generate_sbs_lines(self.aircraft, self.seed)
+        last = time.monotonic()
+        owed = 0.0  # Lines owed so far at the configured rate
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.monotonic()
+            owed += (now - last) * self.rate
+            last = now
+            for _ in range(int(owed)):
+                self._send(writer, next(lines))
+            owed -= int(owed)
+            await writer.drain()
+
+    async def _replay(self, writer):
+        first = None
+        start = time.monotonic()
+        for line in self._lines:
+            generated = generated_time(line)
+            if self.speed and generated is not None:
+                if first is None:
+                    first = generated
+                delay = (generated - first).total_seconds() / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    await writer.drain()
+                    await asyncio.sleep(delay)
+            self._send(writer, line)
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=30003)
+    parser.add_argument('--replay', metavar='FILE', help="recorded port 30003 output to replay")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay rate multiple, 0 for max speed")
+    parser.add_argument('--rate', type=float, default=1000, help="synthetic lines per second")
+    parser.add_argument('--aircraft', type=int, default=500)
+    args = parser.parse_args()
+
+    async def serve():
+        server = SBSStandIn(args.host, args.port, args.replay, args.speed, args.rate, args.aircraft)
+        print(f"SBS-1 stand-in listening on {args.host}:{await server.start()}")
+        try:
+            while True:
+                await asyncio.sleep(10)
+                print(server.stats())
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+
+
+if __name__ == "__main__":
+    main()
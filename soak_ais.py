@@ -0,0 +1,89 @@
+"""Soak test: converter against the local AISstream stand-in with injected faults
+
+Usage: python soak_ais.py [--minutes N] [--rate R]
+
+Runs ais_standin.AISStandIn (disconnects, malformed frames, slow periods),
+AISToCoTConverter and a local CoT sink in one process, then checks that RSS
+stopped growing after warm-up and that every position report the stand-in
+delivered came out of the converter.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+
+from ais_standin import AISStandIn
+from ais_to_cot import AISToCoTConverter
+from cot_sink import CoTSink
+
+
+def current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def soak(minutes: float, rate: float):
+    standin = AISStandIn(rate=rate, fleet_size=20000, disconnect_every=45, malformed_ratio=0.001,
+                         slow_every=20, slow_duration=3)
+    url = await standin.start()
+    sink = CoTSink()
+    port = await sink.start()
+    # No throttle and no coalescing: every position report must become exactly one event
+    converter = AISToCoTConverter('127.0.0.1', port, 'tcp', coalesce=False, stream_url=url)
+    task = asyncio.ensure_future(converter.connect_and_process())
+
+    duration = minutes * 60
+    start = time.monotonic()
+    samples = []
+    while time.monotonic() - start < duration:
+        await asyncio.sleep(5)
+        samples.append((time.monotonic() - start, current_rss_mb()))
+        print(f"[{samples[-1][0]:5.0f}s] RSS {samples[-1][1]:6.1f} MB, {sink.events:,} events, "
+              f"queue {converter.transport.queue_depth}, {standin.stats()}")
+
+    # Stop the stream, then give the pipeline time to flush what it received
+    await standin.close()
+    await converter.transport.drain(timeout=10)
+    await sink.wait_for(standin.positions_sent, timeout=10)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await converter.transport.close()
+    await sink.close()
+    return standin, converter, sink, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=3)
+    parser.add_argument('--rate', type=float, default=1000, help="stand-in frames per second")
+    args = parser.parse_args()
+
+    standin, converter, sink, samples = asyncio.run(soak(args.minutes, args.rate))
+
+    # Compare memory after warm-up (first third) with the end of the run
+    warm = [rss for t, rss in samples if t >= samples[-1][0] / 3]
+    growth = warm[-1] - warm[0]
+    lost = standin.positions_sent - sink.events
+    print(f"\nStand-in : {standin.stats()}")
+    print(f"Converter: {converter.malformed} malformed frames skipped, {converter.transport.sent:,} events sent, "
+          f"{converter.transport.dropped} dropped, {converter.transport.lost} lost on reconnect")
+    print(f"Sink     : {sink.events:,} events for {standin.positions_sent:,} position reports ({lost} missing)")
+    print(f"RSS      : {warm[0]:.1f} MB after warm-up -> {warm[-1]:.1f} MB at end ({growth:+.1f} MB), "
+          f"peak {max(rss for _, rss in samples):.1f} MB")
+
+    assert standin.disconnects and standin.malformed_sent, "faults were not injected"
+    assert converter.malformed == standin.malformed_sent, "malformed frames were not all skipped"
+    assert lost == 0, "position reports were lost"
+    assert growth < 20, "memory kept growing after warm-up"
+    print("Soak test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Synthetic OpenSky /states/all responses for tests and benchmarks"""
+import copy
+import random
+
+CALLSIGNS = ['DLH', 'UAL', 'BAW', 'AFR', 'RCH', 'MIL', 'NATO', 'SWA', 'RYR', 'EZY']
+
+
+def synthetic_states(count: int, seed: int = 1) -> list:
+    """OpenSky-shaped state vectors with a realistic share of null fields"""
+    rng = random.Random(seed)
+    states = []
+    for icao24 in rng.sample(range(1 << 24), count):
+        has_position = rng.random() > 0.03
+        states.append([
+            f"{icao24:06x}",
+            f"{rng.choice(CALLSIGNS)}{rng.randrange(1000):<5}" if rng.random() > 0.02 else None,
+            'Germany', 1700000000, 1700000001,
+            round(rng.uniform(-180, 180), 4) if has_position else None,
+            round(rng.uniform(-60, 70), 4) if has_position else None,
+            round(rng.uniform(0, 12500), 2) if rng.random() > 0.05 else None,
+            False,
+            round(rng.uniform(50, 280), 2) if rng.random() > 0.01 else None,
+            round(rng.uniform(0, 360), 2) if rng.random() > 0.01 else None,
+            0.0, None, None, '1000', False, 0,
+        ])
+    return states
+
+
+def next_poll(states: list, moved: float, seed: int = 2) -> list:
+    """The same aircraft ten seconds later, with `moved` of them at a new position"""
+    rng = random.Random(seed)
+    states = copy.deepcopy(states)
+    for row in states:
+        if row[6] is not None and rng.random() < moved:
+            row[6] = round(row[6] + rng.uniform(-0.02, 0.02), 4)
+    return states
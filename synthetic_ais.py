@@ -0,0 +1,118 @@
+import datetime
+import json
+import random
+from typing import Iterator, Optional
+
+SHIP_TYPES = [30, 36, 37, 40, 52, 55, 60, 69, 70, 71, 79, 80, 89, 99, 0]
+NAME_WORDS = ['NORTH', 'STAR', 'OCEAN', 'EVER', 'GRACE', 'MAERSK', 'SEA', 'SPIRIT', 'ATLANTIC', 'PIONEER']
+MIDS = [338, 366, 367, 244, 235, 250, 211, 219, 224, 227, 247, 257, 273, 311, 351, 412, 413, 431, 477, 538, 563, 636]
+
+
+class SyntheticVessel:
+    def __init__(self, rng: random.Random, index: int):
+        self.mmsi = rng.choice(MIDS) * 1000000 + index % 1000000
+        self.name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {index}"
+        self.ship_type = rng.choice(SHIP_TYPES)
+        self.lat = rng.uniform(-70, 70)
+        self.lon = rng.uniform(-180, 180)
+        self.sog = rng.choice([0.0, 0.0, 0.1, rng.uniform(5, 22)])
+        self.heading = rng.randrange(360)
+
+
+def time_utc(now: datetime.datetime) -> str:
+    """AISstream MetaData.time_utc format"""
+    return now.strftime('%Y-%m-%d %H:%M:%S.%f') + '000 +0000 UTC'
+
+
+def position_report(vessel: SyntheticVessel, now: datetime.datetime) -> dict:
+    return {
+        'Message': {
+            'PositionReport': {
+                'Cog': float(vessel.heading),
+                'CommunicationState': 59916,
+                'Latitude': round(vessel.lat, 6),
+                'Longitude': round(vessel.lon, 6),
+                'MessageID': 1,
+                'NavigationalStatus': 0 if vessel.sog > 1 else 5,
+                'PositionAccuracy': True,
+                'Raim': False,
+                'RateOfTurn': 0,
+                'RepeatIndicator': 0,
+                'Sog': round(vessel.sog, 1),
+                'Spare': 0,
+                'SpecialManoeuvreIndicator': 0,
+                'Timestamp': now.second,
+                'TrueHeading': vessel.heading,
+                'UserID': vessel.mmsi,
+                'Valid': True,
+            }
+        },
+        'MessageType': 'PositionReport',
+        'MetaData': {
+            'MMSI': vessel.mmsi,
+            'MMSI_String': vessel.mmsi,
+            'ShipName': vessel.name.ljust(20)[:20],
+            'latitude': round(vessel.lat, 6),
+            'longitude': round(vessel.lon, 6),
+            'time_utc': time_utc(now),
+        },
+    }
+
+
+def static_data(vessel: SyntheticVessel, now: datetime.datetime) -> dict:
+    return {
+        'Message': {
+            'StaticData': {
+                'AisVersion': 2,
+                'CallSign': f"C{vessel.mmsi % 100000}",
+                'Destination': 'ROTTERDAM',
+                'Dimension': {'A': 120, 'B': 30, 'C': 12, 'D': 14},
+                'Dte': False,
+                'Eta': {'Day': 1, 'Hour': 12, 'Minute': 0, 'Month': 1},
+                'FixType': 1,
+                'ImoNumber': 9000000 + vessel.mmsi % 999999,
+                'MaximumStaticDraught': 9.5,
+                'MessageID': 5,
+                'Name': vessel.name,
+                'RepeatIndicator': 0,
+                'Spare': False,
+                'Type': vessel.ship_type,
+                'UserID': vessel.mmsi,
+                'Valid': True,
+            }
+        },
+        'MessageType': 'StaticData',
+        'MetaData': {
+            'MMSI': vessel.mmsi,
+            'MMSI_String': vessel.mmsi,
+            'ShipName': vessel.name.ljust(20)[:20],
+            'latitude': round(vessel.lat, 6),
+            'longitude': round(vessel.lon, 6),
+            'time_utc': time_utc(now),
+        },
+    }
+
+
+def generate_frames(count: Optional[int], fleet_size: int = 5000, static_ratio: float = 0.1,
+                    seed: int = 1, wall_clock: bool = False) -> Iterator[str]:
+    """Yield AISstream-style JSON frames for a random fleet moving in straight lines
+
+    count=None generates frames forever. Frames are stamped from a synthetic
+    clock starting at 2024-01-01 unless wall_clock is set.
+    """
+    rng = random.Random(seed)
+    fleet = [SyntheticVessel(rng, i) for i in range(fleet_size)]
+    now = datetime.datetime(2024, 1, 1)
+    step = datetime.timedelta(seconds=2.0 / fleet_size)
+    generated = 0
+    while count is None or generated < count:
+        generated += 1
+        vessel = rng.choice(fleet)
+        now = datetime.datetime.utcnow() if wall_clock else now + step
+        if vessel.sog:
+            vessel.lat = min(max(vessel.lat + rng.uniform(-1e-4, 1e-4), -89), 89)
+            vessel.lon = (vessel.lon + rng.uniform(-1e-4, 1e-4) + 180) % 360 - 180
+        if rng.random() < static_ratio:
+            yield json.dumps(static_data(vessel, now))
+        else:
+            yield json.dumps(position_report(vessel, now))
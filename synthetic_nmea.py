@@ -0,0 +1,157 @@
+"""Synthetic !AIVDM sentences for benchmarks and receiver stand-ins
+
+Encodes the synthetic_ais fleet as message types 1, 5 (two fragments),
+18, 19 and 24 A/B, with valid checksums. generate_messages also gives the
+AISRecord each message should decode to, for round-trip checks.
+"""
+import random
+from typing import Iterator, List, Tuple
+
+from ais_decoder import AISRecord
+from ais_nmea import nmea_checksum
+from synthetic_ais import SyntheticVessel
+
+_ARMOR = ''.join(chr(code + 48 if code < 40 else code + 56) for code in range(64))
+_TEXT_CODES = {char: code for code, char in
+               enumerate('@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_ !"#$%&\'()*+,-./0123456789:;<=>?')}
+MAX_FRAGMENT = 60  # Payload characters per sentence
+
+
+def _text(value: str, chars: int) -> List[Tuple[int, int]]:
+    value = value.upper()[:chars].ljust(chars, '@')
+    return [(_TEXT_CODES.get(char, 0), 6) for char in value]
+
+
+def armor(fields: List[Tuple[int, int]]) -> Tuple[str, int]:
+    """(payload, fill bits) for a list of (value, width) bit fields"""
+    value = 0
+    length = 0
+    for field, width in fields:
+        value = (value << width) | (field & ((1 << width) - 1))
+        length += width
+    fill_bits = -length % 6
+    value <<= fill_bits
+    length += fill_bits
+    payload = ''.join(_ARMOR[(value >> shift) & 63] for shift in range(length - 6, -1, -6))
+    return payload, fill_bits
+
+
+def sentences(payload: str, fill_bits: int, sequence_id: int = None, channel: str = 'A') -> List[str]:
+    """The !AIVDM sentence(s) carrying a payload, split into fragments if needed"""
+    chunks = [payload[i:i + MAX_FRAGMENT] for i in range(0, len(payload), MAX_FRAGMENT)]
+    sequence = '' if len(chunks) == 1 else str(sequence_id % 10)
+    result = []
+    for number, chunk in enumerate(chunks, 1):
+        body = (f"AIVDM,{len(chunks)},{number},{sequence},{channel},{chunk},"
+                f"{fill_bits if number == len(chunks) else 0}")
+        result.append(f"!{body}*{nmea_checksum(body):02X}")
+    return result
+
+
+def _dimension(vessel: SyntheticVessel) -> List[Tuple[int, int]]:
+    return [(120, 9), (30, 9), (12, 6), (14, 6)]
+
+
+def _decoded_text(value: str, chars: int) -> str:
+    """value as AIS text reads back: upper case, cut at the first character it cannot carry"""
+    value = value.upper()[:chars]
+    return ''.join(char if _TEXT_CODES.get(char, 0) else '@' for char in value).split('@', 1)[0].strip()
+
+
+def expected_record(message_id: int, vessel: SyntheticVessel, part: int = None) -> AISRecord:
+    """The AISRecord NMEADecoder should return for a message encoded from vessel"""
+    record = AISRecord({1: 'PositionReport', 5: 'ShipStaticData', 18: 'StandardClassBPositionReport',
+                        19: 'ExtendedClassBPositionReport', 24: 'StaticDataReport'}[message_id], vessel.mmsi)
+    if message_id in (1, 18, 19):
+        record.lat = round(vessel.lat * 600000) / 600000
+        record.lon = round(vessel.lon * 600000) / 600000
+        record.sog = round(vessel.sog * 10) / 10
+        record.cog = float(vessel.heading)
+        record.heading = vessel.heading
+    else:
+        record.is_static = True
+    if message_id in (5, 19) or part == 0:
+        record.name = _decoded_text(vessel.name, 20) or None
+    if message_id in (5, 19) or part == 1:
+        record.ship_type = vessel.ship_type
+        record.length, record.beam = 150, 26
+    if message_id == 19:
+        record.ship_name = record.name or ''
+    return record
+
+
+def position_report(vessel: SyntheticVessel, class_b: bool) -> List[Tuple[int, int]]:
+    lon = round(vessel.lon * 600000)
+    lat = round(vessel.lat * 600000)
+    sog = round(vessel.sog * 10)
+    cog = vessel.heading * 10
+    if class_b:
+        return [(18, 6), (0, 2), (vessel.mmsi, 30), (0, 8), (sog, 10), (1, 1), (lon, 28), (lat, 27),
+                (cog, 12), (vessel.heading, 9), (0, 6), (0, 2), (1, 1), (0, 1), (0, 1), (1, 1), (0, 1),
+                (0, 1), (0, 1), (0, 20)]
+    return [(1, 6), (0, 2), (vessel.mmsi, 30), (0 if vessel.sog > 1 else 5, 4), (0, 8), (sog, 10), (1, 1),
+            (lon, 28), (lat, 27), (cog, 12), (vessel.heading, 9), (0, 6), (0, 2), (0, 3), (0, 1), (0, 19)]
+
+
+def extended_class_b(vessel: SyntheticVessel) -> List[Tuple[int, int]]:
+    fields = position_report(vessel, True)[:11]  # Type 18 layout up to the timestamp
+    fields[0] = (19, 6)
+    return (fields + [(0, 4)] + _text(vessel.name, 20) + [(vessel.ship_type, 8)] + _dimension(vessel)
+            + [(1, 4), (0, 1), (1, 1), (0, 1), (0, 4)])
+
+
+def static_voyage(vessel: SyntheticVessel) -> List[Tuple[int, int]]:
+    return ([(5, 6), (0, 2), (vessel.mmsi, 30), (2, 2), (9000000 + vessel.mmsi % 999999, 30)]
+            + _text(f"C{vessel.mmsi % 100000}", 7) + _text(vessel.name, 20) + [(vessel.ship_type, 8)]
+            + _dimension(vessel) + [(1, 4), (1, 4), (1, 5), (12, 5), (0, 6), (95, 8)]
+            + _text('ROTTERDAM', 20) + [(0, 1), (0, 1)])
+
+
+def static_report(vessel: SyntheticVessel, part: int) -> List[Tuple[int, int]]:
+    header = [(24, 6), (0, 2), (vessel.mmsi, 30), (part, 2)]
+    if part == 0:
+        return header + _text(vessel.name, 20)
+    return (header + [(vessel.ship_type, 8)] + _text('VENDOR', 7) + _text(f"C{vessel.mmsi % 100000}", 7)
+            + _dimension(vessel) + [(0, 6)])
+
+
+def generate_messages(fleet_size: int = 5000, static_ratio: float = 0.1, class_b_ratio: float = 0.3,
+                      seed: int = 1) -> Iterator[Tuple[List[str], AISRecord]]:
+    """Yield (sentences, expected record) per message for a random fleet, endlessly"""
+    rng = random.Random(seed)
+    fleet = [SyntheticVessel(rng, i) for i in range(fleet_size)]
+    class_b = set(rng.sample(range(fleet_size), int(fleet_size * class_b_ratio)))
+    sequence_id = 0
+    while True:
+        index = rng.randrange(fleet_size)
+        vessel = fleet[index]
+        if vessel.sog:
+            vessel.lat = min(max(vessel.lat + rng.uniform(-1e-4, 1e-4), -89), 89)
+            vessel.lon = (vessel.lon + rng.uniform(-1e-4, 1e-4) + 180) % 360 - 180
+        part = None
+        if rng.random() < static_ratio:
+            if index in class_b:
+                if rng.random() < 0.2:
+                    message_id, fields = 19, extended_class_b(vessel)
+                else:
+                    part = rng.randrange(2)
+                    message_id, fields = 24, static_report(vessel, part)
+            else:
+                message_id, fields = 5, static_voyage(vessel)
+        else:
+            message_id, fields = (18 if index in class_b else 1), position_report(vessel, index in class_b)
+        sequence_id += 1
+        yield (sentences(*armor(fields), sequence_id, rng.choice('AB')),
+               expected_record(message_id, vessel, part))
+
+
+def generate_sentences(count: int, fleet_size: int = 5000, static_ratio: float = 0.1, class_b_ratio: float = 0.3,
+                       seed: int = 1) -> Iterator[str]:
+    """Yield `count` sentences for a random fleet, including multi-fragment type 5 messages"""
+    generated = 0
+    for message, _ in generate_messages(fleet_size, static_ratio, class_b_ratio, seed):
+        for sentence in message:
+            if generated == count:
+                return
+            generated += 1
+            yield sentence
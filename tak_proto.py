@@ -0,0 +1,203 @@
+"""TAK Protocol version 1: CoT events as protobuf
+
+Encodes the same events as CoTTemplate as a TakMessage holding a CotEvent
+with contact and track detail; remarks, which have no protobuf message, go
+in xmlDetail. The protobuf wire format is written by hand so no protobuf
+package is needed. Framing is either the TCP streaming header (0xbf, then
+the message length as a varint) or the UDP mesh header (0xbf 0x01 0xbf).
+"""
+import datetime
+import struct
+from functools import lru_cache
+from typing import Dict, Optional
+
+from cot_encoder import escape_text
+
+ENCODINGS = ('xml', 'protobuf')
+FRAMINGS = ('stream', 'mesh')
+MESH_HEADER = b'\xbf\x01\xbf'
+
+# Wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+_POINT = struct.Struct('<BdBdBdBdBd')  # CotEvent lat (10), lon (11), hae (12), ce (13), le (14)
+_TRACK = struct.Struct('<BBBdBd')      # Detail.track (7): speed (1), course (2)
+_DOUBLE = struct.Struct('<d')
+
+
+def varint(value: int) -> bytes:
+    if value < 0x80:
+        return bytes((value,))
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# Length prefixes of up to 16 KB, looked up rather than computed per field
+_LENGTHS = [varint(length) for length in range(16384)]
+
+
+def _length(length: int) -> bytes:
+    return _LENGTHS[length] if length < 16384 else varint(length)
+
+
+def _string(key: int, value: str) -> bytes:
+    data = value.encode()
+    return bytes((key,)) + _length(len(data)) + data
+
+
+def time_ms(stamp: str) -> int:
+    """Milliseconds since the epoch of a CoT time string such as '2024-01-01T12:00:00.500000Z'"""
+    when = datetime.datetime.fromisoformat(stamp.rstrip('Z')).replace(tzinfo=datetime.timezone.utc)
+    return round(when.timestamp() * 1000)
+
+
+@lru_cache(maxsize=16)
+def _times(time_str: str, stale_str: str) -> bytes:
+    # CotEvent sendTime (6), startTime (7) and staleTime (8); CoTClock reuses
+    # its strings within a tick, so this is computed a few times a second
+    sent = varint(time_ms(time_str))
+    return b'\x30' + sent + b'\x38' + sent + b'\x40' + varint(time_ms(stale_str))
+
+
+def frame(payload: bytes, framing: str) -> bytes:
+    """Add the TCP streaming or UDP mesh header to an encoded TakMessage"""
+    if framing == 'stream':
+        return b'\xbf' + _length(len(payload)) + payload
+    return MESH_HEADER + payload
+
+
+class TakProtoTemplate:
+    """CoTTemplate's encode() producing TAK Protocol v1 messages
+
+    With framing None the bare TakMessage is returned, for outputs that add
+    their own header with frame().
+    """
+
+    def __init__(self, how: str = 'h-e', ce: str = '10', le: str = '10', framing: Optional[str] = None):
+        if framing is not None and framing not in FRAMINGS:
+            raise ValueError(f"Unknown framing {framing!r}, expected one of {FRAMINGS}")
+        self.how = _string(0x4a, how)
+        self.ce = float(ce)
+        self.le = float(le)
+        self.framing = framing
+
+    def encode(self, cot_type: str, uid: str, time_str: str, stale_str: str,
+               lat: str, lon: str, hae: str, course: str, speed: str,
+               callsign: str, remarks: str) -> bytes:
+        """Encode one event; all field values are the same pre-formatted strings CoTTemplate takes"""
+        remarks = ('<remarks>' + escape_text(remarks) + '</remarks>').encode()
+        callsign = callsign.encode()
+        contact = b'\x12' + _length(len(callsign)) + callsign
+        detail = b''.join((b'\x0a', _length(len(remarks)), remarks, b'\x12', _length(len(contact)), contact,
+                           _TRACK.pack(0x3a, 18, 0x09, float(speed), 0x11, float(course))))
+        cot_type = cot_type.encode()
+        uid = uid.encode()
+        event = b''.join((b'\x0a', _length(len(cot_type)), cot_type, b'\x2a', _length(len(uid)), uid,
+                          _times(time_str, stale_str), self.how,
+                          _POINT.pack(0x51, float(lat), 0x59, float(lon), 0x61, float(hae), 0x69, self.ce, 0x71, self.le),
+                          b'\x7a', _length(len(detail)), detail))
+        payload = b'\x12' + _length(len(event)) + event
+        if self.framing is None:
+            return payload
+        return frame(payload, self.framing)
+
+
+def parse_fields(data: bytes) -> Dict[int, list]:
+    """Field number -> values of one protobuf message (ints, or bytes for fixed64 and length-delimited)"""
+    fields: Dict[int, list] = {}
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == FIXED64:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == LENGTH_DELIMITED:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == FIXED32:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+        if pos > len(data):
+            raise ValueError("truncated protobuf message")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def _read_varint(data: bytes, pos: int):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def unframe(data: bytes, framing: str) -> bytes:
+    """The TakMessage inside one framed message"""
+    if framing == 'mesh':
+        if data[:3] != MESH_HEADER:
+            raise ValueError(f"not a TAK Protocol v1 mesh message: {data[:8]!r}")
+        return data[3:]
+    if data[:1] != b'\xbf':
+        raise ValueError(f"not a TAK Protocol streaming message: {data[:8]!r}")
+    length, pos = _read_varint(data, 1)
+    if len(data) - pos != length:
+        raise ValueError(f"framed length {length} does not match the {len(data) - pos} bytes that follow")
+    return data[pos:]
+
+
+def decode_message(data: bytes, framing: Optional[str] = None) -> dict:
+    """The CotEvent of a TakMessage as a dict, for checks and debugging
+
+    Keys follow the XML attribute and element names: type, uid, time, start
+    and stale (milliseconds), how, lat, lon, hae, ce, le, callsign, course,
+    speed and xmlDetail.
+    """
+    if framing is not None:
+        data = unframe(data, framing)
+    message = parse_fields(data)
+    if 2 not in message:
+        raise ValueError("TakMessage has no cotEvent")
+    event = parse_fields(message[2][0])
+    detail = parse_fields(event.get(15, [b''])[0])
+    contact = parse_fields(detail.get(2, [b''])[0])
+    track = parse_fields(detail.get(7, [b''])[0])
+
+    def text(fields, number):
+        return fields[number][0].decode() if number in fields else ''
+
+    def double(fields, number):
+        return _DOUBLE.unpack(fields[number][0])[0] if number in fields else 0.0
+
+    return {
+        'type': text(event, 1),
+        'uid': text(event, 5),
+        'time': event.get(6, [0])[0],
+        'start': event.get(7, [0])[0],
+        'stale': event.get(8, [0])[0],
+        'how': text(event, 9),
+        'lat': double(event, 10),
+        'lon': double(event, 11),
+        'hae': double(event, 12),
+        'ce': double(event, 13),
+        'le': double(event, 14),
+        'callsign': text(contact, 2),
+        'speed': double(track, 1),
+        'course': double(track, 2),
+        'xmlDetail': text(detail, 1),
+    }
@@ -0,0 +1,230 @@
+"""Embedded TAK streaming server: ATAK/WinTAK clients connect to the converter directly
+
+TAKServer listens for plain TCP streaming clients (the same CoT input ATAK
+and WinTAK use for a TAK server on port 8087). It keeps the latest event of
+every uid, so a client that connects gets a snapshot of all current tracks
+and then the live updates. It has the send_nowait/start/drain/close
+interface of CoTTransport and is used as Destination(protocol='server').
+"""
+import asyncio
+import socket
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from cot_transport import CoalescingBuffer, SendBuffer
+
+# What happens to a client whose buffer is full
+SLOW_CLIENT_POLICIES = ('coalesce', 'disconnect')
+
+
+class _Client:
+    __slots__ = ('peer', 'writer', 'buffer', 'sent', 'slow')
+
+    def __init__(self, peer, writer, buffer):
+        self.peer = peer
+        self.writer = writer
+        self.buffer = buffer
+        self.sent = 0
+        self.slow = False
+
+
+class TAKServer:
+    """Serves converted events to every connected TAK client
+
+    Each client has its own buffer of client_queue events and its own
+    writer, so a slow client never holds back the others. With slow_clients
+    'coalesce' the buffer is latest-wins per uid and drops the oldest event
+    when full; with 'disconnect' it is a FIFO and a client that lets it fill
+    up is disconnected. send_buffer caps each client socket's kernel send
+    buffer, so a backlog waits in that buffer (where it can be coalesced)
+    rather than in the kernel. Tracks not updated for max_age seconds are
+    left out of snapshots, and at most max_tracks are kept.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8087, client_queue: int = 100000,
+                 slow_clients: str = 'coalesce', max_tracks: int = 200000, max_age: float = 3600,
+                 send_buffer: int = 262144, write_batch: int = 500):
+        if slow_clients not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy {slow_clients!r}, expected one of {SLOW_CLIENT_POLICIES}")
+        self.host = host
+        self.port = port
+        self.client_queue = client_queue
+        self.slow_clients = slow_clients
+        self.max_tracks = max_tracks
+        self.max_age = max_age
+        self.send_buffer = send_buffer
+        self.write_batch = write_batch
+        self.clients: List[_Client] = []
+        self.connections = 0
+        self.disconnected_slow = 0
+        self.snapshot_events = 0
+        self.lost = 0  # Left in the buffers of clients that disconnected
+        self._sent = 0
+        self._dropped = 0
+        self._tracks = OrderedDict()  # uid -> (monotonic time, data), least recently updated first
+        self._server = None
+        self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(client.buffer) for client in self.clients)
+
+    @property
+    def sent(self) -> int:
+        return self._sent + sum(client.sent for client in self.clients)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped + sum(client.buffer.dropped for client in self.clients)
+
+    @property
+    def tracks(self) -> int:
+        return len(self._tracks)
+
+    def send_nowait(self, data: bytes, key: Optional[str] = None, origin: Optional[float] = None,
+                    cot_type: Optional[str] = None) -> bool:
+        """Record the event as its uid's latest and queue it to every client
+
+        origin and cot_type are accepted for compatibility with CoTTransport;
+        the server does not time its sends or prioritise by type.
+        """
+        if key is not None:
+            tracks = self._tracks
+            now = time.monotonic()
+            if key in tracks:
+                tracks.move_to_end(key)
+            tracks[key] = (now, data)
+            oldest = next(iter(tracks.values()))[0]
+            if len(tracks) > self.max_tracks or now - oldest > self.max_age:
+                self._expire(now)
+        disconnect = self.slow_clients == 'disconnect'
+        for client in self.clients:
+            if not client.buffer.put(data, key) and disconnect:
+                self._disconnect_slow(client)
+        return True
+
+    async def send(self, data: bytes, key: Optional[str] = None, origin: Optional[float] = None,
+                   cot_type: Optional[str] = None) -> bool:
+        return self.send_nowait(data, key)
+
+    def _expire(self, now: float):
+        tracks = self._tracks
+        cutoff = now - self.max_age
+        while tracks and (len(tracks) > self.max_tracks or next(iter(tracks.values()))[0] < cutoff):
+            tracks.popitem(last=False)
+
+    def snapshot(self) -> List[bytes]:
+        """The latest event of every track updated within max_age, oldest first"""
+        self._expire(time.monotonic())
+        return [data for _, data in self._tracks.values()]
+
+    def _disconnect_slow(self, client: _Client):
+        # A new list rather than remove(), as send_nowait may be iterating the old one
+        self.clients = [other for other in self.clients if other is not client]
+        client.slow = True
+        self.disconnected_slow += 1
+        print(f"TAK client {client.peer} is not keeping up ({len(client.buffer)} queued), disconnecting")
+        client.writer.transport.abort()
+
+    async def listen(self) -> int:
+        """Start accepting clients; returns the bound port"""
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"TAK server listening on {self.host}:{self.port}")
+        return self.port
+
+    def start(self) -> asyncio.Task:
+        """Start listening in the background if not already started"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.listen())
+        return self._task
+
+    async def drain(self, timeout: float = None):
+        """Wait until every client's buffer has been handed to its socket"""
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self.queue_depth and (deadline is None or loop.time() < deadline):
+            await asyncio.sleep(0.01)
+
+    async def close(self):
+        """Stop accepting clients and disconnect the connected ones"""
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for client in list(self.clients):
+                client.writer.transport.abort()
+            await self._server.wait_closed()
+            self._server = None
+        for _ in range(100):
+            if not self.clients:
+                break
+            await asyncio.sleep(0.01)
+
+    def stats(self) -> str:
+        return (f"{len(self.clients)} clients ({self.connections} connections, {self.disconnected_slow} "
+                f"disconnected as slow), {self.tracks} tracks, {self.sent} sent, {self.dropped} dropped")
+
+    async def _handle(self, reader, writer):
+        if self.slow_clients == 'coalesce':
+            buffer = CoalescingBuffer(self.client_queue, 'drop-oldest')
+        else:
+            buffer = SendBuffer(self.client_queue, 'drop-newest')
+        client = _Client(writer.get_extra_info('peername'), writer, buffer)
+        sock = writer.get_extra_info('socket')
+        if sock is not None and self.send_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+        # Taken in the same step as joining the client list, so no update falls in between
+        snapshot = self.snapshot()
+        self.clients.append(client)
+        self.connections += 1
+        self.snapshot_events += len(snapshot)
+        print(f"TAK client {client.peer} connected, sending {len(snapshot)} tracks")
+        writing = asyncio.ensure_future(self._write(client, snapshot))
+        reading = asyncio.ensure_future(self._discard_input(reader))
+        try:
+            await asyncio.wait((writing, reading), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (writing, reading):
+                task.cancel()
+            await asyncio.gather(writing, reading, return_exceptions=True)
+            if not client.slow:
+                self.clients.remove(client)
+            self._sent += client.sent
+            self.lost += len(client.buffer)
+            self._dropped += client.buffer.dropped
+            writer.close()
+            if not client.slow:
+                print(f"TAK client {client.peer} disconnected")
+
+    async def _discard_input(self, reader):
+        # Clients send their own position and pings; reading them keeps the
+        # connection healthy and notices when the client goes away
+        try:
+            while await reader.read(65536):
+                pass
+        except OSError:
+            pass
+
+    async def _write(self, client: _Client, snapshot: List[bytes]):
+        writer = client.writer
+        batch = self.write_batch
+        try:
+            for start in range(0, len(snapshot), batch):
+                chunk = snapshot[start:start + batch]
+                writer.write(b'\n'.join(chunk) + b'\n')
+                await writer.drain()
+                client.sent += len(chunk)
+            buffer = client.buffer
+            while True:
+                chunk = [await buffer.get()]
+                while buffer and len(chunk) < batch:
+                    chunk.append(buffer.get_nowait())
+                writer.write(b'\n'.join(chunk) + b'\n')
+                await writer.drain()
+                client.sent += len(chunk)
+        except OSError:
+            pass
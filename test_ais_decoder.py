@@ -0,0 +1,40 @@
+"""AISDecoder: identical records from every JSON backend, unwanted types rejected, truncated frames malformed"""
+import json
+
+import pytest
+
+from ais_decoder import BACKENDS, AISDecoder, record_from_dict
+from synthetic_ais import generate_frames
+
+FRAMES = list(generate_frames(500, fleet_size=50))
+
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_backends_match_the_stdlib_records(backend):
+    decoder = AISDecoder(backend=backend)
+    for frame in FRAMES:
+        assert decoder.decode(frame) == record_from_dict(json.loads(frame))
+        assert decoder.decode(frame.encode()) == record_from_dict(json.loads(frame))
+
+
+def test_unwanted_message_types_are_rejected_before_parsing():
+    decoder = AISDecoder(message_types=['StaticData'])
+    frame = next(frame for frame in FRAMES if '"PositionReport"' in frame)
+    assert decoder.decode(frame[:-1] + ',"Broken') is None  # Never parsed
+    assert decoder.rejected == 1
+
+
+def test_frames_without_a_message_type_are_parsed_and_rejected():
+    decoder = AISDecoder()
+    assert decoder.decode('{"error": "Api Key Is Not Valid"}') is None
+    assert decoder.rejected == 1
+
+
+@pytest.mark.parametrize('cut', [1, 20, 0.25, 0.5, 0.75, -2])
+def test_truncated_frames_are_malformed_wherever_they_are_cut(cut):
+    decoder = AISDecoder()
+    for frame in FRAMES[:50]:
+        end = cut if isinstance(cut, int) else int(len(frame) * cut)
+        with pytest.raises(ValueError):
+            decoder.decode(frame[:end])
+    assert decoder.rejected == 0
@@ -0,0 +1,86 @@
+"""NMEADecoder: every field round-trips the encoded values, "not available" values decode to None,
+type 19 static data reaches the vessel, bad input raises"""
+import functools
+import itertools
+import operator
+import random
+
+import pytest
+
+from ais_decoder import AISRecord
+from ais_nmea import NMEADecoder, nmea_checksum, payload_bits
+from ais_to_cot import AISToCoTConverter
+from synthetic_ais import SyntheticVessel
+from synthetic_nmea import armor, extended_class_b, generate_messages, position_report, sentences
+
+MESSAGES = list(itertools.islice(generate_messages(fleet_size=200), 3000))
+VESSEL = SyntheticVessel(random.Random(1), 1)
+
+# Index of each field in a synthetic_nmea type 18 report, and its "not available" value
+SOG, LON, LAT, COG, HEADING = 4, 6, 7, 8, 9
+NOT_AVAILABLE = {SOG: 1023, LON: 181 * 600000, LAT: 91 * 600000, COG: 3600, HEADING: 511}
+
+
+def class_b_sentence(*unavailable: int) -> str:
+    """A type 18 report of VESSEL with the fields at the given indices set to not available"""
+    fields = position_report(VESSEL, class_b=True)
+    for index in unavailable:
+        fields[index] = (NOT_AVAILABLE[index], fields[index][1])
+    return sentences(*armor(fields))[0]
+
+
+@pytest.mark.parametrize('field, attributes', [
+    (SOG, ['sog']),
+    (COG, ['cog']),
+    (HEADING, ['heading']),
+    (LAT, ['lat', 'lon']),
+    (LON, ['lat', 'lon']),
+])
+def test_not_available_values_decode_to_none(field, attributes):
+    expected = NMEADecoder().decode(class_b_sentence())
+    record = NMEADecoder().decode(class_b_sentence(field))
+    for name in AISRecord.__slots__:
+        assert getattr(record, name) == (None if name in attributes else getattr(expected, name)), name
+
+
+def test_reports_without_a_position_are_not_converted():
+    converter = AISToCoTConverter('127.0.0.1', 9, 'udp', decoder=NMEADecoder())
+    assert converter.convert_frame(class_b_sentence(LAT, SOG, COG, HEADING)) is None
+    event = converter.convert_frame(class_b_sentence(SOG, COG, HEADING))
+    assert b'<track course="0" speed="0" />' in event.data
+
+
+def test_type_19_without_a_position_only_updates_static_data():
+    fields = extended_class_b(VESSEL)
+    fields[LAT] = (NOT_AVAILABLE[LAT], 27)
+    converter = AISToCoTConverter('127.0.0.1', 9, 'udp', decoder=NMEADecoder())
+    assert converter.convert_frame(sentences(*armor(fields))[0]) is None
+    assert converter.vessels.get(VESSEL.mmsi).ship_type == VESSEL.ship_type
+
+
+@pytest.mark.parametrize('length', range(0, 130, 7))
+def test_checksum_is_the_xor_of_every_character(length):
+    body = bytes(range(33, 33 + length % 90)) * (length // 90 + 1)
+    assert nmea_checksum(body) == functools.reduce(operator.xor, body, 0)
+
+
+@pytest.mark.parametrize('sentence', [
+    '!AIVDM,1,1,,A,15M67FC000G?ufbE`FepT@3n00Sa,0*ZZ',  # Checksum field is not hex
+    '!AIVDM,1,1,,A,15M67FC000G?ufbE`FepT@3n00Sa,0*00',  # Wrong checksum
+    '$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47',
+])
+def test_malformed_sentences_raise(sentence):
+    with pytest.raises(ValueError):
+        NMEADecoder().decode(sentence)
+
+
+@pytest.mark.parametrize('payload', [b'15M67FC000G?ufbE`FepT@3n00S!', b'15M6 ', b'1x', b'15M67FC000G?ufbE`FepT@3n00Sy'])
+def test_characters_outside_the_armoring_raise(payload):
+    with pytest.raises(ValueError):
+        payload_bits(payload)
+
+
+def test_truncated_position_report_raises():
+    payload, fill_bits = armor(position_report(VESSEL, class_b=False)[:9])  # Ends after the latitude
+    with pytest.raises(ValueError):
+        NMEADecoder().decode(sentences(payload, fill_bits)[0])
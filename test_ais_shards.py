@@ -0,0 +1,111 @@
+"""Sharded subscriptions: box splitting, reconnect backoff, frame de-duplication and gap counting"""
+import asyncio
+import random
+
+import pytest
+
+from ais_shards import WORLD, Backoff, FrameDeduper, Shard, box_area, split_boxes
+
+NORTH_SEA = [[51.0, -4.0], [61.0, 9.0]]
+BALTIC = [[53.5, 9.5], [66.0, 30.0]]
+
+
+class Closed(Exception):
+    pass
+
+
+class FakeWebsocket:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    async def recv(self):
+        if not self.frames:
+            raise Closed()
+        return self.frames.pop(0)
+
+
+def received(shard: Shard, frames, deduper: FrameDeduper = None) -> list:
+    async def run():
+        out = []
+        try:
+            async for frame in shard.receive(FakeWebsocket(frames), deduper):
+                out.append(frame)
+        except Closed:
+            pass
+        return out
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('shards', [1, 2, 3, 4, 7])
+def test_split_boxes_keeps_the_whole_area(shards):
+    groups = split_boxes([WORLD], shards)
+    assert len(groups) == shards and all(groups)
+    assert sum(box_area(box) for group in groups for box in group) == pytest.approx(box_area(WORLD))
+    areas = [sum(box_area(box) for box in group) for group in groups]
+    assert max(areas) <= 2 * min(areas)
+
+
+def test_split_boxes_normalizes_corners_and_balances_by_area():
+    groups = split_boxes([[[61.0, 9.0], [51.0, -4.0]], BALTIC, [[0.0, 0.0], [1.0, 1.0]]], 2)
+    assert sorted(groups) == sorted([[BALTIC], [NORTH_SEA, [[0.0, 0.0], [1.0, 1.0]]]])
+    assert split_boxes([NORTH_SEA], 1) == [[NORTH_SEA]]
+
+
+def test_backoff_doubles_up_to_the_maximum_with_half_jitter():
+    backoff = Backoff(initial=1.0, maximum=10.0, rng=random.Random(3))
+    for attempt in range(40):
+        ceiling = min(10.0, 2.0 ** attempt)
+        assert ceiling / 2 <= backoff.next() <= ceiling
+    assert backoff.attempts == 40
+
+
+def test_backoff_reset_starts_again_from_the_initial_delay():
+    backoff = Backoff(initial=0.5, maximum=60.0, rng=random.Random(3))
+    for _ in range(10):
+        backoff.next()
+    backoff.reset()
+    assert 0.25 <= backoff.next() <= 0.5
+
+
+def test_backoff_jitter_spreads_shards_dropped_together():
+    delays = {Backoff(rng=random.Random(seed)).next() for seed in range(20)}
+    assert len(delays) == 20
+
+
+def test_deduper_drops_repeats_across_a_generation_rollover():
+    deduper = FrameDeduper(window=3)
+    assert [deduper.seen(frame) for frame in ('a', 'b', 'a', 'c')] == [False, False, True, False]
+    # 'a', 'b' and 'c' filled the window and are now the previous generation
+    assert deduper.current == set() and len(deduper.previous) == 3
+    assert [deduper.seen(frame) for frame in ('a', 'd', 'e', 'f')] == [True, False, False, False]
+    # A second rollover forgets the first generation
+    assert deduper.previous == {hash('d'), hash('e'), hash('f')}
+    assert not deduper.seen('a')
+    assert deduper.duplicates == 2
+
+
+def test_subscription_carries_the_shard_boxes():
+    shard = Shard(0, [NORTH_SEA, BALTIC])
+    assert shard.subscription('key') == {'APIKey': 'key', 'BoundingBoxes': [NORTH_SEA, BALTIC]}
+
+
+def test_receive_drops_duplicates_and_resets_the_backoff():
+    shard = Shard(0, [NORTH_SEA], Backoff(rng=random.Random(3)))
+    other = Shard(1, [BALTIC])
+    deduper = FrameDeduper()
+    shard.backoff.next()
+    shard.backoff.next()
+    assert received(shard, ['a', 'b', 'a'], deduper) == ['a', 'b']
+    assert received(other, ['b', 'c'], deduper) == ['c']
+    assert shard.backoff.attempts == 0
+    assert (shard.frames, other.frames, deduper.duplicates) == (3, 2, 2)
+
+
+def test_reconnect_counts_a_gap():
+    shard = Shard(0, [NORTH_SEA])
+    received(shard, ['a'])
+    assert shard.gaps == 0
+    received(shard, ['b', 'c'])
+    assert shard.gaps == 1 and 0 <= shard.longest_gap == shard.gap_time
+    assert received(shard, []) == [] and shard.gaps == 1
@@ -0,0 +1,96 @@
+"""ConverterPool: MMSI sharding of JSON and NMEA frames, and what the workers report back"""
+import asyncio
+import itertools
+
+import pytest
+
+from ais_nmea import NMEADecoder
+from ais_to_cot import AISToCoTConverter
+from ais_workers import ConverterPool, WorkerError, shard_for
+from synthetic_ais import generate_frames
+from synthetic_nmea import generate_messages
+from track_throttle import TrackThrottle
+
+CONVERTER_ARGS = ('127.0.0.1', 9, 'udp')
+
+
+class FailingDecoder:
+    """Fails the way a bug would, not the way a malformed frame does"""
+
+    def decode(self, message):
+        raise KeyError('boom')
+
+
+def test_every_frame_of_a_vessel_goes_to_the_same_worker():
+    shards = {}
+    for frame in generate_frames(2000, fleet_size=100):
+        mmsi = AISToCoTConverter(*CONVERTER_ARGS).decoder.decode(frame).mmsi
+        assert shards.setdefault(mmsi, shard_for(frame, 4)) == shard_for(frame, 4)
+        assert shard_for(frame.encode(), 4) == shard_for(frame, 4)
+    assert len(set(shards.values())) == 4
+
+
+def test_nmea_fragments_follow_the_first_one_to_its_vessels_worker():
+    shards = {}
+    fragments = {}
+    for message, expected in itertools.islice(generate_messages(fleet_size=100), 2000):
+        workers = {shard_for(sentence.encode() if i % 2 else sentence, 4, fragments)
+                   for i, sentence in enumerate(message)}
+        assert len(workers) == 1
+        assert shards.setdefault(expected.mmsi, min(workers)) in workers
+    assert len(set(shards.values())) == 4
+    assert not fragments
+
+
+async def convert_in_pool(frames, workers: int, **kwargs):
+    converter = AISToCoTConverter(*CONVERTER_ARGS, throttle=TrackThrottle(), workers=workers, **kwargs)
+    pool = converter.pool = ConverterPool(workers, converter.worker_args, converter.worker_kwargs)
+    events = []
+
+    def deliver(results, malformed):
+        events.extend(results)
+        converter.send_converted([], malformed)
+
+    pool.start(deliver)
+    for frame in frames:
+        pool.submit(frame)
+    await pool.close()
+    await asyncio.sleep(0)
+    return converter, events
+
+
+def test_throttle_stats_are_collected_from_the_workers():
+    frames = list(generate_frames(3000, fleet_size=200))
+    converter, events = asyncio.run(convert_in_pool(frames, 2))
+    local = AISToCoTConverter(*CONVERTER_ARGS, throttle=TrackThrottle())
+    for frame in frames:
+        local.convert_frame(frame)
+
+    checked = sum(checked for checked, _ in converter.pool.throttle_counts)
+    sent = sum(sent for _, sent in converter.pool.throttle_counts)
+    assert checked == local.throttle.checked > 0
+    assert sent == len(events)
+    assert converter.throttle_stats().startswith(f"{checked} reports, {sent} sent")
+    assert converter.throttle.checked == 0  # The parent's copy never sees a report
+
+
+def test_nmea_sentences_convert_in_the_pool_as_in_one_process():
+    frames = [sentence for message, _ in itertools.islice(generate_messages(fleet_size=100), 2000)
+              for sentence in message]
+    _, events = asyncio.run(convert_in_pool(frames, 3, decoder=NMEADecoder()))
+    local = AISToCoTConverter(*CONVERTER_ARGS, throttle=TrackThrottle(), decoder=NMEADecoder())
+    expected = [event for event in map(local.convert_frame, frames) if event is not None]
+    assert sorted((e.uid, e.cot_type, e.lat) for e in events) == sorted((e.uid, e.cot_type, e.lat) for e in expected)
+
+
+def test_malformed_frames_are_counted_in_the_parent():
+    frames = list(generate_frames(500, fleet_size=50))
+    frames[10:10] = ['{"MessageType": "PositionReport", "MetaData": {"MMSI": 1', b'{"MMSI": 2, "Mess']
+    converter, events = asyncio.run(convert_in_pool(frames, 2))
+    assert converter.malformed == 2
+    assert events
+
+
+def test_other_worker_exceptions_reach_the_parent():
+    with pytest.raises(WorkerError, match='KeyError'):
+        asyncio.run(convert_in_pool(list(generate_frames(10)), 1, decoder=FailingDecoder()))
@@ -0,0 +1,66 @@
+"""CoTTemplate writes byte for byte what the ElementTree build it replaced wrote"""
+import json
+import random
+
+import pytest
+
+from ais_to_cot import AISToCoTConverter
+from cot_encoder import CoTTemplate
+from reference import SAMPLES, build_with_elementtree, legacy_create_cot_from_ais
+from synthetic_ais import generate_frames
+
+TIME, STALE = '2024-01-01T00:00:00.100000Z', '2024-01-01T01:00:00.100000Z'
+# Characters XML escapes in attributes and text, control characters and non-ASCII
+SPECIALS = '&<>"\'\t\n\r\x01\x1b\x7fÅÉøß北斗🚢'
+LETTERS = 'ABCDEFGHIJ 0123456789'
+
+
+def hostile_text(rng: random.Random, length: int) -> str:
+    return ''.join(rng.choice(SPECIALS if rng.random() < 0.3 else LETTERS) for _ in range(length))
+
+
+@pytest.mark.parametrize('sample', SAMPLES)
+def test_samples_match_elementtree(sample):
+    cot_type, uid, lat, lon, course, speed, callsign, remarks = sample
+    expected = build_with_elementtree(cot_type, uid, TIME, STALE, lat, lon, course, speed, callsign, remarks)
+    assert CoTTemplate().encode(cot_type, uid, TIME, STALE, lat, lon, '0', course, speed, callsign, remarks) == expected
+
+
+def test_random_field_values_match_elementtree():
+    rng = random.Random(7)
+    template = CoTTemplate()
+    for _ in range(2000):
+        cot_type, uid, callsign, remarks = (hostile_text(rng, rng.randrange(30)) for _ in range(4))
+        lat, lon, course, speed = (str(rng.uniform(-180, 180)) for _ in range(4))
+        expected = build_with_elementtree(cot_type, uid, TIME, STALE, lat, lon, course, speed, callsign, remarks)
+        assert template.encode(cot_type, uid, TIME, STALE, lat, lon, '0', course, speed, callsign, remarks) == expected
+
+
+def position_reports(count: int):
+    """Synthetic position reports with hostile ship names and missing or unavailable course and speed
+
+    Each report gets an MMSI of its own, so no earlier report's name is joined in.
+    """
+    rng = random.Random(11)
+    for i, frame in enumerate(generate_frames(count * 2, fleet_size=500)):
+        data = json.loads(frame)
+        if data['MessageType'] != 'PositionReport':
+            continue
+        metadata = data['MetaData']
+        metadata['MMSI'] = metadata['MMSI'] // 1000000 * 1000000 + i
+        metadata['ShipName'] = rng.choice(['', '   ', hostile_text(rng, rng.randrange(1, 20))])
+        report = data['Message']['PositionReport']
+        report['TrueHeading'] = rng.choice([report['TrueHeading'], None, 511])
+        report['Sog'] = rng.choice([report['Sog'], None])
+        yield data
+
+
+def test_converted_reports_match_the_original_create_cot_from_ais():
+    converter = AISToCoTConverter('127.0.0.1', 9, 'udp')
+    converter.clock.now = lambda: (TIME, STALE)
+    count = 0
+    for data in position_reports(2000):
+        event = converter.convert_frame(json.dumps(data))
+        assert event.data == legacy_create_cot_from_ais(data, TIME, STALE), data['MetaData']
+        count += 1
+    assert count > 1500
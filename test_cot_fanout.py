@@ -0,0 +1,108 @@
+"""FanOut: per-destination type and bbox filters, shared encoding and invalid destination settings"""
+import asyncio
+
+import pytest
+
+from cot_encoder import CoTEvent
+from cot_fanout import Destination, FanOut
+from tak_proto import unframe
+
+CARGO, FISHING, MILITARY = 'a-f-G-E-V-C', 'a-f-G-E-V-F', 'a-n-G-U-C-F'
+
+
+def event(uid: str = 'AIS.1', cot_type: str = CARGO, lat=50.0, lon=4.0) -> CoTEvent:
+    return CoTEvent(uid, cot_type, lat, lon, b'<event uid="%s" />' % uid.encode(), b'tak ' + uid.encode())
+
+
+def queued(destination: Destination) -> list:
+    buffer = destination.transport.buffer
+    return [buffer.get_nowait() for _ in range(len(buffer))]
+
+
+def test_include_types_take_precedence_over_exclude_types():
+    destination = Destination('127.0.0.1', 9, include_types=[MILITARY], exclude_types=[MILITARY])
+    assert destination.accepts(event(cot_type=MILITARY))
+    assert not destination.accepts(event(cot_type=CARGO))
+    destination = Destination('127.0.0.1', 9, exclude_types=[FISHING])
+    assert destination.accepts(event(cot_type=CARGO))
+    assert not destination.accepts(event(cot_type=FISHING))
+
+
+@pytest.mark.parametrize('lat, lon, accepted', [
+    (50.0, 4.0, True),
+    (49.0, 2.0, True),     # Corners are inside
+    (51.0, 6.0, True),
+    (48.99, 4.0, False),
+    (50.0, 6.01, False),
+    (None, 4.0, False),    # No position never matches a bbox
+    (50.0, None, False),
+])
+def test_bbox_is_inclusive_and_needs_a_position(lat, lon, accepted):
+    assert Destination('127.0.0.1', 9, bbox=(49.0, 2.0, 51.0, 6.0)).accepts(event(lat=lat, lon=lon)) == accepted
+
+
+@pytest.mark.parametrize('lon, accepted', [(175.0, True), (180.0, True), (-180.0, True), (-175.0, True),
+                                           (0.0, False), (169.9, False), (-169.9, False)])
+def test_bbox_across_the_antimeridian(lon, accepted):
+    assert Destination('127.0.0.1', 9, bbox=(-20.0, 170.0, 20.0, -170.0)).accepts(event(lat=0.0, lon=lon)) == accepted
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'bbox': (51.0, 2.0, 49.0, 6.0)},       # min_lat above max_lat
+    {'bbox': (-91.0, 2.0, 49.0, 6.0)},
+    {'bbox': (49.0, 2.0, 51.0, 181.0)},
+    {'encoding': 'json'},
+    {'protocol': 'server', 'encoding': 'protobuf'},
+    {'protocol': 'server', 'overflow': 'block'},
+    {'protocol': 'server', 'priorities': [{'name': 'military', 'types': [MILITARY]}]},
+])
+def test_invalid_destination_settings_raise(kwargs):
+    with pytest.raises(ValueError):
+        Destination('127.0.0.1', 0, **kwargs)
+
+
+def test_fanout_needs_a_destination_and_only_one_may_block():
+    with pytest.raises(ValueError):
+        FanOut([])
+    with pytest.raises(ValueError):
+        FanOut([Destination('127.0.0.1', 9, overflow='block'), Destination('127.0.0.1', 10)])
+
+
+def test_each_event_goes_to_every_destination_that_accepts_it():
+    everything = Destination('127.0.0.1', 9, coalesce=False)
+    military = Destination('127.0.0.1', 10, include_types=[MILITARY], coalesce=False)
+    north_sea = Destination('127.0.0.1', 11, bbox=(51.0, -4.0, 61.0, 9.0), coalesce=False)
+    fanout = FanOut([everything, military, north_sea])
+    events = [event('AIS.1', CARGO, 50.0, 4.0), event('AIS.2', MILITARY, 55.0, 3.0), event('AIS.3', FISHING, 56.0, 5.0)]
+    for e in events:
+        fanout.send_nowait(e)
+
+    sent = [queued(d) for d in fanout.destinations]
+    assert sent == [[e.data for e in events], [events[1].data], [events[1].data, events[2].data]]
+    assert sent[0][1] is sent[1][0] is sent[2][0]  # Encoded once, shared by every destination
+    assert [d.filtered for d in fanout.destinations] == [0, 2, 1]
+    assert fanout.encodings == {'xml'}
+
+
+@pytest.mark.parametrize('protocol, framing', [('tcp', 'stream'), ('udp', 'mesh')])
+def test_protobuf_destination_gets_the_framed_tak_message(protocol, framing):
+    xml = Destination('127.0.0.1', 9, coalesce=False)
+    tak = Destination('127.0.0.1', 10, protocol, encoding='protobuf', coalesce=False)
+    fanout = FanOut([xml, tak])
+    fanout.send_nowait(event())
+    assert fanout.encodings == {'xml', 'protobuf'}
+    assert queued(xml) == [event().data]
+    assert [unframe(data, framing) for data in queued(tak)] == [event().tak]
+
+
+def test_send_applies_the_filter_of_a_single_destination():
+    destination = Destination('127.0.0.1', 9, exclude_types=[FISHING], overflow='block', coalesce=False)
+    fanout = FanOut([destination])
+
+    async def send():
+        await fanout.send(event('AIS.1', FISHING))
+        await fanout.send(event('AIS.2', CARGO))
+
+    asyncio.run(send())
+    assert queued(destination) == [event('AIS.2').data]
+    assert destination.filtered == 1
@@ -0,0 +1,114 @@
+"""PriorityBuffer: shedding order, rate budgets, reclassification and config checks"""
+import pytest
+
+from cot_priority import PriorityBuffer
+
+CLASSES = [
+    {'name': 'military', 'types': ['a-n-G-U-C-F'], 'priority': 0},
+    {'name': 'cargo', 'types': ['a-n-G-E-V-C-U'], 'priority': 2},
+]
+MILITARY, CARGO, OTHER = 'a-n-G-U-C-F', 'a-n-G-E-V-C-U', 'a-f-G-E-V'
+
+
+def drain(buffer: PriorityBuffer) -> list:
+    events = []
+    while len(buffer):
+        events.append(buffer.get_nowait())
+    return events
+
+
+def test_default_class_is_added_below_the_others():
+    buffer = PriorityBuffer(CLASSES)
+    assert [c.name for c in buffer.classes] == ['military', 'cargo', 'other']
+    assert buffer.default.priority == 3
+    assert buffer.class_of(OTHER) is buffer.default
+    assert buffer.class_of(MILITARY).name == 'military'
+
+
+def test_events_leave_in_priority_order():
+    buffer = PriorityBuffer(CLASSES)
+    buffer.put(b'o1', 'o1', OTHER)
+    buffer.put(b'c1', 'c1', CARGO)
+    buffer.put(b'm1', 'm1', MILITARY)
+    buffer.put(b'c2', 'c2', CARGO)
+    assert drain(buffer) == [b'm1', b'c1', b'c2', b'o1']
+    with pytest.raises(IndexError):
+        buffer.get_nowait()
+
+
+def test_full_buffer_sheds_the_oldest_event_of_the_least_important_class():
+    buffer = PriorityBuffer(CLASSES, maxsize=4)
+    for event in (b'c1', b'o1', b'o2', b'm1'):
+        buffer.put(event, event.decode(), {b'c': CARGO, b'o': OTHER, b'm': MILITARY}[event[:1]])
+    assert buffer.put(b'm2', 'm2', MILITARY)
+    assert buffer.put(b'c2', 'c2', CARGO)
+    assert buffer.default.dropped == 2 and buffer.dropped == 2
+    assert drain(buffer) == [b'm1', b'm2', b'c1', b'c2']
+
+
+def test_incoming_event_below_every_waiting_class_is_dropped():
+    buffer = PriorityBuffer(CLASSES, maxsize=2)
+    buffer.put(b'm1', 'm1', MILITARY)
+    buffer.put(b'c1', 'c1', CARGO)
+    assert not buffer.put(b'o1', 'o1', OTHER)
+    assert buffer.default.dropped == 1
+    assert drain(buffer) == [b'm1', b'c1']
+
+
+@pytest.mark.parametrize('overflow, kept', [('drop-oldest', [b'c2', b'c3']), ('drop-newest', [b'c1', b'c2'])])
+def test_overflow_policy_within_the_class_being_shed(overflow, kept):
+    buffer = PriorityBuffer(CLASSES, maxsize=2, overflow=overflow)
+    results = [buffer.put(event, event.decode(), CARGO) for event in (b'c1', b'c2', b'c3')]
+    assert results == [True, True, overflow == 'drop-oldest']
+    assert buffer.class_of(CARGO).dropped == 1
+    assert drain(buffer) == kept
+
+
+def test_class_over_its_budget_waits_for_classes_within_budget():
+    buffer = PriorityBuffer([{'name': 'military', 'types': [MILITARY], 'priority': 0, 'rate': 1e-6, 'burst': 1},
+                             {'name': 'cargo', 'types': [CARGO], 'priority': 1}])
+    for i in range(3):
+        buffer.put(b'm%d' % i, f"m{i}", MILITARY)
+    buffer.put(b'c0', 'c0', CARGO)
+    # One military event within its burst, then cargo, then the rest of military because nothing else waits
+    assert drain(buffer) == [b'm0', b'c0', b'm1', b'm2']
+    military = buffer.classes[0]
+    assert (military.sent, military.over_budget) == (3, 2)
+
+
+def test_newer_event_replaces_the_pending_one_for_its_track():
+    buffer = PriorityBuffer(CLASSES)
+    buffer.put(b'c1', 'vessel', CARGO)
+    buffer.put(b'c2', 'vessel', CARGO)
+    assert buffer.coalesced == 1
+    assert drain(buffer) == [b'c2']
+
+
+def test_reclassified_track_moves_its_pending_event_to_the_new_class():
+    buffer = PriorityBuffer(CLASSES)
+    buffer.put(b'o1', 'vessel', OTHER)
+    buffer.put(b'c1', 'other-vessel', CARGO)
+    assert buffer.put(b'm1', 'vessel', MILITARY)
+    assert buffer._owner['vessel'] is buffer.class_of(MILITARY)
+    assert buffer.default.coalesced == 1 and not buffer.default.pending
+    assert len(buffer) == 2
+    assert drain(buffer) == [b'm1', b'c1']
+    assert not buffer._owner
+
+
+def test_without_coalescing_every_event_is_queued():
+    buffer = PriorityBuffer(CLASSES, coalesce=False)
+    buffer.put(b'c1', 'vessel', CARGO)
+    buffer.put(b'c2', 'vessel', CARGO)
+    assert drain(buffer) == [b'c1', b'c2']
+
+
+@pytest.mark.parametrize('classes, overflow', [
+    (CLASSES, 'block'),
+    ([{'name': 'a'}, {'name': 'b', 'priority': 1}], 'drop-oldest'),
+    ([{'name': 'a', 'types': [CARGO]}, {'name': 'b', 'types': [CARGO]}], 'drop-oldest'),
+    ([{'name': 'a', 'types': [CARGO], 'rate': 0}], 'drop-oldest'),
+])
+def test_invalid_configs_raise(classes, overflow):
+    with pytest.raises(ValueError):
+        PriorityBuffer(classes, overflow=overflow)
@@ -0,0 +1,159 @@
+"""CoalescingBuffer: latest-wins per uid, overflow policies, and a burst into a slow TCP sink"""
+import asyncio
+import time
+
+import pytest
+
+from cot_transport import CoalescingBuffer, CoTTransport
+
+
+def drain(buffer) -> list:
+    events = []
+    while len(buffer):
+        events.append(buffer.get_nowait())
+    return events
+
+
+def test_newer_event_replaces_pending_one_in_place():
+    buffer = CoalescingBuffer()
+    buffer.put(b'a1', 'AIS.1')
+    buffer.put(b'b1', 'ADSB.abc')
+    buffer.put(b'a2', 'AIS.1')
+    assert drain(buffer) == [b'a2', b'b1']
+    assert buffer.coalesced == 1
+    assert buffer.dropped == 0
+
+
+def test_events_without_a_key_are_never_coalesced():
+    buffer = CoalescingBuffer()
+    buffer.put(b'x')
+    buffer.put(b'x')
+    assert drain(buffer) == [b'x', b'x']
+    assert buffer.coalesced == 0
+
+
+def test_drop_oldest_makes_room_when_full():
+    buffer = CoalescingBuffer(maxsize=2)
+    for uid in ('AIS.1', 'AIS.2', 'AIS.3'):
+        assert buffer.put(uid.encode(), uid)
+    assert drain(buffer) == [b'AIS.2', b'AIS.3']
+    assert buffer.dropped == 1
+
+
+def test_drop_newest_refuses_new_tracks_but_still_coalesces():
+    buffer = CoalescingBuffer(maxsize=2, overflow='drop-newest')
+    buffer.put(b'1', 'AIS.1')
+    buffer.put(b'2', 'AIS.2')
+    assert not buffer.put(b'3', 'AIS.3')
+    assert buffer.put(b'1b', 'AIS.1')
+    assert drain(buffer) == [b'1b', b'2']
+    assert buffer.dropped == 1
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        CoalescingBuffer(overflow='drop-everything')
+
+
+async def burst(fleet_size: int, events: int, sink_rate: float):
+    """Offer a burst far faster than a TCP sink reads it; returns the buffer, peak depth, last seq per uid sent and received"""
+    received = {}
+
+    async def handle(reader, writer):
+        interval = 1.0 / sink_rate
+        next_read = time.perf_counter()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            uid, seq = line.split()
+            received[uid] = int(seq)
+            next_read += interval
+            await asyncio.sleep(max(0.0, next_read - time.perf_counter()))
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    buffer = CoalescingBuffer(maxsize=fleet_size * 2)
+    transport = CoTTransport('127.0.0.1', server.sockets[0].getsockname()[1], 'tcp', buffer)
+    transport.start()
+    while not transport.connected:
+        await asyncio.sleep(0.01)
+
+    latest = {}
+    peak_depth = 0
+    for seq in range(events):
+        uid = b'AIS.%d' % (200000000 + seq % fleet_size)
+        latest[uid] = seq
+        transport.send_nowait(b'%s %d' % (uid, seq), uid)
+        peak_depth = max(peak_depth, transport.queue_depth)
+        if seq % 1000 == 0:
+            await asyncio.sleep(0)
+
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline and (transport.queue_depth or received != latest):
+        await asyncio.sleep(0.05)
+    await transport.close()
+    server.close()
+    return buffer, peak_depth, latest, received
+
+
+def test_burst_above_drain_rate_keeps_one_event_per_track():
+    fleet_size, events = 200, 20000
+    buffer, peak_depth, latest, received = asyncio.run(burst(fleet_size, events, sink_rate=2000))
+    assert peak_depth <= fleet_size
+    assert buffer.dropped == 0
+    assert buffer.coalesced > events / 2
+    assert received == latest
+
+
+class Receiver(asyncio.DatagramProtocol):
+    def __init__(self, received: list):
+        self.received = received
+
+    def datagram_received(self, data, address):
+        self.received.append(data)
+
+
+async def first_attempt_fails(protocol: str):
+    """Send through a transport whose first connection attempt fails; returns it and what arrived"""
+    loop = asyncio.get_event_loop()
+    received = []
+    if protocol == 'udp':
+        sink, _ = await loop.create_datagram_endpoint(lambda: Receiver(received), local_addr=('127.0.0.1', 0))
+        port = sink.get_extra_info('sockname')[1]
+    else:
+        async def handle(reader, writer):
+            while line := await reader.readline():
+                received.append(line.rstrip())
+
+        sink = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = sink.sockets[0].getsockname()[1]
+
+    attempts = []
+    open_endpoint = loop.create_datagram_endpoint if protocol == 'udp' else loop.create_connection
+
+    async def failing_once(*args, **kwargs):
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise OSError("Network is unreachable")
+        return await open_endpoint(*args, **kwargs)
+
+    setattr(loop, open_endpoint.__name__, failing_once)
+    transport = CoTTransport('127.0.0.1', port, protocol, reconnect_delay=0.05)
+    transport.start()
+    for i in range(3):
+        transport.send_nowait(b'event %d' % i)
+    deadline = time.perf_counter() + 5
+    while len(received) < 3 and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    await transport.close()
+    sink.close()
+    return transport, attempts, received
+
+
+@pytest.mark.parametrize('protocol', ['udp', 'tcp'])
+def test_destination_that_cannot_be_opened_at_first_is_retried(protocol):
+    transport, attempts, received = asyncio.run(first_attempt_fails(protocol))
+    assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.05
+    assert received == [b'event 0', b'event 1', b'event 2']
+    assert transport.sent == 3 and transport.lost == 0
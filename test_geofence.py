@@ -0,0 +1,122 @@
+"""GeofenceIndex: box and polygon containment edge cases, agreement with a linear scan, subscription boxes"""
+import os
+import random
+
+import pytest
+
+from geofence import Box, GeofenceIndex, Polygon, parse_area
+
+AREAS_FILE = os.path.join(os.path.dirname(__file__), 'areas.example.json')
+# A U shape opening north: the notch between the arms is outside
+U_SHAPE = [(0, 0), (0, 3), (3, 3), (3, 2), (1, 2), (1, 1), (3, 1), (3, 0)]
+
+
+def linear_scan(areas, lat, lon) -> bool:
+    return any(area.contains(lat, lon) for area in areas)
+
+
+@pytest.mark.parametrize('lat, lon, inside', [
+    (50.0, 0.0, True),
+    (49.0, -6.0, True),   # Edges and corners of a box are inside
+    (51.5, 2.0, True),
+    (51.5, -6.0, True),
+    (51.500001, 0.0, False),
+    (50.0, 2.000001, False),
+    (None, 0.0, False),
+    (50.0, None, False),
+])
+def test_box_edges_are_inside(lat, lon, inside):
+    index = GeofenceIndex([Box(49.0, -6.0, 51.5, 2.0)], cell_size=0.5)
+    assert index.contains(lat, lon) == inside
+
+
+def test_box_reaching_the_pole_and_the_antimeridian():
+    index = GeofenceIndex([Box(80.0, 170.0, 90.0, 180.0)], cell_size=1.0)
+    assert index.contains(90.0, 180.0)
+    assert index.contains(80.0, 170.0)
+    assert not index.contains(79.9, 175.0)
+
+
+@pytest.mark.parametrize('lat, lon', [(91.0, 181.0), (91.0, 0.0), (0.0, 181.0), (-90.5, -179.5), (-89.5, -180.5)])
+def test_out_of_range_positions_are_outside(lat, lon):
+    # Truncating or overflowing cell numbers would otherwise land these in a cell of the boxes
+    index = GeofenceIndex([Box(-90.0, -180.0, -80.0, -170.0), Box(80.0, 170.0, 90.0, 180.0),
+                           Box(-10.0, -180.0, 10.0, -179.0)], cell_size=0.05)
+    assert not index.contains(lat, lon)
+
+
+def test_box_across_the_antimeridian_is_split():
+    areas = parse_area({'box': [63.0, 165.0, 67.5, -165.0], 'name': 'Bering Strait'})
+    assert [area.bounds for area in areas] == [(63.0, 165.0, 67.5, 180), (63.0, -180, 67.5, -165.0)]
+    index = GeofenceIndex(areas)
+    assert index.contains(65.0, 179.9) and index.contains(65.0, -179.9) and index.contains(65.0, 180.0)
+    assert not index.contains(65.0, 0.0) and not index.contains(65.0, -164.9)
+
+
+@pytest.mark.parametrize('lat, lon, inside', [
+    (0.5, 1.5, True),      # Base of the U
+    (2.0, 0.5, True),      # Left arm
+    (2.0, 2.5, True),      # Right arm
+    (2.0, 1.5, False),     # The notch
+    (3.5, 1.5, False),
+    (-0.5, 1.5, False),
+])
+def test_concave_polygon(lat, lon, inside):
+    polygon = Polygon(U_SHAPE)
+    assert polygon.contains(lat, lon) == inside
+    for cell_size in (0.05, 0.3, 1.0, 5.0):
+        assert GeofenceIndex([polygon], cell_size).contains(lat, lon) == inside
+
+
+def test_closed_ring_drops_the_repeated_vertex():
+    assert Polygon(U_SHAPE + U_SHAPE[:1]).points == Polygon(U_SHAPE).points
+
+
+@pytest.mark.parametrize('area', [
+    {'polygon': [[0, 0], [1, 1]]},
+    {'polygon': [[0, 0], [1, 1], [0, 0]]},
+    {'polygon': [[0, 0], [91, 1], [1, 0]]},
+    {'box': [51.5, -6.0, 49.0, 2.0]},
+    {'box': [49.0, -181.0, 51.5, 2.0]},
+    {'circle': [50.0, 0.0, 10.0]},
+])
+def test_invalid_areas_raise(area):
+    with pytest.raises(ValueError):
+        parse_area(area)
+
+
+def test_index_needs_an_area():
+    with pytest.raises(ValueError):
+        GeofenceIndex([])
+
+
+@pytest.mark.parametrize('cell_size', [None, 0.05, 0.25, 1.0])
+def test_index_agrees_with_a_linear_scan(cell_size):
+    rng = random.Random(4)
+    areas = GeofenceIndex.from_file(AREAS_FILE).areas + [Polygon(U_SHAPE)]
+    for _ in range(30):
+        lat, lon = rng.uniform(-60, 60), rng.uniform(-170, 170)
+        areas.append(Polygon([(lat + rng.uniform(-2, 2), lon + rng.uniform(-2, 2)) for _ in range(rng.randrange(3, 9))]))
+        areas.append(Box(lat, lon, lat + rng.uniform(0, 3), lon + rng.uniform(0, 3)))
+    index = GeofenceIndex(areas, cell_size)
+    # Random points near the areas, plus every vertex and corner, which sit on edges and often on cell lines
+    points = [(lat + rng.uniform(-3, 3), lon + rng.uniform(-3, 3))
+              for area in areas for lat, lon in ([area.bounds[:2]] * 20)]
+    points += [point for area in areas if isinstance(area, Polygon) for point in area.points]
+    points += [(area.min_lat, area.min_lon) for area in areas if isinstance(area, Box)]
+    size = index.cell_size
+    points += [(round(lat / size) * size, round(lon / size) * size) for lat, lon in points[:500]]
+    mismatches = [(lat, lon) for lat, lon in points if index.contains(lat, lon) != linear_scan(areas, lat, lon)]
+    assert not mismatches
+    assert sum(index.contains(lat, lon) for lat, lon in points) > len(points) // 10
+
+
+def test_subscription_boxes_cover_every_area():
+    index = GeofenceIndex.from_file(AREAS_FILE)
+    for max_boxes in (50, 2, 1):
+        boxes = index.subscription_boxes(max_boxes)
+        assert 0 < len(boxes) <= max_boxes
+        for min_lat, min_lon, max_lat, max_lon in (area.bounds for area in index.areas):
+            assert any(box_min_lat <= min_lat and max_lat <= box_max_lat
+                       and box_min_lon <= min_lon and max_lon <= box_max_lon
+                       for (box_min_lat, box_min_lon), (box_max_lat, box_max_lon) in boxes)
@@ -0,0 +1,65 @@
+"""TAK Protocol v1: every field of the protobuf encoding matches the XML event, framing round-trips"""
+import datetime
+
+import pytest
+
+from adsb_to_cot import ADSBToCoTConverter
+from ais_to_cot import AISToCoTConverter
+from cot_encoder import CoTClock, CoTTemplate
+from reference import SAMPLES, check
+from synthetic_adsb import synthetic_states
+from synthetic_ais import generate_frames
+from tak_proto import TakProtoTemplate, decode_message, frame, parse_fields, unframe, varint
+
+
+@pytest.mark.parametrize('sample', SAMPLES)
+def test_encoder_samples_match_xml(sample):
+    time_str, stale_str = CoTClock(datetime.timedelta(hours=1)).now()
+    cot_type, uid, lat, lon, course, speed, callsign, remarks = sample
+    fields = (cot_type, uid, time_str, stale_str, lat, lon, '0', course, speed, callsign, remarks)
+    check(CoTTemplate().encode(*fields), TakProtoTemplate().encode(*fields))
+
+
+def test_ais_events_match_xml():
+    converter = AISToCoTConverter('127.0.0.1', 0, encodings={'xml', 'protobuf'})
+    events = [event for event in map(converter.convert_frame, generate_frames(2000, fleet_size=200)) if event]
+    assert events
+    for event in events:
+        check(event.data, event.tak)
+
+
+@pytest.mark.parametrize('protocol, framing', [('tcp', 'stream'), ('udp', 'mesh')])
+def test_adsb_events_match_xml(protocol, framing):
+    states = synthetic_states(500)
+    xml = dict(ADSBToCoTConverter('127.0.0.1', 0, 'tcp').convert_states(states, 0)[0])
+    tak = dict(ADSBToCoTConverter('127.0.0.1', 0, protocol, encoding='protobuf').convert_states(states, 0)[0])
+    assert tak.keys() == xml.keys()
+    for uid, data in tak.items():
+        check(xml[uid], data, framing, same_tick=False)
+
+
+@pytest.mark.parametrize('framing', ['stream', 'mesh'])
+def test_framing_round_trips(framing):
+    payload = TakProtoTemplate().encode('a-f-G-E-V', 'AIS.1', '2024-01-01T00:00:00Z', '2024-01-01T00:05:00Z',
+                                        '1.5', '2.5', '0', '90', '5', 'TEST', 'x' * 300)
+    assert unframe(frame(payload, framing), framing) == payload
+    assert decode_message(frame(payload, framing), framing)['lat'] == 1.5
+
+
+@pytest.mark.parametrize('data, framing', [
+    (b'\xbf\x05abc', 'stream'),      # Length does not match
+    (b'<event/>', 'stream'),         # XML, not protobuf
+    (b'\xbf\x02\xbfabc', 'mesh'),    # Wrong protocol version
+])
+def test_bad_framing_raises(data, framing):
+    with pytest.raises(ValueError):
+        unframe(data, framing)
+
+
+def test_varint_and_truncated_messages():
+    assert [varint(value) for value in (0, 1, 127, 128, 300)] == [b'\x00', b'\x01', b'\x7f', b'\x80\x01', b'\xac\x02']
+    assert parse_fields(b'\x08\xac\x02\x12\x01x') == {1: [300], 2: [b'x']}
+    with pytest.raises(ValueError):
+        parse_fields(b'\x12\x05abc')
+    with pytest.raises(ValueError):
+        parse_fields(b'\x08\x80')
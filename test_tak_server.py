@@ -0,0 +1,151 @@
+"""TAKServer: snapshot on connect, track expiry and both slow client policies"""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from tak_server import TAKServer
+
+PADDING = b' ' + b'x' * 1000  # Roughly the size of a real CoT event
+
+
+def event(uid: str, seq: int) -> bytes:
+    return b'<event uid="%s" seq="%d" />' % (uid.encode(), seq) + PADDING
+
+
+def parse(line: bytes):
+    uid, seq = line.split(b'"')[1:4:2]
+    return uid.decode(), int(seq)
+
+
+async def connect(port: int, receive_buffer: int = None):
+    """A TAK client connection; a small receive_buffer makes a client that stops reading back up quickly"""
+    sock = socket.socket()
+    if receive_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.setblocking(False)
+    await asyncio.get_event_loop().sock_connect(sock, ('127.0.0.1', port))
+    return await asyncio.open_connection(sock=sock)
+
+
+async def read_until(reader, expected: dict, timeout: float = 10) -> dict:
+    """Read events until the latest seq per uid equals expected; returns every (uid, seq) in arrival order"""
+    latest = {}
+    received = []
+    buffered = b''
+    deadline = time.monotonic() + timeout
+    while latest != expected:
+        chunk = await asyncio.wait_for(reader.read(65536), max(0.01, deadline - time.monotonic()))
+        assert chunk, "server closed the connection"
+        *lines, buffered = (buffered + chunk).split(b'\n')
+        for line in lines:
+            uid, seq = parse(line)
+            latest[uid] = seq
+            received.append((uid, seq))
+    return received
+
+
+async def start(**kwargs) -> TAKServer:
+    server = TAKServer('127.0.0.1', 0, **kwargs)
+    await server.listen()
+    return server
+
+
+async def wait_for_clients(server: TAKServer, count: int):
+    while len(server.clients) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_unknown_slow_client_policy_is_rejected():
+    with pytest.raises(ValueError):
+        TAKServer(slow_clients='ignore')
+
+
+def test_snapshot_keeps_the_latest_event_per_track_oldest_first():
+    server = TAKServer(max_tracks=3)
+    for seq, uid in enumerate(['a', 'b', 'a', 'c', 'd']):
+        server.send_nowait(event(uid, seq), uid)
+    assert [parse(line) for line in server.snapshot()] == [('a', 2), ('c', 3), ('d', 4)]
+
+
+def test_snapshot_leaves_out_tracks_older_than_max_age():
+    server = TAKServer(max_age=0.05)
+    server.send_nowait(event('old', 0), 'old')
+    time.sleep(0.1)
+    server.send_nowait(event('new', 1), 'new')
+    assert [parse(line) for line in server.snapshot()] == [('new', 1)]
+
+
+async def snapshot_then_live():
+    server = await start()
+    for seq in range(30):
+        server.send_nowait(event(f"T{seq % 10}", seq), f"T{seq % 10}")
+    reader, writer = await connect(server.port)
+    snapshot = await read_until(reader, {f"T{i}": 20 + i for i in range(10)})
+    server.send_nowait(event('T3', 30), 'T3')
+    live = await read_until(reader, {'T3': 30})
+    writer.close()
+    await server.close()
+    return server, snapshot, live
+
+
+def test_client_gets_a_snapshot_of_current_tracks_then_live_updates():
+    server, snapshot, live = asyncio.run(snapshot_then_live())
+    assert snapshot == [(f"T{i}", 20 + i) for i in range(10)]
+    assert live == [('T3', 30)]
+    assert server.snapshot_events == 10
+
+
+async def slow_client(slow_clients: str, client_queue: int, tracks: int, updates: int):
+    """One client that stops reading while another keeps up
+
+    Returns the server, the stalled client's buffer and its peak depth, the
+    events both clients received (None if the stalled one was disconnected)
+    and the latest seq per uid.
+    """
+    server = await start(slow_clients=slow_clients, client_queue=client_queue, send_buffer=4096)
+    stalled_reader, stalled_writer = await connect(server.port, receive_buffer=4096)
+    reader, writer = await connect(server.port)
+    await wait_for_clients(server, 2)
+    stalled_buffer = next(client.buffer for client in server.clients
+                          if client.peer == stalled_writer.get_extra_info('sockname'))
+    expected = {f"T{seq % tracks}": seq for seq in range(updates)}
+    reading = asyncio.ensure_future(read_until(reader, expected))
+    peak_depth = 0
+    for seq in range(updates):
+        uid = f"T{seq % tracks}"
+        server.send_nowait(event(uid, seq), uid)
+        peak_depth = max(peak_depth, len(stalled_buffer))
+        if seq % 10 == 0:
+            await asyncio.sleep(0.001)
+    reading = await reading
+    try:
+        stalled = await read_until(stalled_reader, expected, timeout=5)
+    except AssertionError:
+        stalled = None  # Disconnected
+    for w in (stalled_writer, writer):
+        w.close()
+    await server.close()
+    return server, stalled_buffer, peak_depth, reading, stalled, expected
+
+
+def test_coalesce_policy_keeps_one_pending_event_per_track_for_a_stalled_client():
+    tracks = 20
+    server, stalled_buffer, peak_depth, reading, stalled, expected = asyncio.run(
+        slow_client('coalesce', client_queue=1000, tracks=tracks, updates=5000))
+    assert 0 < peak_depth <= tracks
+    assert stalled_buffer.coalesced > 0
+    assert server.disconnected_slow == 0
+    assert server.dropped == 0
+    assert stalled is not None and dict(stalled) == expected
+    assert dict(reading) == expected
+
+
+def test_disconnect_policy_drops_a_client_that_lets_its_queue_fill():
+    server, stalled_buffer, _, reading, stalled, _ = asyncio.run(
+        slow_client('disconnect', client_queue=50, tracks=5000, updates=5000))
+    assert server.disconnected_slow == 1
+    assert stalled_buffer.dropped > 0
+    assert stalled is None
+    assert [seq for _, seq in reading] == list(range(5000))
@@ -0,0 +1,122 @@
+"""Warm-start snapshots: round trips, stale and corrupt snapshots, and the GC pause around a restore"""
+import gc
+import os
+import sqlite3
+
+import pytest
+
+from adsb_to_cot import ADSBToCoTConverter
+from ais_to_cot import AISToCoTConverter
+from aircraft_registry import AircraftRegistry
+from synthetic_ais import generate_frames
+from track_snapshot import (AIRCRAFT_COLUMNS, VESSEL_COLUMNS, gc_paused, load_snapshot, save_snapshot,
+                            snapshot_columns, write_snapshot)
+from vessel_registry import VesselRegistry
+
+NOW = 1700000000.0
+
+
+def vessels(count: int = 300) -> VesselRegistry:
+    converter = AISToCoTConverter('127.0.0.1', 9, 'udp', coalesce=False)
+    for frame in generate_frames(count * 3, fleet_size=count):
+        converter.convert_frame(frame)
+    for vessel in converter.vessels.records():
+        vessel.last_seen = NOW - vessel.mmsi % 100
+        if vessel.sent_time is not None:
+            vessel.sent_time = vessel.last_seen
+    return converter.vessels
+
+
+def aircraft(count: int = 100) -> AircraftRegistry:
+    registry = AircraftRegistry()
+    for i in range(count):
+        record = registry.touch(f"{i:06x}", NOW - i)
+        record.callsign, record.lat, record.lon, record.alt = f"TEST{i}", 50 + i / 100, 4.0, 1000.0 + i
+        record.sent_time, record.sent_lat, record.sent_lon = NOW - i, record.lat, record.lon
+    return registry
+
+
+def rows(registry, columns):
+    return sorted(tuple(getattr(record, column) for column in columns) for record in registry.records())
+
+
+@pytest.mark.parametrize('registry, columns', [(vessels, VESSEL_COLUMNS), (aircraft, AIRCRAFT_COLUMNS)])
+def test_every_record_round_trips(tmp_path, registry, columns):
+    path = str(tmp_path / 'tracks.db')
+    original = registry()
+    assert save_snapshot(path, original) == len(original) > 0
+    restored = type(original)()
+    assert load_snapshot(path, restored, NOW) == len(original)
+    assert rows(restored, columns) == rows(original, columns)
+    assert os.listdir(tmp_path) == ['tracks.db']  # No temporary file left behind
+
+
+def test_empty_registry_round_trips(tmp_path):
+    path = str(tmp_path / 'tracks.db')
+    write_snapshot(path, snapshot_columns(VesselRegistry()))
+    restored = VesselRegistry()
+    assert load_snapshot(path, restored, NOW) == 0
+    assert len(restored) == 0
+
+
+def test_records_past_max_age_are_not_restored(tmp_path):
+    path = str(tmp_path / 'tracks.db')
+    original = vessels()
+    save_snapshot(path, original)
+    restored = VesselRegistry(max_age=50)
+    kept = load_snapshot(path, restored, NOW)
+    assert kept == sum(vessel.last_seen >= NOW - 50 for vessel in original.records()) > 0
+    assert all(vessel.last_seen >= NOW - 50 for vessel in restored.records())
+    assert load_snapshot(path, VesselRegistry(max_age=60), NOW + 3600) == 0
+
+
+def test_restart_resends_only_tracks_within_their_stale_time(tmp_path):
+    path = str(tmp_path / 'ais.db')
+    save_snapshot(path, vessels())
+    converter = AISToCoTConverter('127.0.0.1', 9, 'udp', snapshot_path=path)
+    stale_after = converter.clock.stale_after.total_seconds()
+    events = converter.restore_snapshot(NOW + stale_after - 50)
+    expected = {f"AIS.{vessel.mmsi}" for vessel in converter.vessels.records()
+                if vessel.sent_time is not None and vessel.sent_time > NOW - 50}
+    assert {event.uid for event in events} == expected
+    assert expected and len(expected) < len(converter.vessels)
+
+
+@pytest.mark.parametrize('contents', [b'not a snapshot', b''])
+def test_corrupt_snapshot_is_ignored(tmp_path, contents):
+    path = tmp_path / 'adsb.db'
+    path.write_bytes(contents)
+    converter = ADSBToCoTConverter('127.0.0.1', 9, 'udp', snapshot_path=str(path))
+    assert converter.restore_snapshot(NOW) == []
+    assert len(converter.aircraft) == 0
+
+
+def test_snapshot_of_another_version_or_registry_is_ignored(tmp_path):
+    path = str(tmp_path / 'tracks.db')
+    save_snapshot(path, vessels())
+    assert load_snapshot(path, AircraftRegistry(), NOW) == 0  # No aircraft table
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA user_version = 1')
+    connection.commit()
+    connection.close()
+    assert load_snapshot(path, VesselRegistry(), NOW) == 0
+
+
+def test_missing_snapshot_restores_nothing(tmp_path):
+    assert load_snapshot(str(tmp_path / 'missing.db'), VesselRegistry(), NOW) == 0
+
+
+@pytest.mark.parametrize('enabled', [True, False])
+def test_gc_paused_restores_the_collector_and_freezes_nothing(enabled):
+    (gc.enable if enabled else gc.disable)()
+    frozen = gc.get_freeze_count()
+    try:
+        with gc_paused():
+            assert not gc.isenabled()
+            with gc_paused():
+                pass
+            assert not gc.isenabled()
+        assert gc.isenabled() == enabled
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.enable()
@@ -0,0 +1,65 @@
+"""TrackThrottle: dead reckoning, the send triggers and reports without a position"""
+import pytest
+
+from track_throttle import KNOTS_TO_MS, METERS_PER_DEGREE, TrackThrottle
+from vessel_registry import VesselRecord
+
+# Metres of one knot sustained for a minute, in degrees of latitude
+KNOT_MINUTE = KNOTS_TO_MS * 60 / METERS_PER_DEGREE
+
+
+def sent(lat=50.0, lon=4.0, speed=10.0, course=0, at=0.0) -> VesselRecord:
+    """A vessel whose last sent report is the given one"""
+    vessel = VesselRecord(1, at)
+    vessel.sent_time, vessel.sent_lat, vessel.sent_lon, vessel.sent_speed, vessel.sent_course = (
+        at, lat, lon, speed, course)
+    return vessel
+
+
+def test_predict_dead_reckons_from_the_last_sent_report():
+    lat, lon = TrackThrottle().predict(sent(speed=10, course=0), 60)
+    assert lat == pytest.approx(50 + 10 * KNOT_MINUTE) and lon == 4.0
+    lat, lon = TrackThrottle().predict(sent(lat=0, lon=0, speed=10, course=90), 60)
+    assert lat == pytest.approx(0) and lon == pytest.approx(10 * KNOT_MINUTE)
+    assert TrackThrottle().predict(sent(speed=0), 60) == (50.0, 4.0)
+    assert TrackThrottle().predict(sent(course=None), 60) == (50.0, 4.0)
+
+
+def test_report_on_the_predicted_track_is_suppressed():
+    throttle = TrackThrottle()
+    vessel = sent()
+    assert not throttle.should_send(vessel, 50 + 10 * KNOT_MINUTE, 4.0, 10.0, 0, 60)
+    assert vessel.sent_time == 0.0
+    assert (throttle.checked, throttle.sent, throttle.suppression_ratio) == (1, 0, 1.0)
+
+
+@pytest.mark.parametrize('lat, speed, course, now', [
+    (50 + 10 * KNOT_MINUTE + 200 / METERS_PER_DEGREE, 10.0, 0, 60),  # 200 m off the predicted position
+    (50 + 10 * KNOT_MINUTE, 13.0, 0, 60),                              # Speed changed by 3 kn
+    (50 + 10 * KNOT_MINUTE, 10.0, 20, 60),                             # Course changed by 20 degrees
+    (50 + 10 * KNOT_MINUTE, 10.0, None, 60),                           # Heading no longer available
+    (50 + 20 * 10 * KNOT_MINUTE, 10.0, 0, 1200),                       # Heartbeat
+])
+def test_report_is_sent_and_recorded_when_it_adds_information(lat, speed, course, now):
+    throttle = TrackThrottle()
+    vessel = sent()
+    assert throttle.should_send(vessel, lat, 4.0, speed, course, now)
+    assert (vessel.sent_time, vessel.sent_lat, vessel.sent_speed, vessel.sent_course) == (now, lat, speed, course)
+
+
+def test_first_report_is_sent():
+    assert TrackThrottle().should_send(VesselRecord(1, 0.0), 50.0, 4.0, 10.0, 0, 0.0)
+
+
+@pytest.mark.parametrize('speed, course', [(10.0, 0), (0.0, None)])
+def test_position_after_a_report_without_one_is_sent(speed, course):
+    throttle = TrackThrottle()
+    vessel = sent(lat=None, lon=None, speed=speed, course=course)
+    assert throttle.should_send(vessel, 50.0, 4.0, speed, course, 10)
+    assert (vessel.sent_lat, vessel.sent_lon) == (50.0, 4.0)
+
+
+def test_report_without_a_position_is_sent():
+    vessel = sent()
+    assert TrackThrottle().should_send(vessel, None, None, 10.0, 0, 10)
+    assert vessel.sent_lat is None
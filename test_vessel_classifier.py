@@ -0,0 +1,45 @@
+"""VesselClassifier matches the original get_vessel_type on every VESSEL_TYPES category, and applies rules files"""
+import os
+
+import pytest
+
+from ais_to_cot import VESSEL_TYPES
+from reference import legacy_get_vessel_type
+from vessel_classifier import VesselClassifier
+
+SHIP_TYPES = [None, 0, 100, 255] + list(range(1, 100))
+RULES_FILE = os.path.join(os.path.dirname(__file__), 'vessel_rules.example.json')
+MMSIS = [None, 0, '', '33', 338, '338', 2] + [mid * 1000000 + 12345 for mid in range(1000)]
+
+
+@pytest.mark.parametrize('ship_type', SHIP_TYPES)
+def test_matches_legacy_classification_for_every_mid(ship_type):
+    classifier = VesselClassifier()
+    for mmsi in MMSIS:
+        assert classifier.classify(mmsi, ship_type) == legacy_get_vessel_type(mmsi, ship_type), mmsi
+
+
+def test_every_vessel_type_category_is_produced():
+    classifier = VesselClassifier()
+    produced = {classifier.classify(mmsi, ship_type) for mmsi in MMSIS for ship_type in SHIP_TYPES}
+    assert set(VESSEL_TYPES.values()) <= produced
+
+
+def test_cached_result_follows_ship_type_changes():
+    classifier = VesselClassifier()
+    assert classifier.classify(366000001) == 'a-f-G-E-V'
+    assert classifier.classify(366000001, 70) == 'a-f-G-E-V-C'
+    assert classifier.classify(366000001, 80) == 'a-f-G-E-V-T'
+
+
+def test_rules_file_adds_mmsi_overrides():
+    classifier = VesselClassifier.from_file(RULES_FILE)
+    assert classifier.classify(366999712, 70) == 'a-f-G-U-L-E'
+    assert classifier.classify(338000001, 70) == 'a-n-G-U-C-F'
+
+
+def test_denylist_and_allowlist():
+    assert VesselClassifier(deny=[366000001]).classify(366000001, 70) is None
+    allowed = VesselClassifier(allow=[366000001])
+    assert allowed.classify(366000001, 70) == 'a-f-G-E-V-C'
+    assert allowed.classify(366000002, 70) is None
@@ -0,0 +1,231 @@
+"""Warm-start snapshots of vessel and aircraft state in SQLite
+
+A snapshot is one SQLite file with a table per registry and a row per
+column, each holding that column's values for every record as one marshal
+blob. Storing columns rather than a row per record lets a snapshot be read
+back with a handful of loads instead of a fetch and a Python tuple per
+record, which decides how quickly a restart recovers. The file is written
+under a unique temporary name and renamed over the previous snapshot, so a
+crash mid-write leaves the last complete snapshot in place. On startup the
+records are loaded back into the registry, and the converter re-sends the
+tracks whose original stale time has not passed yet.
+
+Copying the columns out of the registry is the only part that has to run on
+the event loop, and SnapshotWriter does it a chunk of records at a time;
+writing them (write_snapshot) runs in its own thread.
+"""
+import asyncio
+import gc
+import marshal
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import compress
+from operator import attrgetter
+from typing import Dict, List, Optional, Sequence
+
+from aircraft_registry import AircraftRecord, AircraftRegistry
+from vessel_registry import VesselRecord, VesselRegistry
+
+# Bumped when the format or columns change incompatibly; snapshots of another version are ignored
+VERSION = 2
+
+# Records copied between yields to the event loop; about 10 ms of copying
+COPY_CHUNK = 10000
+
+VESSEL_COLUMNS = ('mmsi', 'ship_type', 'name', 'length', 'beam', 'last_seen',
+                  'sent_time', 'sent_lat', 'sent_lon', 'sent_speed', 'sent_course')
+AIRCRAFT_COLUMNS = ('icao24', 'callsign', 'lat', 'lon', 'alt', 'speed', 'heading', 'last_seen',
+                    'sent_time', 'sent_lat', 'sent_lon', 'sent_alt', 'sent_heading')
+
+
+# Records are created without __init__ and filled by unpacking a row of the columns into
+# their slots, which is several times faster than constructing them one attribute at a time
+def _vessels(columns: Sequence[list]) -> List[VesselRecord]:
+    new = VesselRecord.__new__
+    vessels = []
+    append = vessels.append
+    for row in zip(*columns):
+        vessel = new(VesselRecord)
+        (vessel.mmsi, vessel.ship_type, vessel.name, vessel.length, vessel.beam, vessel.last_seen,
+         vessel.sent_time, vessel.sent_lat, vessel.sent_lon, vessel.sent_speed, vessel.sent_course) = row
+        vessel.cot_type = None
+        append(vessel)
+    return vessels
+
+
+def _aircraft(columns: Sequence[list]) -> List[AircraftRecord]:
+    new = AircraftRecord.__new__
+    aircraft = []
+    append = aircraft.append
+    for row in zip(*columns):
+        record = new(AircraftRecord)
+        (record.icao24, record.callsign, record.lat, record.lon, record.alt, record.speed,
+         record.heading, record.last_seen, record.sent_time, record.sent_lat, record.sent_lon,
+         record.sent_alt, record.sent_heading) = row
+        append(record)
+    return aircraft
+
+
+# Registry class -> (table, columns, records from columns). The cached vessel classification
+# is left out: it is recomputed with the rules in force after the restart.
+TABLES = {
+    VesselRegistry: ('vessels', VESSEL_COLUMNS, _vessels),
+    AircraftRegistry: ('aircraft', AIRCRAFT_COLUMNS, _aircraft),
+}
+
+Columns = Dict[str, list]
+
+
+def snapshot_columns(registry) -> Dict[str, Columns]:
+    """Copy every record of a registry to {table: {column: values}}"""
+    table, columns, _ = TABLES[type(registry)]
+    records = registry.copy_records()
+    return {table: {column: list(map(attrgetter(column), records)) for column in columns}}
+
+
+async def copy_snapshot(registry, chunk: int = COPY_CHUNK) -> Dict[str, Columns]:
+    """snapshot_columns, yielding to the event loop after every chunk of records
+
+    The records are listed up front, so the registry may change in between;
+    each record's columns are copied together, so none is written half updated.
+    """
+    table, columns, _ = TABLES[type(registry)]
+    records = registry.copy_records()
+    copied = {column: [] for column in columns}
+    getters = [(copied[column], attrgetter(column)) for column in columns]
+    for start in range(0, len(records), chunk):
+        part = records[start:start + chunk]
+        for values, getter in getters:
+            values.extend(map(getter, part))
+        await asyncio.sleep(0)
+    return {table: copied}
+
+
+def write_snapshot(path: str, tables: Dict[str, Columns]):
+    """Write columns from snapshot_columns to path, replacing the previous snapshot atomically"""
+    descriptor, temporary = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                             dir=os.path.dirname(path) or '.')
+    os.close(descriptor)
+    try:
+        connection = sqlite3.connect(temporary)
+        try:
+            # No journal: the file is only renamed into place once it is complete
+            connection.execute('PRAGMA journal_mode = OFF')
+            connection.execute('PRAGMA synchronous = OFF')
+            connection.execute(f'PRAGMA user_version = {VERSION}')
+            for table, columns in tables.items():
+                connection.execute(f'CREATE TABLE {table} (name TEXT PRIMARY KEY, data BLOB)')
+                connection.executemany(f'INSERT INTO {table} VALUES (?, ?)',
+                                       [(name, marshal.dumps(values)) for name, values in columns.items()])
+            connection.commit()
+        finally:
+            connection.close()
+        with open(temporary, 'rb') as written:
+            os.fsync(written.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def save_snapshot(path: str, registry) -> int:
+    """Write a registry's records to path; returns how many were written"""
+    tables = snapshot_columns(registry)
+    write_snapshot(path, tables)
+    return len(registry)
+
+
+def read_snapshot(path: str, table: str, columns: Sequence[str]) -> List[list]:
+    """Values of each of columns in one table, in order
+
+    Raises sqlite3.DatabaseError for a corrupt, foreign or outdated file.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != VERSION:
+            raise sqlite3.DatabaseError(f"snapshot version {version}, expected {VERSION}")
+        stored = dict(connection.execute(f'SELECT name, data FROM {table}').fetchall())
+    finally:
+        connection.close()
+    try:
+        values = [marshal.loads(stored[column]) for column in columns]
+    except (KeyError, TypeError, ValueError, EOFError) as e:
+        raise sqlite3.DatabaseError(f"unreadable {table} columns: {e!r}")
+    if any(not isinstance(column, list) or len(column) != len(values[0]) for column in values):
+        raise sqlite3.DatabaseError(f"{table} columns do not line up")
+    return values
+
+
+@contextmanager
+def gc_paused():
+    """Hold off garbage collection while a restart builds up its state
+
+    Creating a registry's worth of records (and re-encoding their tracks) at
+    once would otherwise set off repeated full collections of the growing heap.
+    Collection is only disabled for the duration and re-enabled after, if it
+    was on; nothing is taken out of the collector's view.
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def load_snapshot(path: str, registry, now: float = None) -> int:
+    """Restore a registry's records from path; returns how many were kept
+
+    A missing snapshot restores nothing; an unreadable one is reported and
+    ignored, so the converter starts cold rather than not at all. Records
+    past the registry's max_age are not rebuilt.
+    """
+    if not os.path.exists(path):
+        return 0
+    if now is None:
+        now = time.time()
+    table, columns, records = TABLES[type(registry)]
+    try:
+        values = read_snapshot(path, table, columns)
+    except sqlite3.DatabaseError as e:
+        print(f"Ignoring snapshot {path}: {e}")
+        return 0
+    cutoff = now - registry.max_age
+    last_seen = values[columns.index('last_seen')]
+    if not all(seen >= cutoff for seen in last_seen):
+        keep = [seen >= cutoff for seen in last_seen]
+        values = [list(compress(column, keep)) for column in values]
+    with gc_paused():
+        return registry.restore(records(values), now)
+
+
+class SnapshotWriter:
+    """Writes a registry's snapshot from the event loop without stalling it
+
+    Rows are copied with copy_snapshot and written by one background thread,
+    so a periodic write and the final one on shutdown never overlap.
+    """
+
+    def __init__(self, path: str, registry):
+        self.path = path
+        self.registry = registry
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+        self._pending: Optional[Future] = None
+
+    async def write(self):
+        """Copy the registry a chunk at a time and write it in the background"""
+        tables = await copy_snapshot(self.registry)
+        self._pending = self._executor.submit(write_snapshot, self.path, tables)
+        await asyncio.wrap_future(self._pending)
+
+    def save(self) -> int:
+        """Write the snapshot now, blocking, once any write in progress has finished"""
+        if self._pending is not None:
+            wait([self._pending])
+        return save_snapshot(self.path, self.registry)
@@ -0,0 +1,90 @@
+import math
+
+# Metres per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 111320.0
+KNOTS_TO_MS = 0.514444
+
+
+class TrackThrottle:
+    """Suppresses track updates that carry no new information
+
+    A report is forwarded only when the reported position is further than
+    `position_error` metres from where dead reckoning from the last sent
+    report (speed and course) puts the track, when course or speed changed
+    materially, or when `heartbeat` seconds passed since the last send.
+
+    Per-track state lives on the caller's record, which must have the slots
+    sent_time, sent_lat, sent_lon, sent_speed and sent_course.
+    """
+
+    def __init__(self, position_error: float = 100.0, course_change: float = 15.0,
+                 speed_change: float = 2.0, heartbeat: float = 120.0):
+        self.position_error = position_error  # metres
+        self.course_change = course_change    # degrees
+        self.speed_change = speed_change      # knots
+        self.heartbeat = heartbeat            # seconds
+        self.checked = 0
+        self.sent = 0
+
+    @property
+    def suppressed(self) -> int:
+        return self.checked - self.sent
+
+    @property
+    def suppression_ratio(self) -> float:
+        """Fraction of checked reports that were suppressed"""
+        return self.suppressed / self.checked if self.checked else 0.0
+
+    def stats(self) -> str:
+        return (f"{self.checked} reports, {self.sent} sent, {self.suppressed} suppressed "
+                f"({self.suppression_ratio:.1%})")
+
+    def predict(self, state, now: float):
+        """Dead-reckoned (lat, lon) of a track from its last sent report"""
+        speed = state.sent_speed
+        course = state.sent_course
+        if not speed or course is None:
+            return state.sent_lat, state.sent_lon
+        distance = speed * KNOTS_TO_MS * (now - state.sent_time)
+        heading = math.radians(course)
+        lat = state.sent_lat + distance * math.cos(heading) / METERS_PER_DEGREE
+        lon_scale = METERS_PER_DEGREE * max(math.cos(math.radians(state.sent_lat)), 1e-6)
+        lon = state.sent_lon + distance * math.sin(heading) / lon_scale
+        return lat, lon
+
+    def should_send(self, state, lat: float, lon: float, speed: float, course: float, now: float) -> bool:
+        """Decide whether a report is worth sending and, if so, record it as sent
+
+        `course` is None when the heading is not available.
+        """
+        self.checked += 1
+        if (state.sent_time is None or lat is None or lon is None
+                or now - state.sent_time >= self.heartbeat
+                or self._changed(state, speed, course)
+                or self._off_track(state, lat, lon, now)):
+            state.sent_time = now
+            state.sent_lat = lat
+            state.sent_lon = lon
+            state.sent_speed = speed
+            state.sent_course = course
+            self.sent += 1
+            return True
+        return False
+
+    def _changed(self, state, speed, course) -> bool:
+        if abs((speed or 0) - (state.sent_speed or 0)) > self.speed_change:
+            return True
+        if (course is None) != (state.sent_course is None):
+            return True
+        if course is not None:
+            delta = abs(course - state.sent_course) % 360
+            return min(delta, 360 - delta) > self.course_change
+        return False
+
+    def _off_track(self, state, lat, lon, now) -> bool:
+        if state.sent_lat is None or state.sent_lon is None:
+            return True  # Nothing to reckon from: the first position is always news
+        predicted_lat, predicted_lon = self.predict(state, now)
+        dy = (lat - predicted_lat) * METERS_PER_DEGREE
+        dx = (lon - predicted_lon) * METERS_PER_DEGREE * math.cos(math.radians(lat))
+        return dx * dx + dy * dy > self.position_error * self.position_error
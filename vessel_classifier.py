@@ -0,0 +1,107 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_TYPE = 'a-f-G-E-V'  # Generic commercial vessel
+
+# MMSI MID (first three digits) that mark a vessel as military
+DEFAULT_MID_TYPES = {
+    338: 'a-n-G-U-C-F',  # US military
+    339: 'a-n-G-U-C-F',  # US military
+    244: 'a-n-G-E-V-A',  # Netherlands military
+    235: 'a-n-G-E-V-A',  # UK military
+    250: 'a-n-G-E-V-A',  # France military
+}
+
+# AIS ship type code ranges (inclusive); later rules override earlier ones
+DEFAULT_SHIP_TYPE_RULES = [
+    ((30, 37), 'a-f-G-E-V-F'),  # Fishing vessels
+    ((60, 69), 'a-f-G-E-V-P'),  # Passenger vessels
+    ((70, 79), 'a-f-G-E-V-C'),  # Cargo vessels
+    ((80, 89), 'a-f-G-E-V-T'),  # Tankers
+    ((40, 40), 'a-f-G-E-V-H'),  # High speed craft
+    ((51, 51), 'a-f-G-U-L-E'),  # Law Enforcement (search and rescue)
+    ((55, 55), 'a-f-G-U-L-E'),  # Law Enforcement
+    ((35, 35), 'a-n-G-U-C-F'),  # Military operations
+]
+
+
+class VesselClassifier:
+    """Table-driven MMSI/ship type to CoT type classification
+
+    MID and ship type rules are compiled into flat lookup tables at startup,
+    and results are cached per MMSI, so classifying a known vessel is a single
+    dict lookup. classify() returns None for vessels excluded by the MMSI
+    allowlist/denylist.
+    """
+
+    def __init__(self, mid_types: Dict[int, str] = None,
+                 ship_type_rules: List[Tuple[Tuple[int, int], str]] = None,
+                 mmsi_types: Dict[int, str] = None, allow: Iterable[int] = None,
+                 deny: Iterable[int] = None, default: str = DEFAULT_TYPE, cache_size: int = 200000):
+        self.default = default
+        self.mid_table: List[Optional[str]] = [None] * 1000
+        for mid, cot_type in (DEFAULT_MID_TYPES if mid_types is None else mid_types).items():
+            self.mid_table[int(mid)] = cot_type
+        self.ship_type_table: List[str] = [default] * 100
+        for (low, high), cot_type in (DEFAULT_SHIP_TYPE_RULES if ship_type_rules is None else ship_type_rules):
+            for ship_type in range(low, high + 1):
+                self.ship_type_table[ship_type] = cot_type
+        self.mmsi_types = {int(mmsi): cot_type for mmsi, cot_type in (mmsi_types or {}).items()}
+        self.allow = frozenset(int(mmsi) for mmsi in allow) if allow else None
+        self.deny = frozenset(int(mmsi) for mmsi in deny) if deny else frozenset()
+        self.cache_size = cache_size
+        self._cache: Dict[Any, Tuple[Any, Optional[str]]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> 'VesselClassifier':
+        """Load rules from a JSON file (see vessel_rules.example.json)"""
+        with open(path) as f:
+            config = json.load(f)
+        ship_type_rules = None
+        if 'ship_types' in config:
+            ship_type_rules = [(_parse_range(codes), cot_type) for codes, cot_type in config['ship_types'].items()]
+        return cls(
+            mid_types=config.get('mid_types'),
+            ship_type_rules=ship_type_rules,
+            mmsi_types=config.get('mmsi_types'),
+            allow=config.get('allow'),
+            deny=config.get('deny'),
+            default=config.get('default', DEFAULT_TYPE),
+        )
+
+    def classify(self, mmsi, ship_type: int = None) -> Optional[str]:
+        """Return the CoT type for a vessel, or None if it is excluded by MMSI"""
+        cached = self._cache.get(mmsi)
+        if cached is not None and cached[0] == ship_type:
+            return cached[1]
+        cot_type = self._classify(mmsi, ship_type)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[mmsi] = (ship_type, cot_type)
+        return cot_type
+
+    def _classify(self, mmsi, ship_type) -> Optional[str]:
+        mmsi_str = str(mmsi) if mmsi else ''
+        if mmsi_str.isdecimal():
+            mmsi_int = int(mmsi_str)
+            if mmsi_int in self.deny or (self.allow is not None and mmsi_int not in self.allow):
+                return None
+            cot_type = self.mmsi_types.get(mmsi_int)
+            if cot_type is not None:
+                return cot_type
+        elif self.allow is not None:
+            return None
+        mid = mmsi_str[:3]
+        if len(mid) == 3 and mid.isdecimal():
+            cot_type = self.mid_table[int(mid)]
+            if cot_type is not None:
+                return cot_type
+        if ship_type and 0 < ship_type < 100:
+            return self.ship_type_table[int(ship_type)]
+        return self.default
+
+
+def _parse_range(codes: str) -> Tuple[int, int]:
+    """Parse a ship type key such as "35" or "30-37" """
+    low, _, high = str(codes).partition('-')
+    return int(low), int(high or low)
@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+class VesselRecord:
+    """Static, last-seen and last-sent state for one MMSI"""
+    __slots__ = ('mmsi', 'ship_type', 'name', 'length', 'beam', 'last_seen', 'cot_type',
+                 'sent_time', 'sent_lat', 'sent_lon', 'sent_speed', 'sent_course')
+
+    def __init__(self, mmsi: int, last_seen: float):
+        self.mmsi = mmsi
+        self.ship_type = None
+        self.name = None
+        self.length = None
+        self.beam = None
+        self.last_seen = last_seen
+        self.cot_type = None  # Cached classification, cleared when the ship type changes
+        # Last report forwarded downstream, used by TrackThrottle and snapshots
+        self.sent_time = None
+        self.sent_lat = None
+        self.sent_lon = None
+        self.sent_speed = None
+        self.sent_course = None
+
+
+class VesselRegistry:
+    """In-memory vessel state keyed by MMSI with LRU and age eviction
+
+    Records are kept in least-recently-seen order (touching a record moves it
+    to the end), so eviction only ever looks at the front.
+    """
+
+    def __init__(self, max_vessels: int = 200000, max_age: float = 3600):
+        self.max_vessels = max_vessels
+        self.max_age = max_age
+        self.evicted = 0
+        self._records: Dict[Any, VesselRecord] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, mmsi) -> bool:
+        return mmsi in self._records
+
+    def get(self, mmsi) -> Optional[VesselRecord]:
+        """Return the record for an MMSI without touching it"""
+        return self._records.get(mmsi)
+
+    def records(self) -> Iterator[VesselRecord]:
+        """Every record, least recently seen first"""
+        return iter(self._records.values())
+
+    def copy_records(self) -> List[VesselRecord]:
+        """A list of every record in no particular order
+
+        Much faster than listing records(), which follows the LRU order through
+        the whole registry; for snapshots, which are put back in order on restore.
+        """
+        return list(dict.values(self._records))
+
+    def restore(self, records: Iterable[VesselRecord], now: float = None) -> int:
+        """Add records loaded from a snapshot; returns how many were kept
+
+        Records older than max_age are skipped, and only the newest max_vessels are kept.
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - self.max_age
+        kept = [record for record in records if record.last_seen >= cutoff]
+        kept.sort(key=lambda record: record.last_seen)
+        stored = self._records
+        for record in kept[-self.max_vessels:]:
+            stored[record.mmsi] = record
+            stored.move_to_end(record.mmsi)
+        while len(stored) > self.max_vessels:
+            stored.popitem(last=False)
+            self.evicted += 1
+        return min(len(kept), self.max_vessels)
+
+    def touch(self, mmsi, now: float = None) -> VesselRecord:
+        """Return the record for an MMSI, creating it if needed, and mark it as seen"""
+        if now is None:
+            now = time.time()
+        records = self._records
+        record = records.get(mmsi)
+        if record is None:
+            self._evict(now)
+            record = records[mmsi] = VesselRecord(mmsi, now)
+        else:
+            record.last_seen = now
+            records.move_to_end(mmsi)
+        return record
+
+    def update_static(self, mmsi, static_data: Dict[str, Any], now: float = None) -> VesselRecord:
+        """Merge an AIS StaticData message body into the record for an MMSI"""
+        length = beam = None
+        dimension = static_data.get('Dimension')
+        if dimension:
+            length = (dimension.get('A') or 0) + (dimension.get('B') or 0)
+            beam = (dimension.get('C') or 0) + (dimension.get('D') or 0)
+        return self.update_static_fields(mmsi, static_data.get('Type'), (static_data.get('Name') or '').strip(),
+                                         length, beam, now)
+
+    def update_static_fields(self, mmsi, ship_type: int = None, name: str = None, length: int = None,
+                             beam: int = None, now: float = None) -> VesselRecord:
+        """Merge already extracted static fields into the record for an MMSI; falsy values are ignored"""
+        record = self.touch(mmsi, now)
+        if ship_type and ship_type != record.ship_type:
+            record.ship_type = ship_type
+            record.cot_type = None
+        if name:
+            record.name = name
+        if length:
+            record.length = length
+        if beam:
+            record.beam = beam
+        return record
+
+    def _evict(self, now: float):
+        """Drop the oldest records until there is room for one more and none are too old"""
+        records = self._records
+        cutoff = now - self.max_age
+        while records:
+            oldest = next(iter(records.values()))
+            if len(records) < self.max_vessels and oldest.last_seen >= cutoff:
+                break
+            records.popitem(last=False)
+            self.evicted += 1